@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# bench_fanout.py - czas pełnej aktualizacji PWM: zapisy po kolei vs równolegle per chip
+#
+# Użycie:
+#   python3 benchmarks/bench_fanout.py --chips 4 --fans 24 --delay-ms 5 --hang 1
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sysfs  # noqa: E402
+from fancontrol import FanController  # noqa: E402
+from synthetic import make_tree  # noqa: E402
+
+
+def slow_writes(delay, hang_dirs, hang):
+    """Make every sysfs write take `delay` s (a slow SMBus chip); chips in hang_dirs take `hang` s."""
+    write = sysfs.SysfsFile.write
+
+    def slow(self, value):
+        time.sleep(hang if os.path.dirname(self.path) in hang_dirs else delay)
+        return write(self, value)
+    sysfs.SysfsFile.write = slow
+    return lambda: setattr(sysfs.SysfsFile, "write", write)
+
+
+def update(controller, n):
+    lat = []
+    errors = 0
+    for i in range(n):
+        t0 = time.perf_counter()
+        # alternate values so no write is suppressed as unchanged
+        errors += len(controller.set_pwm_on_all(100 + i % 2))
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return lat[len(lat) // 2] * 1000, lat[-1] * 1000, errors
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark serial vs per-chip parallel PWM writes")
+    ap.add_argument("--chips", type=int, default=4, help="hwmon chips with PWM channels")
+    ap.add_argument("--fans", type=int, default=24)
+    ap.add_argument("--delay-ms", type=float, default=5.0, help="time of one sysfs write")
+    ap.add_argument("--hang", type=int, default=0, help="chips whose writes hang (take --hang-s)")
+    ap.add_argument("--hang-s", type=float, default=3.0)
+    ap.add_argument("--timeout", type=float, default=0.5, help="parallel per-write timeout [s]")
+    ap.add_argument("-n", type=int, default=10, help="full updates per mode")
+    args = ap.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="cpufan-fanout-")
+    restore = None
+    try:
+        # chip 0 is coretemp, the fans are spread over the others
+        make_tree(root, chips=args.chips + 1, fans=args.fans)
+        serial = FanController(sysfs_root=root)
+        parallel = FanController(sysfs_root=root, parallel=True, write_timeout=args.timeout)
+        dirs = sorted({c.dir for c in serial.channels})
+        restore = slow_writes(args.delay_ms / 1000.0, set(dirs[:args.hang]), args.hang_s)
+        print(f"{len(serial.channels)} channels on {len(dirs)} chips, {args.delay_ms:g} ms per write, "
+              f"{args.hang} hung chip(s)")
+        print(f"{'mode':<10} {'p50[ms]':>9} {'max[ms]':>9} {'errors':>7}")
+        modes = [("parallel", parallel)]
+        if not args.hang:
+            # with a hung chip the serial path would take n * hang-s
+            modes.insert(0, ("serial", serial))
+        for name, controller in modes:
+            p50, worst, errors = update(controller, args.n)
+            print(f"{name:<10} {p50:>9.1f} {worst:>9.1f} {errors:>7}")
+        slow = max(parallel.channels, key=lambda c: c.write_latency or 0)
+        print(f"slowest channel: {slow.pwm_file} {1000 * (slow.write_latency or 0):.1f} ms")
+        return 0
+    finally:
+        if restore:
+            restore()
+        sysfs.handles.close_all()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
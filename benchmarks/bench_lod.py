@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# bench_lod.py - koszt odświeżenia wykresu (update + render) w zależności od długości historii
+#
+# Użycie:
+#   python3 benchmarks/bench_lod.py --history 3600 86400 604800 --width 1200
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ringbuffer import RingBuffer  # noqa: E402
+from lod import LODHistory  # noqa: E402
+
+COLUMNS = ("time", "temp", "freq", "util", "power")
+
+
+def main(argv=None):
+    import numpy as np
+    ap = argparse.ArgumentParser(description="Benchmark level-of-detail plot data per GUI tick")
+    ap.add_argument("--history", type=int, nargs="+", default=[3600, 86400, 604800])
+    ap.add_argument("--width", type=int, default=1200, help="plot width in pixels")
+    ap.add_argument("-n", type=int, default=300, help="ticks (one new sample each)")
+    args = ap.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    print(f"{'history':>8} {'fill[ms]':>9} {'tick p50[us]':>13} {'tick p99[us]':>13} {'points':>7} {'raw points':>11}")
+    for cap in args.history:
+        ring = RingBuffer(cap, COLUMNS)
+        lod = LODHistory(ring, COLUMNS[1:])
+        block = rng.normal(50.0, 5.0, (len(COLUMNS), cap))
+        block[0] = np.arange(cap, dtype="float64")
+        t0 = time.perf_counter()
+        ring.extend(block)
+        lod.update()
+        fill = (time.perf_counter() - t0) * 1000.0
+        lat = []
+        points = 0
+        for i in range(args.n):
+            ring.append((cap + i, 50.0, 2400.0, 10.0, 30.0))
+            t0 = time.perf_counter()
+            lod.update()
+            for column in COLUMNS[1:]:
+                x, _ = lod.render(column, width=args.width)
+            lat.append(time.perf_counter() - t0)
+            points = len(x)
+        lat.sort()
+        print(f"{cap:>8} {fill:>9.1f} {lat[len(lat) // 2] * 1e6:>13.1f} "
+              f"{lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1e6:>13.1f} {points:>7} {len(ring):>11}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# bench_percore.py - koszt próbkowania per rdzeń (przebieg wsadowy vs odczyt plik po pliku)
+#
+# Użycie:
+#   python3 benchmarks/bench_percore.py --cpus 16 128 512 -n 300
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sysfs  # noqa: E402
+from percore import PerCoreReader  # noqa: E402
+from synthetic import make_tree  # noqa: E402
+from bench_sysfs import measure  # noqa: E402
+
+
+def per_file(reader):
+    """The same files read one by one through the sysfs handle cache (the pre-batch way)."""
+    paths = reader.temp_batch.paths + reader.freq_batch.paths
+
+    def read(i):
+        vals = []
+        for p in paths:
+            try:
+                vals.append(sysfs.handles.get(p).read_int())
+            except Exception:
+                vals.append(None)
+        return max(v for v in vals if v is not None)
+    return read
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark per-core sampling on a synthetic sysfs tree")
+    ap.add_argument("--cpus", type=int, nargs="+", default=[16, 128, 512])
+    ap.add_argument("--packages", type=int, default=2)
+    ap.add_argument("-n", type=int, default=300, help="iterations per operation")
+    args = ap.parse_args(argv)
+
+    print(f"{'cpus':>5} {'operation':<14} {'mean[us]':>10} {'p99[us]':>10} {'us/core':>8} {'sysfs/op':>9}")
+    for cpus in args.cpus:
+        root = tempfile.mkdtemp(prefix="cpufan-percore-")
+        try:
+            make_tree(root, chips=2, fans=2, temps=max(1, cpus // args.packages), cpus=cpus,
+                      packages=args.packages)
+            reader = PerCoreReader(sysfs_root=root, history=args.n)
+            reader.sample()
+            for name, func in (("batched", lambda i: reader.sample()),
+                               ("files only", lambda i: (reader.temp_batch.read(), reader.freq_batch.read())),
+                               ("per-file loop", per_file(reader))):
+                r = measure(func, args.n)
+                print(f"{cpus:>5} {name:<14} {r['mean_us']:>10.1f} {r['p99_us']:>10.1f} "
+                      f"{r['mean_us'] / cpus:>8.2f} {r['sysfs_calls']:>9.1f}")
+            reader.close()
+        finally:
+            sysfs.handles.close_all()
+            shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# bench_startup.py - czas zimnego startu trybu CLI (bez Qt) względem samego interpretera
+#
+# Użycie:
+#   python3 benchmarks/bench_startup.py -n 20 --budget 150
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import make_tree  # noqa: E402
+
+CASES = (
+    ("sample --json", ["sample", "--json", "--interval", "0"]),
+    ("list-channels", ["list-channels", "--json"]),
+    ("apply-profile", ["apply-profile", "bench", "--temp", "55"]),
+)
+
+# modules that must not be loaded on the command-line path
+HEAVY = ("PyQt6", "pyqtgraph", "numpy", "http.server")
+
+
+def run(cmd, env, n):
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    times.sort()
+    return times[len(times) // 2], times[min(n - 1, int(n * 0.9))]
+
+
+def heavy_imports(argv, env):
+    """Heavy modules imported by `main.py argv` (python -X importtime)."""
+    out = subprocess.run([sys.executable, "-X", "importtime", os.path.join(ROOT, "main.py")] + argv,
+                         env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    found = set()
+    for line in out.splitlines():
+        name = line.rsplit("|", 1)[-1].strip()
+        for h in HEAVY:
+            if name == h or name.startswith(h + "."):
+                found.add(h)
+    return sorted(found)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Measure cold start of the Qt-free CLI path")
+    ap.add_argument("-n", type=int, default=15, help="runs per case")
+    ap.add_argument("--budget", type=float, default=150.0, help="max median start-to-exit time [ms]")
+    args = ap.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix="cpufan-startup-")
+    try:
+        # synthetic sysfs and a private HOME so results do not depend on the machine
+        sysroot = make_tree(os.path.join(tmp, "sys"), chips=3, fans=8)
+        pdir = os.path.join(tmp, "home", ".config", "cpu-fan-controller", "profiles")
+        os.makedirs(pdir)
+        with open(os.path.join(pdir, "bench.json"), "w") as f:
+            f.write('{"name": "bench", "points": [[30, 60], [50, 120], [70, 200], [85, 255]]}\n')
+        env = dict(os.environ, CPU_FAN_SYSFS_ROOT=sysroot, HOME=os.path.join(tmp, "home"))
+
+        base50, base90 = run([sys.executable, "-c", "pass"], env, args.n)
+        print(f"{'case':<16} {'p50[ms]':>9} {'p90[ms]':>9} {'-python[ms]':>12}  heavy imports")
+        print(f"{'python -c pass':<16} {base50:>9.1f} {base90:>9.1f} {'':>12}")
+        failed = False
+        for name, cli_args in CASES:
+            p50, p90 = run([sys.executable, os.path.join(ROOT, "main.py")] + cli_args, env, args.n)
+            heavy = heavy_imports(cli_args, env)
+            over = p50 > args.budget or heavy
+            failed = failed or over
+            print(f"{name:<16} {p50:>9.1f} {p90:>9.1f} {p50 - base50:>12.1f}  "
+                  f"{', '.join(heavy) or '-'}{'  OVER BUDGET' if p50 > args.budget else ''}")
+        print(f"budget: {args.budget:.0f} ms median per command")
+        return 1 if failed else 0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
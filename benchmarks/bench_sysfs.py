@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# bench_sysfs.py - benchmark ścieżek odczytu i sterowania na sztucznym drzewie sysfs
+#
+# Użycie:
+#   python3 benchmarks/bench_sysfs.py --fans 2 20 200 -n 500
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sysfs  # noqa: E402
+from sensors import SensorReader  # noqa: E402
+from fancontrol import FanController  # noqa: E402
+from curve import FanCurve  # noqa: E402
+from synthetic import make_tree  # noqa: E402
+
+CURVE = [(30, 60), (50, 120), (70, 200), (85, 255)]
+
+
+def proc_io_syscalls():
+    """read+write syscalls issued by this process so far (Linux /proc/self/io)."""
+    try:
+        vals = {}
+        with open("/proc/self/io") as f:
+            for line in f:
+                k, v = line.split(":")
+                vals[k] = int(v)
+        return vals["syscr"] + vals["syscw"]
+    except Exception:
+        return None
+
+
+def measure(func, n):
+    lat = []
+    sys0 = sysfs.stats.syscalls
+    io0 = proc_io_syscalls()
+    start = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        func(i)
+        lat.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    io1 = proc_io_syscalls()
+    lat.sort()
+    return {
+        "mean_us": sum(lat) / n * 1e6,
+        "p99_us": lat[min(n - 1, int(n * 0.99))] * 1e6,
+        "ops_s": n / total if total > 0 else 0.0,
+        "sysfs_calls": (sysfs.stats.syscalls - sys0) / n,
+        "rw_syscalls": None if io0 is None or io1 is None else (io1 - io0) / n,
+    }
+
+
+def run_size(fans, n, chips):
+    root = tempfile.mkdtemp(prefix="cpufan-sysfs-")
+    try:
+        make_tree(root, chips=chips, fans=fans, voltages=max(2, fans // 4), temps=8, rapl_domains=2)
+        sysfs.handles.close_all()
+        results = []
+        results.append(("discover", measure(lambda i: FanController(sysfs_root=root), max(5, n // 10))))
+        reader = SensorReader(sample_history=0, sysfs_root=root)
+        results.append(("sample", measure(lambda i: reader.sample(), n)))
+        controller = FanController(sysfs_root=root)
+        curve = FanCurve(CURVE)
+        # temperatures sweep the curve so most ticks really write
+        temps = [30 + (i * 7) % 55 for i in range(n)]
+        results.append(("apply_curve", measure(lambda i: controller.apply_curve(temps[i], curve), n)))
+
+        def tick(i):
+            reader.sample()
+            controller.apply_curve(temps[i], curve)
+        results.append(("tick", measure(tick, n)))
+        stats = controller.write_stats()
+        return results, len(controller.channels), stats
+    finally:
+        sysfs.handles.close_all()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark poll/control paths on a synthetic sysfs tree")
+    ap.add_argument("--fans", type=int, nargs="+", default=[2, 20, 200], help="fan/PWM counts to test")
+    ap.add_argument("--chips", type=int, default=None, help="hwmon chips (default: one per 8 fans + coretemp)")
+    ap.add_argument("-n", type=int, default=300, help="iterations per operation")
+    args = ap.parse_args(argv)
+
+    print(f"{'fans':>5} {'operation':<12} {'mean[us]':>10} {'p99[us]':>10} {'ops/s':>10} "
+          f"{'sysfs/op':>9} {'rw-sys/op':>9}")
+    for fans in args.fans:
+        chips = args.chips or (fans + 7) // 8 + 1
+        results, nchan, stats = run_size(fans, args.n, chips)
+        for name, r in results:
+            rw = "-" if r["rw_syscalls"] is None else f"{r['rw_syscalls']:.1f}"
+            print(f"{fans:>5} {name:<12} {r['mean_us']:>10.1f} {r['p99_us']:>10.1f} {r['ops_s']:>10.0f} "
+                  f"{r['sysfs_calls']:>9.1f} {rw:>9}")
+        print(f"{'':>5} channels={nchan} pwm writes issued={stats['issued']} suppressed={stats['suppressed']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
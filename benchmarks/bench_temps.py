@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# bench_temps.py - opóźnienie odczytu temperatury: bezpośredni odczyt temp*_input vs psutil
+#
+# Użycie:
+#   python3 benchmarks/bench_temps.py [-n 2000]
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensors import SensorReader, CPU_TEMP_CHIPS  # noqa: E402
+from hwmon import HwmonIndex, HWMON_ROOT  # noqa: E402
+
+# the tree psutil.sensors_temperatures() reads, whatever CPU_FAN_SYSFS_ROOT says
+PSUTIL_HWMON = "/sys/class/hwmon"
+
+
+def measure(func, n):
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        func()
+        out.append(time.perf_counter() - t0)
+    out.sort()
+    return {
+        "mean_us": sum(out) / len(out) * 1e6,
+        "p50_us": out[len(out) // 2] * 1e6,
+        "p99_us": out[min(len(out) - 1, int(len(out) * 0.99))] * 1e6,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Per-sample temperature read latency")
+    ap.add_argument("-n", type=int, default=2000, help="samples per method")
+    ap.add_argument("--hwmon-root", default=HWMON_ROOT)
+    args = ap.parse_args(argv)
+
+    reader = SensorReader(sample_history=1, hwmon_index=HwmonIndex(args.hwmon_root))
+    if not reader.temp_sensors:
+        print("No CPU temperature chip (" + ", ".join(CPU_TEMP_CHIPS) + ") resolved; "
+              "direct read falls back to psutil")
+    else:
+        chip = reader.temp_sensors[0].chip
+        print(f"Direct source: {chip.name} ({chip.path}), {len(reader.temp_sensors)} inputs")
+
+    results = [("direct", measure(reader.get_temperatures, args.n))]
+    # psutil always reads the real /sys/class/hwmon: only comparable on that tree
+    same_tree = os.path.realpath(args.hwmon_root) == os.path.realpath(PSUTIL_HWMON)
+    if same_tree:
+        results.append(("psutil", measure(reader._temperatures_psutil, args.n)))
+    else:
+        print(f"psutil reads {PSUTIL_HWMON}, not {args.hwmon_root}: comparison skipped")
+    print(f"{'method':<8} {'mean[us]':>10} {'p50[us]':>10} {'p99[us]':>10}")
+    for name, r in results:
+        print(f"{name:<8} {r['mean_us']:>10.1f} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f}")
+    if len(results) > 1 and results[0][1]["mean_us"] > 0:
+        print(f"speedup: {results[1][1]['mean_us'] / results[0][1]['mean_us']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# synthetic.py - generator sztucznego drzewa sysfs (hwmon + powercap + cpufreq)
+#
+# Użycie jako skrypt (drzewo zostaje na dysku):
+#   python3 benchmarks/synthetic.py /tmp/fake-sys --chips 4 --fans 40
+#   CPU_FAN_SYSFS_ROOT=/tmp/fake-sys python3 daemon.py -p default -v
+import os
+import sys
+import argparse
+
+
+def _write(path, value):
+    with open(path, "w") as f:
+        f.write(f"{value}\n")
+
+
+def _spread(total, parts):
+    """Split `total` items over `parts` buckets as evenly as possible."""
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+def _coretemp(d, package, temps):
+    os.makedirs(d, exist_ok=True)
+    _write(os.path.join(d, "name"), "coretemp")
+    _write(os.path.join(d, "temp1_input"), 48000 + 1000 * package)
+    _write(os.path.join(d, "temp1_label"), f"Package id {package}")
+    for i in range(temps):
+        _write(os.path.join(d, f"temp{i + 2}_input"), 40000 + (i * 1000) % 20000)
+        _write(os.path.join(d, f"temp{i + 2}_label"), f"Core {i}")
+
+
+def make_tree(root, chips=2, fans=8, pwms=None, voltages=6, temps=8, rapl_domains=1, cpus=4,
+              packages=1, ccd_size=8, rapl_subdomains=()):
+    """
+    Build a fake /sys under `root`. Chip 0 is a "coretemp" with `temps` core
+    sensors; fans, PWM channels and voltages are spread over the remaining
+    chips (nct6775-like). With packages > 1 every further package gets its own
+    coretemp chip after those. CPUs are split evenly over the packages, with an
+    L3 (CCD) group per `ccd_size` cores. Every RAPL package domain gets the
+    `rapl_subdomains` (e.g. "core", "dram") as intel-rapl:P:N. Returns `root`.
+    """
+    if pwms is None:
+        pwms = fans
+    hwmon = os.path.join(root, "class", "hwmon")
+    os.makedirs(hwmon, exist_ok=True)
+
+    _coretemp(os.path.join(hwmon, "hwmon0"), 0, temps)
+
+    nchips = max(1, chips - 1)
+    for c, (nf, npwm, nv) in enumerate(zip(_spread(fans, nchips), _spread(pwms, nchips),
+                                            _spread(voltages, nchips))):
+        d = os.path.join(hwmon, f"hwmon{c + 1}")
+        os.makedirs(d, exist_ok=True)
+        _write(os.path.join(d, "name"), "nct6775")
+        for i in range(1, nf + 1):
+            _write(os.path.join(d, f"fan{i}_input"), 600 + 40 * i)
+        for i in range(1, npwm + 1):
+            _write(os.path.join(d, f"pwm{i}"), 128)
+            _write(os.path.join(d, f"pwm{i}_enable"), 2)
+        for i in range(nv):
+            _write(os.path.join(d, f"in{i}_input"), 1000 + 10 * i)
+            _write(os.path.join(d, f"in{i}_label"), "Vcore" if i == 0 else f"VIN{i}")
+    for p in range(1, packages):
+        _coretemp(os.path.join(hwmon, f"hwmon{nchips + p}"), p, temps)
+
+    powercap = os.path.join(root, "class", "powercap")
+    for p in range(rapl_domains):
+        d = os.path.join(powercap, f"intel-rapl:{p}")
+        os.makedirs(d, exist_ok=True)
+        _write(os.path.join(d, "name"), f"package-{p}")
+        _write(os.path.join(d, "energy_uj"), 1000000 * (p + 1))
+        _write(os.path.join(d, "max_energy_range_uj"), 262143328850)
+        for n, name in enumerate(rapl_subdomains):
+            sd = os.path.join(powercap, f"intel-rapl:{p}:{n}")
+            os.makedirs(sd, exist_ok=True)
+            _write(os.path.join(sd, "name"), name)
+            _write(os.path.join(sd, "energy_uj"), 100000 * (p + 1) + 10000 * n)
+            _write(os.path.join(sd, "max_energy_range_uj"), 65532610987)
+
+    per_package = max(1, cpus // packages)
+    for n in range(cpus):
+        d = os.path.join(root, "devices", "system", "cpu", f"cpu{n}")
+        os.makedirs(os.path.join(d, "cpufreq"), exist_ok=True)
+        _write(os.path.join(d, "cpufreq", "scaling_cur_freq"), 2400000 + 1000 * n)
+        package, core = divmod(n, per_package)
+        os.makedirs(os.path.join(d, "topology"), exist_ok=True)
+        _write(os.path.join(d, "topology", "physical_package_id"), min(package, packages - 1))
+        _write(os.path.join(d, "topology", "core_id"), core)
+        os.makedirs(os.path.join(d, "cache", "index3"), exist_ok=True)
+        _write(os.path.join(d, "cache", "index3", "id"), n // ccd_size)
+    return root
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Create a synthetic sysfs tree")
+    ap.add_argument("root")
+    ap.add_argument("--chips", type=int, default=2)
+    ap.add_argument("--fans", type=int, default=8)
+    ap.add_argument("--pwms", type=int, default=None)
+    ap.add_argument("--voltages", type=int, default=6)
+    ap.add_argument("--temps", type=int, default=8)
+    ap.add_argument("--rapl-domains", type=int, default=1, help="RAPL package domains")
+    ap.add_argument("--rapl-subdomains", nargs="*", default=[], help="e.g. core uncore dram")
+    ap.add_argument("--cpus", type=int, default=4)
+    ap.add_argument("--packages", type=int, default=1)
+    ap.add_argument("--ccd-size", type=int, default=8)
+    args = ap.parse_args(argv)
+    make_tree(args.root, chips=args.chips, fans=args.fans, pwms=args.pwms, voltages=args.voltages,
+              temps=args.temps, rapl_domains=args.rapl_domains, cpus=args.cpus,
+              packages=args.packages, ccd_size=args.ccd_size, rapl_subdomains=args.rapl_subdomains)
+    print(args.root)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+# calibration.py - kalibracja wentylatorów (PWM -> RPM) i pętla zamknięta po obrotach z wykrywaniem zatrzymania
+import os
+import json
+import time
+
+import sysfs
+import utils
+from metrics import registry
+
+# seconds to wait after a PWM change before the tachometer is read
+SETTLE_TIME = 4.0
+# PWM levels in one sweep (255 .. 0)
+SWEEP_STEPS = 16
+# at or below this a fan counts as stopped (some tachometers report noise, not 0)
+STALL_RPM = 50
+# a fan commanded above its start PWM that shows no RPM this long is stalled [s]
+STALL_TIME = 6.0
+
+
+def calibration_path():
+    return os.path.join(utils.config_dir(), "calibration.json")
+
+
+def channel_key(channel):
+    """
+    Stable key for a PWM channel: hwmonN numbering changes between boots, the
+    underlying device path (e.g. /sys/devices/platform/nct6775.656) does not.
+    """
+    dev = os.path.join(channel.dir, "device")
+    base = os.path.realpath(dev) if os.path.exists(dev) else channel.name
+    return f"{base}/{os.path.basename(channel.pwm_file)}"
+
+
+class FanCalibration:
+    """
+    Wynik kalibracji jednego kanału: krzywa PWM -> RPM, obroty min/max, próg
+    zatrzymania (najniższy PWM, przy którym wentylator jeszcze się kręci) i próg
+    startu (najniższy PWM, który rusza zatrzymany wentylator), oraz tachometr,
+    który faktycznie reaguje na ten kanał.
+    """
+    def __init__(self, points, fan_input, stop_pwm, start_pwm, when=None):
+        # monotonic PWM -> RPM table, ascending PWM
+        pts = sorted((int(p), float(r)) for p, r in points)
+        best = 0.0
+        self.points = []
+        for p, r in pts:
+            best = max(best, r)
+            self.points.append((p, best))
+        self.fan_input = fan_input
+        self.stop_pwm = int(stop_pwm)
+        self.start_pwm = int(start_pwm)
+        self.time = when or time.time()
+        spinning = [r for p, r in self.points if p >= self.stop_pwm and r > STALL_RPM]
+        self.min_rpm = min(spinning) if spinning else 0.0
+        self.max_rpm = self.points[-1][1] if self.points else 0.0
+
+    def rpm_at(self, pwm):
+        pts = self.points
+        if not pts:
+            return 0.0
+        if pwm <= pts[0][0]:
+            return pts[0][1]
+        for (p0, r0), (p1, r1) in zip(pts, pts[1:]):
+            if pwm <= p1:
+                return r0 + (r1 - r0) * (pwm - p0) / ((p1 - p0) or 1)
+        return pts[-1][1]
+
+    def pwm_for_rpm(self, rpm):
+        """Lowest PWM that reaches `rpm` by the calibration table (never below stop_pwm)."""
+        pts = [(p, r) for p, r in self.points if p >= self.stop_pwm]
+        if not pts:
+            return 255
+        if rpm <= pts[0][1]:
+            return pts[0][0]
+        for (p0, r0), (p1, r1) in zip(pts, pts[1:]):
+            if rpm <= r1:
+                if r1 == r0:
+                    return p1
+                return int(round(p0 + (p1 - p0) * (rpm - r0) / (r1 - r0)))
+        return 255
+
+    def to_dict(self):
+        return {"points": self.points, "fan_input": self.fan_input, "stop_pwm": self.stop_pwm,
+                "start_pwm": self.start_pwm, "min_rpm": self.min_rpm, "max_rpm": self.max_rpm,
+                "time": self.time}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["points"], d.get("fan_input"), d["stop_pwm"], d["start_pwm"], d.get("time"))
+
+
+def load_calibrations(path=None):
+    """{channel_key: FanCalibration}; missing or unreadable file -> {}."""
+    try:
+        with open(path or calibration_path()) as f:
+            raw = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    out = {}
+    for key, d in raw.items():
+        try:
+            out[key] = FanCalibration.from_dict(d)
+        except (KeyError, TypeError, ValueError):
+            continue
+    return out
+
+
+def save_calibrations(cals, path=None):
+    path = path or calibration_path()
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({k: c.to_dict() for k, c in cals.items()}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_rpms(paths):
+    out = {}
+    for p in paths:
+        try:
+            out[p] = sysfs.handles.get(p).read_int()
+        except Exception:
+            out[p] = None
+    return out
+
+
+def calibrate(channel, candidates=None, steps=SWEEP_STEPS, settle=SETTLE_TIME, sleep=time.sleep, log=None):
+    """
+    Sweep `channel` 255 -> 0 -> up again and return a FanCalibration.
+    `candidates`: fan*_input files to watch (default: all fans of the chip);
+    the one whose RPM follows the sweep most is recorded as this channel's fan.
+    The original pwm/pwm_enable values are restored afterwards.
+    """
+    if candidates is None:
+        candidates = sorted(os.path.join(channel.dir, f) for f in os.listdir(channel.dir)
+                            if f.startswith("fan") and f.endswith("_input"))
+    if not candidates:
+        raise ValueError(f"{channel.pwm_file}: no fan*_input in {channel.dir}")
+    log = log or (lambda msg: None)
+    saved = {}
+    for path in (channel.enable_file, channel.pwm_file):
+        if path:
+            try:
+                saved[path] = sysfs.handles.get(path).read().strip()
+            except Exception:
+                pass
+    levels = sorted({int(round(255 * i / steps)) for i in range(steps + 1)}, reverse=True)
+    down = []
+    try:
+        channel.set_manual(force=True)
+        for pwm in levels:
+            channel.set_pwm(pwm, force=True)
+            sleep(settle)
+            rpms = _read_rpms(candidates)
+            down.append((pwm, rpms))
+            log(f"{channel.pwm_file}: pwm {pwm:3d} -> " + " ".join(
+                f"{os.path.basename(p)}={r}" for p, r in rpms.items()))
+        fan = _pick_fan(down, candidates)
+        if fan is None:
+            raise ValueError(f"{channel.pwm_file}: no tachometer follows this channel")
+        points = [(pwm, rpms[fan] or 0) for pwm, rpms in down]
+        spinning = [pwm for pwm, rpm in points if rpm > STALL_RPM]
+        stop_pwm = min(spinning) if spinning else 255
+        # a stopped fan often needs more than stop_pwm to start again
+        start_pwm = 255
+        for pwm in reversed(levels):
+            channel.set_pwm(pwm, force=True)
+            sleep(settle)
+            rpm = _read_rpms([fan])[fan] or 0
+            if rpm > STALL_RPM:
+                start_pwm = pwm
+                break
+        log(f"{channel.pwm_file}: fan {os.path.basename(fan)}, stop below {stop_pwm}, start at {start_pwm}")
+        return FanCalibration(points, fan, stop_pwm, max(start_pwm, stop_pwm))
+    finally:
+        for path, value in saved.items():
+            try:
+                sysfs.handles.get(path, writable=True).write(value)
+            except Exception:
+                pass
+        channel.invalidate()
+
+
+def _pick_fan(sweep, candidates):
+    best, best_span = None, 0
+    for p in candidates:
+        vals = [rpms[p] for _, rpms in sweep if rpms.get(p) is not None]
+        if not vals:
+            continue
+        span = max(vals) - min(vals)
+        if span > best_span:
+            best, best_span = p, span
+    if best is None:
+        return None
+    # a fan that only wobbles a little is following some other channel
+    peak = max(rpms[best] or 0 for _, rpms in sweep)
+    return best if best_span >= max(STALL_RPM, 0.2 * peak) else None
+
+
+class RPMLoop:
+    """
+    Pętla zamknięta po obrotach dla jednego kanału. Wyjście silnika (0-255)
+    oznacza udział zakresu obrotów tego wentylatora (min_rpm..max_rpm), więc
+    różne wentylatory dają porównywalny przepływ. PWM = wartość z kalibracji
+    + korekta całkująca z pomiaru RPM. Nie zapisuje wartości poniżej progu
+    zatrzymania (tam wentylator i tak stoi), zatrzymany wentylator rusza
+    od start_pwm, a brak obrotów mimo wysterowania przez `stall_time` s to
+    zatrzymanie (stall): licznik, zgłoszenie i impuls 255.
+    """
+    def __init__(self, channel, cal, gain=0.5, trim_limit=64, stall_time=STALL_TIME):
+        self.channel = channel
+        self.cal = cal
+        self.gain = gain              # PWM per second per 100 % of the RPM range in error
+        self.trim_limit = trim_limit
+        self.stall_time = stall_time
+        self.trim = 0.0
+        self.last_time = None
+        self.last_pwm = None
+        self.rpm = None
+        self.target = 0.0
+        self.stall_since = None
+        self.stalled = False
+        self.new_stall = False
+        self.stalls = 0
+
+    def target_rpm(self, duty):
+        if duty <= 0:
+            return 0.0
+        c = self.cal
+        return c.min_rpm + (c.max_rpm - c.min_rpm) * min(255, duty) / 255.0
+
+    def read_rpm(self):
+        try:
+            return sysfs.handles.get(self.cal.fan_input).read_int()
+        except Exception:
+            return None
+
+    def update(self, duty, now=None, limits=None):
+        """
+        PWM to write for engine output `duty`; sets stalled / new_stall.
+        limits: the channel's (min, max) PWM from the profile; bounds every value
+        written, the stall kick included.
+        """
+        now = time.monotonic() if now is None else now
+        dt = 0.0 if self.last_time is None else max(0.0, now - self.last_time)
+        self.last_time = now
+        self.new_stall = False
+        c = self.cal
+        rpm = self.rpm = self.read_rpm()
+        self.target = target = self.target_rpm(duty)
+        if target <= 0:
+            # the curve asks for a stop: 0, not some PWM below the stop point
+            self.trim = 0.0
+            self.stall_since = None
+            self.stalled = False
+            self.last_pwm = pwm = self._limit(0, limits)
+            return pwm
+        span = max(1.0, c.max_rpm - c.min_rpm)
+        if rpm is not None and not self.stalled:
+            self.trim += self.gain * 255.0 * (target - rpm) / span * dt
+            self.trim = max(-self.trim_limit, min(self.trim_limit, self.trim))
+        pwm = c.pwm_for_rpm(target) + self.trim
+        stopped = rpm is not None and rpm <= STALL_RPM
+        floor = c.start_pwm if stopped else c.stop_pwm
+        pwm = int(round(max(floor, min(255, pwm))))
+        # stall: driven at or above the start threshold and still no rotation
+        if stopped and self.last_pwm is not None and self.last_pwm >= c.start_pwm:
+            if self.stall_since is None:
+                self.stall_since = now
+            elif now - self.stall_since >= self.stall_time:
+                if not self.stalled:
+                    self.stalled = True
+                    self.new_stall = True
+                    self.stalls += 1
+                    # what it integrated against a dead tachometer is meaningless
+                    self.trim = 0.0
+                    registry.inc("fan_stalls_total", channel=self.channel.pwm_file)
+                # kick, then give it another stall_time to spin up
+                self.stall_since = now
+                pwm = 255
+        elif not stopped:
+            self.stall_since = None
+            self.stalled = False
+        # clamped before it is remembered: stall detection judges what was really written
+        pwm = self._limit(pwm, limits)
+        self.last_pwm = pwm
+        return pwm
+
+    @staticmethod
+    def _limit(pwm, limits):
+        return pwm if limits is None else max(limits[0], min(limits[1], pwm))
+
+    def state(self):
+        return {"target_rpm": round(self.target), "rpm": self.rpm, "trim": round(self.trim, 1),
+                "stalled": self.stalled, "stalls": self.stalls}
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# cli.py - tryb wiersza poleceń bez Qt (jednorazowe operacje, np. profil przy starcie systemu)
+#
+# Użycie:
+#   python3 main.py list-channels
+#   sudo python3 main.py apply-profile default
+#   sudo python3 main.py set-pwm 160 --channels /sys/class/hwmon/hwmon2/pwm1
+#   python3 main.py sample --json -n 5
+#   sudo python3 main.py calibrate            (zatrzymaj wcześniej daemon)
+import sys
+import json
+import time
+import argparse
+
+COMMANDS = ("list-channels", "apply-profile", "set-pwm", "sample", "calibrate")
+
+
+def _print_errors(errs):
+    for e in errs or []:
+        print(f"Error: {e}", file=sys.stderr)
+    return 1 if errs else 0
+
+
+def cmd_list_channels(args):
+    from fancontrol import FanController
+    controller = FanController()
+    chans = controller.list_channels()
+    for c, ch in zip(chans, controller.channels):
+        c["rpm"] = ch.read_rpm()
+    if args.json:
+        print(json.dumps(chans, indent=2))
+        return 0
+    if not chans:
+        print("No PWM channels found", file=sys.stderr)
+        return 1
+    for c in chans:
+        rpm = "-" if c["rpm"] is None else f"{c['rpm']} RPM"
+        print(f"{c['pwm_file']}  {c['name']} ({c['hwmon']})  fan: {rpm}")
+    return 0
+
+
+def cmd_apply_profile(args):
+    import utils
+    from fancontrol import FanController
+    store = utils.profile_store()
+    try:
+        profile = store.get(args.profile)
+        engine = store.engine(args.profile)
+    except Exception as e:
+        print(f"Cannot load profile: {e}", file=sys.stderr)
+        return 1
+    if engine is None:
+        print(f"Profile {args.profile} has no curve points", file=sys.stderr)
+        return 1
+    temp = args.temp
+    if temp is None:
+        from sensors import SensorReader
+        temp = SensorReader(sample_history=0).get_temperatures()
+        if temp is None:
+            print("Cannot read CPU temperature; pass --temp", file=sys.stderr)
+            return 1
+    controller = FanController()
+    res = controller.apply_engine(temp, engine, args.channels or profile.get("channels") or None)
+    print(f"{args.profile}: {temp:.1f}°C -> PWM {res['pwm']} ({engine.name})")
+    return _print_errors(res["errors"])
+
+
+def cmd_set_pwm(args):
+    from fancontrol import FanController
+    if not 0 <= args.value <= 255:
+        print("PWM value must be 0-255", file=sys.stderr)
+        return 2
+    controller = FanController(parallel=args.parallel, write_timeout=args.write_timeout)
+    if args.channels:
+        errs = controller.set_pwm_on_list(args.channels, args.value, force=True)
+    else:
+        errs = controller.set_pwm_on_all(args.value, force=True)
+    return _print_errors(errs)
+
+
+def cmd_sample(args):
+    from sensors import SensorReader
+    reader = SensorReader(sample_history=0)
+    for i in range(args.count):
+        # power and utilization are rates: they need a previous sample
+        if args.interval > 0:
+            time.sleep(args.interval)
+        data = reader.sample()
+        if args.json:
+            print(json.dumps(data), flush=True)
+        else:
+            print("  ".join(f"{k}={'-' if v is None else round(v, 2)}" for k, v in data.items()), flush=True)
+    return 0
+
+
+def cmd_calibrate(args):
+    import calibration
+    from fancontrol import FanController
+    controller = FanController()
+    targets = controller._find_channels_by_paths(args.channels) if args.channels else controller.channels
+    if not targets:
+        print("No matching PWM channels found", file=sys.stderr)
+        return 1
+    cals = calibration.load_calibrations()
+    failed = 0
+    for ch in targets:
+        print(f"Calibrating {ch.pwm_file} (about {(args.steps + 1) * 2 * args.settle:.0f} s at most)...", flush=True)
+        try:
+            cal = calibration.calibrate(ch, steps=args.steps, settle=args.settle,
+                                        log=(lambda m: print("  " + m, flush=True)) if args.verbose else None)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        cals[calibration.channel_key(ch)] = cal
+        print(f"  fan {cal.fan_input}: {cal.min_rpm:.0f}-{cal.max_rpm:.0f} RPM, "
+              f"stops below PWM {cal.stop_pwm}, starts at {cal.start_pwm}")
+        # save after every channel: an interrupted run keeps what it measured
+        calibration.save_calibrations(cals)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="cpu-fan-controller", description="CPU fan controller (command-line mode)")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("list-channels", help="list PWM channels with fan speed")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_list_channels)
+
+    p = sub.add_parser("apply-profile", help="apply a profile once at the current temperature")
+    p.add_argument("profile")
+    p.add_argument("--temp", type=float, default=None, help="use this temperature instead of reading it")
+    p.add_argument("--channels", nargs="+", metavar="PWM_PATH", help="override the profile channels")
+    p.set_defaults(func=cmd_apply_profile)
+
+    p = sub.add_parser("set-pwm", help="set a fixed PWM value (0-255)")
+    p.add_argument("value", type=int)
+    p.add_argument("--channels", nargs="+", metavar="PWM_PATH", help="default: all channels")
+    p.add_argument("--parallel", action="store_true", help="write different hwmon chips concurrently")
+    p.add_argument("--write-timeout", type=float, default=1.0, help="with --parallel: per-write timeout [s]")
+    p.set_defaults(func=cmd_set_pwm)
+
+    p = sub.add_parser("calibrate", help="sweep each fan and store its PWM->RPM curve and start/stop PWM")
+    p.add_argument("--channels", nargs="+", metavar="PWM_PATH", help="default: all channels")
+    p.add_argument("--steps", type=int, default=16, help="PWM levels in the sweep")
+    p.add_argument("--settle", type=float, default=4.0, help="seconds to wait at each level")
+    p.add_argument("-v", "--verbose", action="store_true")
+    p.set_defaults(func=cmd_calibrate)
+
+    p = sub.add_parser("sample", help="print sensor samples")
+    p.add_argument("--json", action="store_true", help="one JSON object per line")
+    p.add_argument("-n", "--count", type=int, default=1)
+    p.add_argument("--interval", type=float, default=0.5,
+                   help="seconds before each sample (0: instant, without power/utilization)")
+    p.set_defaults(func=cmd_sample)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+# client.py - klient API procesu sterującego (service.py) dla GUI i narzędzi CLI
+import json
+import socket
+import threading
+
+from service import DEFAULT_SOCKET
+from sensors import HISTORY_COLUMNS
+from curve import FanCurve
+
+
+class ServiceError(RuntimeError):
+    pass
+
+
+def _connect(path, timeout):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(timeout)
+    try:
+        s.connect(path)
+    except OSError:
+        s.close()
+        raise
+    return s
+
+
+def available(path=DEFAULT_SOCKET):
+    """True if a control service answers on `path`."""
+    try:
+        c = ServiceClient(path, timeout=1.0)
+    except OSError:
+        return False
+    try:
+        return c.request("ping") == "pong"
+    except (OSError, ServiceError, ValueError):
+        return False
+    finally:
+        c.close()
+
+
+class SampleStream:
+    """Osobne połączenie, na którym serwer wypycha kolejne próbki."""
+    def __init__(self, path, interval=None):
+        self.sock = _connect(path, None)
+        self.file = self.sock.makefile("rwb")
+        self.file.write((json.dumps({"id": 0, "cmd": "subscribe", "interval": interval}) + "\n").encode())
+        self.file.flush()
+        ack = json.loads(self.file.readline() or b"{}")
+        if not ack.get("ok"):
+            self.close()
+            raise ServiceError(ack.get("error", "subscribe failed"))
+
+    def run(self, callback):
+        """Call callback(sample) for each pushed sample until close() or disconnect."""
+        try:
+            for line in self.file:
+                msg = json.loads(line)
+                if msg.get("event") == "sample":
+                    callback(msg["data"])
+        except (OSError, ValueError):
+            pass
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class ServiceClient:
+    """
+    Synchroniczne żądania JSON-lines do ControlService; jedno połączenie,
+    wywołania serializowane blokadą (bezpieczne z wielu wątków).
+    """
+    def __init__(self, path=DEFAULT_SOCKET, timeout=5.0):
+        self.path = path
+        self.sock = _connect(path, timeout)
+        self.file = self.sock.makefile("rwb")
+        self._id = 0
+        self._lock = threading.Lock()
+
+    def request(self, cmd, **params):
+        with self._lock:
+            self._id += 1
+            msg = dict(params, id=self._id, cmd=cmd)
+            self.file.write((json.dumps(msg) + "\n").encode())
+            self.file.flush()
+            while True:
+                line = self.file.readline()
+                if not line:
+                    raise ServiceError("control service closed the connection")
+                resp = json.loads(line)
+                if resp.get("id") == self._id:
+                    break
+        if not resp.get("ok"):
+            raise ServiceError(resp.get("error", "request failed"))
+        return resp.get("result")
+
+    def subscribe(self, interval=None):
+        return SampleStream(self.path, interval)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RemoteController:
+    """Podzbiór API FanController wykonywany przez proces sterujący."""
+    def __init__(self, client):
+        self.client = client
+
+    def list_channels(self):
+        return self.client.request("list_channels")
+
+    def rescan(self):
+        return self.client.request("rescan")
+
+    def set_pwm_on_list(self, paths, value, force=False):
+        return self.client.request("set_pwm", value=int(value), channels=list(paths), force=force)
+
+    def set_pwm_on_all(self, value, force=False):
+        return self.client.request("set_pwm", value=int(value), channels=None, force=force)
+
+    def apply_curve(self, temp_c, curve_points, channel_paths=None):
+        pts = curve_points.to_points() if isinstance(curve_points, FanCurve) else [list(p) for p in curve_points]
+        return self.client.request("apply_curve", points=pts, channels=channel_paths, temp=temp_c)
+
+    def write_stats(self):
+        return self.client.request("write_stats")
+
+
+class RemoteReader:
+    """
+    Lokalna historia (RingBuffer jak w SensorReader) zasilana strumieniem próbek
+    z procesu sterującego - GUI nie czyta sprzętu samo.
+    """
+    def __init__(self, sample_history=300):
+        from ringbuffer import RingBuffer
+        self.history = RingBuffer(sample_history, HISTORY_COLUMNS)
+        self.voltage = None
+
+    def add(self, data):
+        self.history.append(tuple((data.get(c) or 0.0) for c in HISTORY_COLUMNS))
+        self.voltage = data.get("voltage")
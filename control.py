@@ -0,0 +1,221 @@
+# control.py - silniki sterowania (krzywa / PID) i sterowanie zdarzeniami przy każdej próbce
+import time
+from collections import deque
+
+from curve import FanCurve
+
+
+class LatencyStats:
+    """Ostatnie `maxlen` opóźnień [s] z percentylami p50/p99."""
+    def __init__(self, maxlen=10000):
+        self.samples = deque(maxlen=maxlen)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds < 0:
+            return
+        self.samples.append(seconds)
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        vals = sorted(self.samples)
+        return vals[min(len(vals) - 1, int(len(vals) * p / 100.0))]
+
+    def report(self):
+        return {
+            "count": self.count,
+            "p50_ms": _ms(self.percentile(50)),
+            "p99_ms": _ms(self.percentile(99)),
+            "max_ms": _ms(self.max if self.count else None),
+        }
+
+
+def _ms(v):
+    return None if v is None else v * 1000.0
+
+
+class ControlEngine:
+    """
+    Wspólny interfejs silników sterowania dla FanController.apply_engine:
+    output(temp, now) -> PWM 0-255 oraz limity PWM per kanał (min, max).
+    """
+    name = "engine"
+
+    def __init__(self, limits=None):
+        # {pwm_file: (min, max)}; applied after output(), per channel
+        self.limits = {p: (int(lo), int(hi)) for p, (lo, hi) in (limits or {}).items()}
+
+    def output(self, temp_c, now=None):
+        raise NotImplementedError
+
+    def clamp(self, pwm_file, value):
+        lim = self.limits.get(pwm_file)
+        if lim is None:
+            return value
+        return max(lim[0], min(lim[1], value))
+
+    def reset(self):
+        pass
+
+
+class CurveEngine(ControlEngine):
+    """Bezstanowa krzywa temperatura -> PWM (dotychczasowe zachowanie)."""
+    name = "curve"
+
+    def __init__(self, curve, limits=None):
+        super().__init__(limits)
+        self.curve = curve if isinstance(curve, FanCurve) else FanCurve(curve)
+
+    def output(self, temp_c, now=None):
+        return self.curve.pwm_at(temp_c)
+
+
+class PIDEngine(ControlEngine):
+    """
+    Regulator PID do temperatury docelowej. Człon D liczony z pomiaru
+    (nie z uchybu) i wygładzany filtrem dolnoprzepustowym, bo odczyty
+    coretemp są zaszumione; całkowanie wstrzymywane przy nasyceniu wyjścia
+    (anti-windup); zmiana wyjścia ograniczona do `slew` PWM/s.
+    Opcjonalna krzywa `feedforward` daje punkt pracy, PID tylko go koryguje.
+    """
+    name = "pid"
+
+    def __init__(self, target, kp=8.0, ki=0.5, kd=0.0, bias=None, min_pwm=0, max_pwm=255,
+                 slew=None, d_filter=2.0, feedforward=None, limits=None):
+        super().__init__(limits)
+        self.target = float(target)
+        self.kp = float(kp)
+        self.ki = float(ki)
+        self.kd = float(kd)
+        self.min_pwm = int(min_pwm)
+        self.max_pwm = int(max_pwm)
+        if self.min_pwm > self.max_pwm:
+            raise ValueError("PID min_pwm is above max_pwm")
+        self.bias = float(bias) if bias is not None else (self.min_pwm + self.max_pwm) / 2.0
+        self.slew = float(slew) if slew else None      # PWM units per second
+        self.d_filter = float(d_filter)                 # derivative low-pass time constant [s]
+        if feedforward is not None and not isinstance(feedforward, FanCurve):
+            feedforward = FanCurve(feedforward)
+        self.feedforward = feedforward
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.d_state = 0.0
+        self.last_temp = None
+        self.last_time = None
+        self.last_out = None
+
+    def output(self, temp_c, now=None):
+        # now: time.monotonic() of live callers (or the simulated clock of a replay), never wall clock
+        now = time.monotonic() if now is None else now
+        dt = None if self.last_time is None else now - self.last_time
+        if dt is not None and dt <= 0:
+            # duplicate sample: hold the output, do not integrate twice
+            return int(round(self.last_out))
+        err = temp_c - self.target
+        if dt is not None:
+            rate = (temp_c - self.last_temp) / dt
+            alpha = dt / (self.d_filter + dt) if self.d_filter > 0 else 1.0
+            self.d_state += alpha * (rate - self.d_state)
+        base = self.feedforward.pwm_at(temp_c) if self.feedforward else self.bias
+        integral = self.integral + (err * dt if dt is not None else 0.0)
+        raw = base + self.kp * err + self.ki * integral + self.kd * self.d_state
+        out = max(self.min_pwm, min(self.max_pwm, raw))
+        if self.slew and self.last_out is not None and dt is not None:
+            step = self.slew * dt
+            out = max(self.last_out - step, min(self.last_out + step, out))
+        # anti-windup: keep integrating only while the output is not held back
+        # (clamp or slew) in the direction the error pushes it
+        if not ((out < raw and err > 0) or (out > raw and err < 0)):
+            self.integral = integral
+        self.last_temp = temp_c
+        self.last_time = now
+        self.last_out = out
+        return int(round(out))
+
+
+def make_engine(profile, curve=None):
+    """
+    Control engine for a profile dict, or None when it defines neither.
+    "engine": "curve" (default, needs "points") or "pid" with a "pid" section
+    {target, kp, ki, kd, bias, min_pwm, max_pwm, slew, d_filter}; "points" then
+    act as PID feedforward. "limits": {pwm_file: [min, max]} clamps channels.
+    "source" (the sample key to follow, e.g. "temp_p95") is read by the callers.
+    `curve`: the already compiled FanCurve of "points", if the caller has one.
+    """
+    profile = profile or {}
+    kind = profile.get("engine", "curve")
+    limits = profile.get("limits")
+    points = profile.get("points")
+    if points and curve is None:
+        curve = FanCurve(points)
+    if kind == "curve":
+        return CurveEngine(curve, limits) if curve else None
+    if kind == "pid":
+        params = dict(profile.get("pid") or {})
+        if "target" not in params:
+            raise ValueError("PID profile needs pid.target")
+        return PIDEngine(feedforward=curve, limits=limits, **params)
+    raise ValueError(f"Unknown control engine {kind!r}")
+
+
+def source_temp(data, source="temp"):
+    """Temperature a profile follows; plain "temp" when the source is not sampled."""
+    t = data.get(source)
+    return data.get("temp") if t is None else t
+
+
+def needs_percore(source):
+    """Whether `source` is a per-core aggregate (temp_p95, ccd3_temp, ...) rather than
+    a plain sample key or a RAPL domain (package1_power)."""
+    return source not in ("temp", "freq", "util", "power", "voltage") and not source.endswith("_power")
+
+
+class EventControl:
+    """
+    Odbiorca SampleHub (interval=None): każda nowa próbka temperatury od razu
+    wyznacza PWM silnikiem sterowania i zapisuje go, w wątku próbkującym - bez
+    pętli GUI po drodze. Mierzy opóźnienie od chwili próbki do zakończenia zapisu.
+    """
+    def __init__(self, controller, curve=None, channel_paths=None, on_applied=None, source="temp"):
+        self.controller = controller
+        # sample key the engine follows ("temp", "temp_p95", "ccd3_temp", ...)
+        self.source = source
+        self.engine = None
+        self.channel_paths = None
+        self.on_applied = on_applied
+        self.enabled = True
+        self.latency = LatencyStats()
+        self.last_result = None
+        if isinstance(curve, ControlEngine):
+            self.set_engine(curve)
+        else:
+            self.set_curve(curve)
+        self.set_channels(channel_paths)
+
+    def set_curve(self, pts):
+        self.engine = CurveEngine(pts) if pts else None
+
+    def set_engine(self, engine):
+        self.engine = engine
+
+    def set_channels(self, paths):
+        self.channel_paths = paths[:] if paths else None
+
+    def on_sample(self, data):
+        t = source_temp(data, self.source)
+        if not self.enabled or not self.engine or t is None:
+            return
+        # the sample's "time" is wall clock (steps with NTP); the PID needs monotonic dt
+        res = self.controller.apply_engine(t, self.engine, self.channel_paths, now=time.monotonic())
+        if "time" in data:
+            self.latency.add(time.time() - data["time"])
+        self.last_result = res
+        if res and self.on_applied:
+            self.on_applied(res)
@@ -0,0 +1,79 @@
+# curve.py - skompilowana krzywa wentylatora (temperatura -> PWM)
+
+
+def interpolate(points, temp_c):
+    """
+    Linear interpolation over (tempC, pwm) points, clamped to the end points.
+    Returns PWM as int 0-255 (the original apply_curve behaviour).
+    """
+    pts = sorted(points, key=lambda x: x[0])
+    if temp_c <= pts[0][0]:
+        pwm = pts[0][1]
+    elif temp_c >= pts[-1][0]:
+        pwm = pts[-1][1]
+    else:
+        pwm = pts[-1][1]
+        for i in range(len(pts)-1):
+            t0, p0 = pts[i]
+            t1, p1 = pts[i+1]
+            if t0 <= temp_c <= t1:
+                if t1 == t0:
+                    pwm = p1
+                else:
+                    frac = (temp_c - t0) / (t1 - t0)
+                    pwm = p0 + (p1 - p0) * frac
+                break
+    return max(0, min(255, int(pwm)))
+
+
+class FanCurve:
+    """
+    Krzywa skompilowana raz (przy wczytaniu profilu / edycji tabeli) do gęstej
+    tablicy temperatura -> PWM z krokiem `step` °C. Odczyt jest O(1).
+    """
+    def __init__(self, points, step=0.1):
+        pts = sorted((float(t), p) for t, p in points)
+        if not pts:
+            raise ValueError("Fan curve needs at least one point")
+        if step <= 0:
+            raise ValueError("Curve step must be positive")
+        self.points = pts
+        self.step = step
+        self.t_min = pts[0][0]
+        self.t_max = pts[-1][0]
+        n = int(round((self.t_max - self.t_min) / step)) + 1
+        self.lut = [interpolate(pts, self.t_min + i * step) for i in range(n)]
+        self._lut_array = None
+
+    def __call__(self, temp_c):
+        return self.pwm_at(temp_c)
+
+    def __eq__(self, other):
+        if not isinstance(other, FanCurve):
+            return NotImplemented
+        return self.points == other.points and self.step == other.step
+
+    def pwm_at(self, temp_c):
+        # NaN (failed sensor read) maps to the last point, like evaluate(); so does +inf
+        if temp_c != temp_c or temp_c >= self.t_max:
+            return self.lut[-1]
+        if temp_c <= self.t_min:
+            return self.lut[0]
+        return self.lut[int((temp_c - self.t_min) / self.step + 0.5)]
+
+    def evaluate(self, temps):
+        """
+        Vectorized lookup for a NumPy array (or sequence) of temperatures.
+        NaN temperatures map to the last curve point (fail-safe: highest PWM step).
+        """
+        import numpy as np
+        if self._lut_array is None:
+            self._lut_array = np.asarray(self.lut, dtype=np.uint8)
+        t = np.asarray(temps, dtype=np.float64)
+        idx = np.floor((t - self.t_min) / self.step + 0.5)
+        idx = np.nan_to_num(idx, nan=len(self.lut) - 1)
+        idx = np.clip(idx, 0, len(self.lut) - 1).astype(np.intp)
+        return self._lut_array[idx]
+
+    def to_points(self):
+        return [list(p) for p in self.points]
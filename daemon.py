@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# daemon.py - sterowanie wentylatorami bez GUI (bez PyQt6/pyqtgraph)
+import os
+import sys
+import math
+import time
+import signal
+import argparse
+import threading
+
+from sensors import SensorReader, HISTORY_COLUMNS
+from fancontrol import FanController
+from hwmon import HwmonIndex
+from hub import SampleHub, AdaptiveRate
+from control import EventControl, CurveEngine, make_engine, source_temp, needs_percore
+from service import DEFAULT_SOCKET
+from shmring import DEFAULT_SHM
+import utils
+
+# samples kept in the --shm history (24 h at the default 1 s poll)
+SHM_HISTORY = 86400
+# --shm columns: the plot history plus the voltage the GUI labels show
+SHM_COLUMNS = HISTORY_COLUMNS + ("voltage",)
+
+
+class FanDaemon:
+    """
+    Pętla sterowania bez GUI: odczyt czujników i zastosowanie silnika sterowania
+    z profilu (krzywa lub PID).
+    """
+    def __init__(self, profile=None, poll_interval=1.0, control_interval=2.0, deadband=0,
+                 telemetry_dir=None, event_driven=False, adaptive=False, percore=False, record_path=None,
+                 shm_name=None, shm_history=SHM_HISTORY, verbose=False):
+        profile = profile or {}
+        self.profile = profile
+        self.engine = make_engine(profile)
+        # sample key the profile follows; per-core keys need percore sampling
+        self.source = profile.get("source") or "temp"
+        self.channel_paths = profile.get("channels") or None
+        self.auto = self.engine is not None
+        self.verbose = verbose
+        # serializes the control loop with IPC requests (service.py)
+        self.lock = threading.Lock()
+        # one hwmon index shared by sensors and PWM discovery
+        self.hwmon = HwmonIndex(rescan_interval=300.0)
+        self.reader = SensorReader(sample_history=0, hwmon_index=self.hwmon,
+                                   percore=percore or needs_percore(self.source))
+        self.controller = FanController(deadband=deadband, hwmon_index=self.hwmon)
+        self.latest_temp = None
+        self.last_pwm = None
+        self.poll_interval = poll_interval
+        self.control_interval = control_interval
+        # the hub is the single-threaded deadline loop: one sensor read per tick
+        self.hub = SampleHub(self.reader)
+        self.hub.subscribe(self.poll, interval=poll_interval, name="poll")
+        self.event = None
+        self._control_subs = []
+        self.set_mode(event_driven, adaptive)
+        self.telemetry = None
+        self.power_telemetry = None
+        if telemetry_dir:
+            from telemetry import TelemetryStore, POWER_SUBDIR
+            self.telemetry = TelemetryStore(telemetry_dir)
+            if self.reader.rapl:
+                # package/core/dram power per socket, next to the main store
+                try:
+                    self.power_telemetry = TelemetryStore(os.path.join(telemetry_dir, POWER_SUBDIR),
+                                                          metrics=self.reader.rapl.metrics())
+                except ValueError as e:
+                    print(f"Warning: per-domain power not recorded: {e}", file=sys.stderr)
+            self.hub.subscribe(self.record, interval=poll_interval, name="telemetry")
+        self.recorder = None
+        if record_path:
+            from replay import TraceRecorder
+            self.recorder = TraceRecorder(record_path, self.controller.channels)
+            self.hub.subscribe(self.record_trace, interval=None, name="trace")
+        self.ring = None
+        if shm_name:
+            from shmring import SharedRingBuffer
+            self.ring = SharedRingBuffer.create(shm_name, shm_history, SHM_COLUMNS)
+            self.hub.subscribe(self.publish, interval=None, name="shm")
+
+    def log(self, msg):
+        if self.verbose:
+            print(msg, flush=True)
+
+    def poll(self, data):
+        t = source_temp(data, self.source)
+        if t is not None:
+            self.latest_temp = t
+
+    def event_sample(self, data):
+        self.poll(data)
+        with self.lock:
+            # set_mode may have switched to the timed loop since this tick was planned
+            if self.event:
+                self.event.on_sample(data)
+
+    def control(self, data):
+        self.poll(data)
+        if self.latest_temp is None or not self.engine or not self.auto:
+            return
+        with self.lock:
+            # monotonic like apply_once and EventControl, so a PID sees one timebase
+            res = self.controller.apply_engine(self.latest_temp, self.engine, self.channel_paths,
+                                               now=time.monotonic())
+        if res:
+            self.applied(res)
+            self.report()
+
+    def applied(self, res):
+        self.last_pwm = res["pwm"]
+        if res["errors"]:
+            print("PWM errors: " + "; ".join(res["errors"]), file=sys.stderr, flush=True)
+
+    def report(self, data=None):
+        if not self.verbose or self.latest_temp is None:
+            return
+        stats = self.controller.write_stats()
+        msg = (f"temp={self.latest_temp:.1f} pwm={self.last_pwm} "
+               f"syscalls_saved/tick={self.reader.syscalls_saved} "
+               f"writes={stats['issued']} suppressed={stats['suppressed']}")
+        lat = [(c["latency"], path) for path, c in stats["channels"].items() if c["latency"] is not None]
+        if lat:
+            slowest, path = max(lat)
+            msg += f" slowest_write={slowest * 1000:.2f}ms ({path})"
+        if self.reader.percore:
+            hot = ", ".join(f"cpu{c}={t:.0f}" for c, t in self.reader.percore.hottest(3))
+            msg += f" source={self.source} hottest=[{hot}]"
+        if self.hub.adaptive:
+            msg += f" interval={self.hub.adaptive.interval:.2f}s samples={self.hub.samples}"
+        if self.event:
+            lat = self.event.latency.report()
+            if lat["count"]:
+                msg += f" latency_p50={lat['p50_ms']:.2f}ms p99={lat['p99_ms']:.2f}ms"
+        self.log(msg)
+
+    # runtime changes (used by the IPC service)
+
+    def state(self):
+        return {
+            "profile": self.profile,
+            "auto": self.auto,
+            "engine": self.engine.name if self.engine else None,
+            "source": self.source,
+            "channels": self.channel_paths,
+            "temp": self.latest_temp,
+            "pwm": self.last_pwm,
+            "event_driven": self.event is not None,
+            "adaptive": self.hub.adaptive is not None,
+            "shm": self.ring.name if self.ring else None,
+        }
+
+    def set_profile(self, profile, auto=None, curve=None):
+        # curve: compiled FanCurve of profile["points"] (ProfileStore keeps one)
+        engine = make_engine(profile, curve=curve)
+        source = profile.get("source") or "temp"
+        if needs_percore(source) and self.reader.percore is None:
+            # otherwise source_temp() would find no such key and the profile would never act
+            try:
+                self.reader.enable_percore()
+            except Exception as e:
+                raise ValueError(f"source {source!r} needs per-core sampling, which failed: {e}")
+        with self.lock:
+            self.profile = profile
+            self.engine = engine
+            self.channel_paths = profile.get("channels") or None
+            self.source = source
+            if self.event:
+                self.event.set_engine(engine)
+                self.event.source = self.source
+                self.event.set_channels(self.channel_paths)
+        if auto is not None:
+            self.set_auto(auto)
+
+    def set_auto(self, on):
+        with self.lock:
+            on = bool(on) and self.engine is not None
+            if on and not self.auto:
+                # PID state from before a manual period would kick the fans
+                self.engine.reset()
+            self.auto = on
+            if self.event:
+                self.event.enabled = self.auto
+
+    def set_mode(self, event_driven=False, adaptive=False):
+        """Switch between the timed control loop and one run per sample (implied by adaptive)."""
+        # with an adaptive pace the control loop must follow the samples
+        event_driven = bool(event_driven or adaptive)
+        with self.lock:
+            for sub in self._control_subs:
+                self.hub.unsubscribe(sub)
+            if event_driven:
+                if self.event is None:
+                    # every sample goes straight to engine + write; the report replaces the timed loop
+                    self.event = EventControl(self.controller, self.engine, self.channel_paths,
+                                              on_applied=self.applied, source=self.source)
+                    self.event.enabled = self.auto
+                self._control_subs = [
+                    self.hub.subscribe(self.event_sample, interval=None, name="control"),
+                    self.hub.subscribe(self.report, interval=self.control_interval, name="report"),
+                ]
+            else:
+                self.event = None
+                self._control_subs = [self.hub.subscribe(self.control, interval=self.control_interval,
+                                                         name="control")]
+        self.hub.set_adaptive(AdaptiveRate(base_interval=self.poll_interval) if adaptive else None)
+
+    def set_pwm(self, value, channels=None, force=True):
+        with self.lock:
+            if channels:
+                return self.controller.set_pwm_on_list(channels, value, force=force)
+            return self.controller.set_pwm_on_all(value, force=force)
+
+    def apply_once(self, points=None, channels=None, temp=None):
+        engine = CurveEngine(points) if points else self.engine
+        if engine is None:
+            raise ValueError("no curve points")
+        if temp is None:
+            temp = self.latest_temp
+        if temp is None:
+            raise ValueError("no temperature sample yet")
+        with self.lock:
+            res = self.controller.apply_engine(temp, engine, channels or self.channel_paths)
+        if res:
+            self.applied(res)
+        return res
+
+    def rescan(self):
+        with self.lock:
+            self.controller.rescan()
+
+    def record(self, data):
+        self.telemetry.add(dict(data, pwm=self.last_pwm))
+        if self.power_telemetry:
+            self.power_telemetry.add(data)
+
+    def record_trace(self, data):
+        self.recorder.add(data, self.last_pwm)
+
+    def publish(self, data):
+        # history columns as in SensorReader (0.0 when missing); voltage only feeds labels
+        row = [data.get(c) or 0.0 for c in HISTORY_COLUMNS]
+        v = data.get("voltage")
+        row.append(math.nan if v is None else v)
+        self.ring.append(row)
+
+    def run(self):
+        try:
+            self.hub.run()
+        finally:
+            if self.telemetry:
+                self.telemetry.close()
+            if self.power_telemetry:
+                self.power_telemetry.close()
+            if self.recorder:
+                self.recorder.close()
+            if self.ring:
+                self.ring.close()
+                self.ring.unlink()
+            if self.event:
+                lat = self.event.latency.report()
+                if lat["count"]:
+                    print(f"sample->write latency over {lat['count']} samples: "
+                          f"p50 {lat['p50_ms']:.2f} ms, p99 {lat['p99_ms']:.2f} ms, "
+                          f"max {lat['max_ms']:.2f} ms", flush=True)
+
+    def stop(self, *args):
+        self.hub.stop()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Headless CPU fan control daemon")
+    ap.add_argument("-p", "--profile", help="profile name (user or system); optional with --socket")
+    ap.add_argument("--poll-interval", type=float, default=1.0, help="sensor sampling interval [s]")
+    ap.add_argument("--control-interval", type=float, default=2.0, help="control (curve/PID) interval [s]")
+    ap.add_argument("--deadband", type=int, default=0,
+                    help="skip PWM writes that differ from the last one by at most this many units")
+    ap.add_argument("--telemetry", metavar="DIR",
+                    help="keep long-term history (1 s / 1 min / 1 h archives) in DIR")
+    ap.add_argument("--record", metavar="FILE",
+                    help="append every sample with the applied PWM and fan RPM to a binary trace (see replay.py)")
+    ap.add_argument("--event-driven", action="store_true",
+                    help="run the control engine on every new sample instead of every --control-interval")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="poll slowly (up to 8 s) when idle and fast (250 ms) on temperature/load spikes; "
+                         "implies --event-driven")
+    ap.add_argument("--percore", action="store_true",
+                    help="sample every core (temp/freq/util) and add temp_max, temp_p95, packageN_temp, "
+                         "ccdN_temp to samples; on automatically for profiles with a \"source\"")
+    ap.add_argument("--rpm-loop", action="store_true",
+                    help="drive calibrated fans by target RPM with stall detection (run 'main.py calibrate' first)")
+    ap.add_argument("--parallel-writes", action="store_true",
+                    help="write PWM to different hwmon chips concurrently (same chip stays serialized)")
+    ap.add_argument("--write-timeout", type=float, default=1.0,
+                    help="with --parallel-writes: report a channel as failed after this many seconds")
+    ap.add_argument("--metrics", metavar="PORT|SOCKET",
+                    help="serve Prometheus metrics on 127.0.0.1:PORT or a Unix socket path")
+    ap.add_argument("--socket", metavar="PATH", nargs="?", const=DEFAULT_SOCKET,
+                    help=f"serve the local control API (GUI/CLI clients) on a Unix socket (default {DEFAULT_SOCKET})")
+    ap.add_argument("--shm", metavar="NAME", nargs="?", const=DEFAULT_SHM,
+                    help=f"publish the sample history in shared memory /dev/shm/NAME for GUIs to read "
+                         f"without copies (default {DEFAULT_SHM})")
+    ap.add_argument("--shm-history", type=int, default=SHM_HISTORY, help="samples kept in the --shm history")
+    ap.add_argument("--exit-with-parent", action="store_true",
+                    help="stop when the process that started the daemon exits (GUI worker)")
+    ap.add_argument("--group", default="cpufan",
+                    help="group whose members may change fan settings through --socket")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    if not args.profile and not args.socket:
+        ap.error("--profile is required unless --socket is given")
+    profile = None
+    if args.profile:
+        try:
+            profile = utils.load_profile(args.profile)
+            if make_engine(profile) is None:
+                raise ValueError(f"profile {args.profile} has no curve points")
+        except Exception as e:
+            print(f"Cannot load profile: {e}", file=sys.stderr)
+            if not args.socket:
+                return 1
+            profile = None
+
+    try:
+        daemon = FanDaemon(profile, poll_interval=args.poll_interval,
+                           control_interval=args.control_interval, deadband=args.deadband,
+                           telemetry_dir=args.telemetry, event_driven=args.event_driven,
+                           adaptive=args.adaptive, percore=args.percore, record_path=args.record,
+                           shm_name=args.shm, shm_history=args.shm_history, verbose=args.verbose)
+    except ValueError as e:
+        print(f"Cannot start: {e}", file=sys.stderr)
+        return 1
+    if not daemon.controller.channels:
+        print("Warning: no PWM channels found in /sys/class/hwmon", file=sys.stderr)
+    if args.parallel_writes:
+        daemon.controller.set_parallel(True, args.write_timeout)
+    if args.rpm_loop:
+        from calibration import load_calibrations
+        missing = daemon.controller.enable_rpm_loop(load_calibrations())
+        for path in missing:
+            print(f"Warning: {path} is not calibrated, driven by plain PWM", file=sys.stderr)
+    if args.metrics:
+        import metrics
+        try:
+            metrics.serve(args.metrics)
+        except (OSError, ValueError) as e:
+            print(f"Cannot serve metrics on {args.metrics}: {e}", file=sys.stderr)
+            return 1
+    service = None
+    if args.socket:
+        from service import ControlService
+        try:
+            service = ControlService(daemon, args.socket, group=args.group)
+        except (OSError, ValueError) as e:
+            print(f"Cannot serve the control API on {args.socket}: {e}", file=sys.stderr)
+            return 1
+        service.start()
+    if args.exit_with_parent:
+        parent = os.getppid()
+
+        def check_parent(data):
+            # a GUI killed without closeEvent must not leave its worker driving the fans
+            if os.getppid() != parent:
+                daemon.stop()
+        daemon.hub.subscribe(check_parent, interval=2.0, name="parent")
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    try:
+        daemon.run()
+    finally:
+        if service:
+            service.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,46 @@
 # fancontrol.py (zaktualizowane)
 import os
-import glob
 import re
 import json
+import time
+import queue
+import threading
+
+import sysfs
+from metrics import registry
+from hwmon import HwmonIndex
+from curve import FanCurve, interpolate
+
+# cached hardware state older than this [s] is re-written even if unchanged,
+# so a BIOS/driver reset of pwm or pwm_enable gets corrected eventually
+STATE_MAX_AGE = 60.0
+# seconds a parallel write may take before its channel is reported as timed out
+WRITE_TIMEOUT = 1.0
 
 class PWMChannel:
-    def __init__(self, pwm_path):
+    def __init__(self, pwm_path, deadband=0):
         self.pwm_file = pwm_path
         self.dir = os.path.dirname(pwm_path)
         # determine hwmon name if available
         self.hwmon = os.path.basename(self.dir)
         # friendly name
         self.name = self._resolve_name()
-        # find enable and fan input files if present
-        self.enable_file = None
-        self.fan_input_file = None
-        for f in os.listdir(self.dir):
-            if f.startswith("pwm") and f.endswith("_enable"):
-                self.enable_file = os.path.join(self.dir, f)
-            if re.match(r"fan\d+_input", f):
-                self.fan_input_file = os.path.join(self.dir, f)
+        # pwmN pairs with pwmN_enable and (by hwmon convention) fanN_input;
+        # calibration records the tachometer that really follows this channel
+        self.index = int(re.match(r"pwm(\d+)$", os.path.basename(pwm_path)).group(1))
+        self.enable_file, self.fan_input_file = self._find_files()
+        # last state written to hardware (None/False = unknown)
+        self.deadband = deadband
+        self.last_pwm = None
+        self.manual = False
+        # when pwm and pwm_enable were last written: each is re-asserted on its own
+        # schedule, so a stream of duty changes cannot hide a reset of pwm_enable
+        self.state_time = 0.0
+        self.enable_time = 0.0
+        self.writes_issued = 0
+        self.writes_suppressed = 0
+        # seconds the last set_manual + set_pwm took (None before the first)
+        self.write_latency = None
 
     def _resolve_name(self):
         # try to read name file in hwmon dir
@@ -33,58 +54,318 @@ class PWMChannel:
         # fallback to dirname
         return self.hwmon
 
-    def set_manual(self):
-        if self.enable_file and os.path.exists(self.enable_file):
+    def _find_files(self):
+        files = set(os.listdir(self.dir))
+        enable = f"pwm{self.index}_enable"
+        fan = f"fan{self.index}_input"
+        return (os.path.join(self.dir, enable) if enable in files else None,
+                os.path.join(self.dir, fan) if fan in files else None)
+
+    def _now(self):
+        return time.monotonic()
+
+    def _write_attr(self, path, value):
+        sysfs.handles.get(path, writable=True).write(value)
+
+    def invalidate(self):
+        """Forget the cached hardware state; the next set_* call writes again."""
+        self.last_pwm = None
+        self.manual = False
+
+    def _state_fresh(self, since=None):
+        return self._now() - (self.state_time if since is None else since) < STATE_MAX_AGE
+
+    def set_manual(self, force=False):
+        if self.enable_file:
+            if self.manual and not force and self._state_fresh(self.enable_time):
+                self.writes_suppressed += 1
+                registry.inc("pwm_enable_writes_suppressed_total", channel=self.pwm_file)
+                return False
             try:
-                with open(self.enable_file, "w") as f:
-                    f.write("1")
+                with registry.timed("pwm_enable_write", channel=self.pwm_file):
+                    self._write_attr(self.enable_file, "1")
+            except FileNotFoundError:
+                return False
             except Exception as e:
+                self.invalidate()
                 raise PermissionError(f"Cannot set manual mode for {self.pwm_file}: {e}")
+            self.writes_issued += 1
+            self.manual = True
+            self.enable_time = self._now()
+            return True
+        return False
 
-    def set_pwm(self, value):
+    def set_pwm(self, value, force=False):
         if not (0 <= value <= 255):
             raise ValueError("PWM value must be 0-255")
-        if not os.path.exists(self.pwm_file):
-            raise FileNotFoundError(self.pwm_file)
+        value = int(value)
+        if not force and self.last_pwm is not None and self._state_fresh():
+            # within the deadband only 0 and 255 (stop / full speed) still go through
+            if value == self.last_pwm or (abs(value - self.last_pwm) <= self.deadband
+                                          and value not in (0, 255)):
+                self.writes_suppressed += 1
+                registry.inc("pwm_writes_suppressed_total", channel=self.pwm_file)
+                return False
         try:
-            with open(self.pwm_file, "w") as f:
-                f.write(str(int(value)))
+            with registry.timed("pwm_write", channel=self.pwm_file):
+                self._write_attr(self.pwm_file, value)
+        except FileNotFoundError:
+            self.invalidate()
+            raise FileNotFoundError(self.pwm_file)
         except Exception as e:
+            self.invalidate()
             raise PermissionError(f"Cannot write pwm {self.pwm_file}: {e}")
+        self.writes_issued += 1
+        self.last_pwm = value
+        self.state_time = self._now()
+        return True
 
     def read_rpm(self):
-        if self.fan_input_file and os.path.exists(self.fan_input_file):
+        if self.fan_input_file:
             try:
-                with open(self.fan_input_file) as f:
-                    return int(f.read().strip())
+                return sysfs.handles.get(self.fan_input_file).read_int()
             except:
                 return None
         return None
 
+    def write(self, value, force=False):
+        """set_manual + set_pwm, timing both into write_latency."""
+        t0 = time.perf_counter()
+        try:
+            self.set_manual(force)
+            self.set_pwm(value, force)
+        finally:
+            self.write_latency = time.perf_counter() - t0
+
+
+class _WriteJob:
+    __slots__ = ("channel", "value", "force", "error", "done")
+
+    def __init__(self, channel, value, force):
+        self.channel = channel
+        self.value = value
+        self.force = force
+        self.error = None
+        self.done = False
+
+    def run(self):
+        try:
+            self.channel.write(self.value, self.force)
+        except Exception as e:
+            self.error = str(e)
+        self.done = True
+
+
+class ChipWriter:
+    """
+    Wątek zapisów jednego chipu hwmon: zapisy do tego samego chipu idą po kolei
+    (wspólna magistrala I2C/SMBus sterownika), różne chipy - równolegle.
+    """
+    def __init__(self, key):
+        self.key = key
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = 0              # batches queued or running
+        self.thread = threading.Thread(target=self._run, name=f"pwm-{os.path.basename(key)}", daemon=True)
+        self.thread.start()
+
+    def busy(self):
+        with self.lock:
+            return self.pending > 0
+
+    def submit(self, jobs, done):
+        with self.lock:
+            self.pending += 1
+        self.queue.put((jobs, done))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            jobs, done = item
+            for job in jobs:
+                job.run()
+            with self.lock:
+                self.pending -= 1
+            done.release()
+
+    def close(self):
+        self.queue.put(None)
+
+
+class WriteFanout:
+    """
+    Równoległy zapis PWM na wiele chipów: jeden ChipWriter na chip, wywołujący
+    czeka najwyżej `timeout` s, więc pełna aktualizacja trwa tyle, co najwolniejszy
+    chip, a nie suma wszystkich zapisów. Kanał, którego zapis nie zdążył
+    (zawieszony sterownik), jest zgłaszany jako błąd, a jego chip nie dostaje
+    nowych zapisów, dopóki poprzedni się nie skończy; pozostałe chipy działają dalej.
+    """
+    def __init__(self, timeout=WRITE_TIMEOUT):
+        self.timeout = timeout
+        self.writers = {}
+
+    def write(self, items, force=False):
+        """items: [(PWMChannel, value)]; returns the error list."""
+        groups = {}
+        for c, value in items:
+            groups.setdefault(c.dir, []).append(_WriteJob(c, value, force))
+        errs = []
+        done = threading.Semaphore(0)
+        submitted = []
+        batches = 0
+        for key, jobs in groups.items():
+            w = self.writers.get(key)
+            if w is None:
+                w = self.writers[key] = ChipWriter(key)
+            if w.busy():
+                for job in jobs:
+                    registry.inc("pwm_writes_skipped_busy_total", channel=job.channel.pwm_file)
+                    errs.append(f"Skipped {job.channel.pwm_file}: previous write to "
+                                f"{os.path.basename(key)} still pending")
+                continue
+            w.submit(jobs, done)
+            submitted.extend(jobs)
+            batches += 1
+        deadline = time.monotonic() + self.timeout
+        for _ in range(batches):
+            if not done.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                break
+        for job in submitted:
+            if not job.done:
+                registry.inc("pwm_write_timeouts_total", channel=job.channel.pwm_file)
+                errs.append(f"Write to {job.channel.pwm_file} timed out after {self.timeout:g} s")
+            elif job.error:
+                errs.append(job.error)
+        return errs
+
+    def close(self):
+        for w in self.writers.values():
+            w.close()
+        self.writers = {}
+
 class FanController:
     """
     Odszukuje kanały PWM w /sys/class/hwmon/hwmon* i pozwala:
      - listować kanały (z opisem),
      - ustawiać PWM na wybranych kanałach lub na wszystkich,
-     - zastosować krzywą (interpolacja).
+     - zastosować krzywą (interpolacja) lub dowolny silnik sterowania (PID).
     """
-    def __init__(self):
+    def __init__(self, deadband=0, hwmon_index=None, sysfs_root=None, parallel=False,
+                 write_timeout=WRITE_TIMEOUT):
+        self.deadband = deadband
+        # writes to different chips in parallel (WriteFanout), when enabled
+        self.fanout = WriteFanout(write_timeout) if parallel else None
+        root = sysfs_root or sysfs.SYSFS_ROOT
+        self.hwmon = hwmon_index or HwmonIndex(os.path.join(root, "class", "hwmon"))
+        self.channels = self._discover_pwm_channels()
+        # index generation the channels were built from (SensorReader's timed rescan bumps it)
+        self.generation = getattr(self.hwmon, "generation", 0)
+        # RPM closed loop (calibration.RPMLoop) per pwm_file, when enabled
+        self.calibrations = None
+        self.loops = {}
+
+    def rescan(self):
+        """Re-read the hwmon tree (hotplugged/reloaded drivers) and rebuild channels."""
+        self.hwmon.rescan()
+        self.generation = getattr(self.hwmon, "generation", 0)
         self.channels = self._discover_pwm_channels()
+        if self.calibrations is not None:
+            self.enable_rpm_loop(self.calibrations)
+
+    def _sync(self):
+        """Follow a rescan of the shared HwmonIndex: add/drop channels, keep the state of the rest."""
+        gen = getattr(self.hwmon, "generation", 0)
+        if gen == self.generation:
+            return
+        self.generation = gen
+        old = {c.pwm_file: c for c in self.channels}
+        channels = []
+        for pwm_path in self.hwmon.pwm_paths():
+            c = old.get(pwm_path)
+            if c is None:
+                try:
+                    c = PWMChannel(pwm_path, deadband=self.deadband)
+                except Exception:
+                    continue
+            channels.append(c)
+        self.channels = channels
+        if self.calibrations is not None:
+            self.enable_rpm_loop(self.calibrations)
+
+    def enable_rpm_loop(self, calibrations):
+        """
+        Drive calibrated channels by target RPM (engine output = share of each
+        fan's RPM range) with stall detection. Returns the uncalibrated channels.
+        """
+        from calibration import RPMLoop, channel_key
+        self.calibrations = calibrations
+        self.loops = {}
+        missing = []
+        for c in self.channels:
+            cal = calibrations.get(channel_key(c))
+            if cal is None or not cal.fan_input:
+                missing.append(c.pwm_file)
+                continue
+            self.loops[c.pwm_file] = RPMLoop(c, cal)
+        return missing
+
+    def disable_rpm_loop(self):
+        self.calibrations = None
+        self.loops = {}
+
+    def set_parallel(self, on, write_timeout=WRITE_TIMEOUT):
+        """Write different hwmon chips concurrently, waiting at most write_timeout s."""
+        if self.fanout:
+            self.fanout.close()
+        self.fanout = WriteFanout(write_timeout) if on else None
+
+    def _write(self, items, force=False):
+        """items: [(PWMChannel, value)]; returns the error list."""
+        if self.fanout:
+            # even a single chip: the timeout bounds a hung write, and a chip whose
+            # earlier write is still pending must not get a second one
+            return self.fanout.write(items, force)
+        errs = []
+        for c, value in items:
+            try:
+                c.write(value, force)
+            except Exception as e:
+                errs.append(str(e))
+        return errs
+
+    def set_deadband(self, deadband):
+        """Hysteresis in PWM units: changes this small are not written to hardware."""
+        self.deadband = max(0, int(deadband))
+        for c in self.channels:
+            c.deadband = self.deadband
+
+    def invalidate(self):
+        for c in self.channels:
+            c.invalidate()
+
+    def write_stats(self):
+        per_channel = {}
+        issued = suppressed = 0
+        for c in self.channels:
+            per_channel[c.pwm_file] = {"issued": c.writes_issued, "suppressed": c.writes_suppressed,
+                                       "latency": c.write_latency}
+            issued += c.writes_issued
+            suppressed += c.writes_suppressed
+        return {"issued": issued, "suppressed": suppressed, "channels": per_channel}
 
     def _discover_pwm_channels(self):
-        hwmons = glob.glob("/sys/class/hwmon/hwmon*")
         channels = []
-        for h in hwmons:
-            for f in os.listdir(h):
-                if re.match(r"pwm\d+$", f):
-                    pwm_path = os.path.join(h, f)
-                    try:
-                        channels.append(PWMChannel(pwm_path))
-                    except Exception:
-                        continue
+        for pwm_path in self.hwmon.pwm_paths():
+            try:
+                channels.append(PWMChannel(pwm_path, deadband=self.deadband))
+            except Exception:
+                continue
         return channels
 
     def list_channels(self):
+        self._sync()
         out = []
         for c in self.channels:
             out.append({
@@ -92,12 +373,14 @@ class FanController:
                 "hwmon": c.hwmon,
                 "pwm_file": c.pwm_file,
                 "enable_file": c.enable_file,
-                "fan_input": c.fan_input_file
+                "fan_input": c.fan_input_file,
+                "rpm_loop": self.loops[c.pwm_file].state() if c.pwm_file in self.loops else None
             })
         return out
 
     def _find_channels_by_paths(self, paths):
         # given list of pwm_file paths, return PWMChannel objects
+        self._sync()
         out = []
         pathset = set(paths or [])
         for c in self.channels:
@@ -105,56 +388,60 @@ class FanController:
                 out.append(c)
         return out
 
-    def set_pwm_on_list(self, paths, value):
+    def set_pwm_on_list(self, paths, value, force=False):
         errs = []
         targets = self._find_channels_by_paths(paths)
         if not targets:
             errs.append("No matching PWM channels found for given paths")
-        for c in targets:
-            try:
-                c.set_manual()
-                c.set_pwm(value)
-            except Exception as e:
-                errs.append(str(e))
-        return errs
+        return errs + self._write([(c, value) for c in targets], force)
 
-    def set_pwm_on_all(self, value):
-        errs = []
-        for c in self.channels:
-            try:
-                c.set_manual()
-                c.set_pwm(value)
-            except Exception as e:
-                errs.append(str(e))
-        return errs
+    def set_pwm_on_all(self, value, force=False):
+        self._sync()
+        return self._write([(c, value) for c in self.channels], force)
 
     def apply_curve(self, temp_c, curve_points, channel_paths=None):
         """
-        curve_points: list of (tempC, pwm 0-255)
+        curve_points: FanCurve (compiled, O(1) lookup) or list of (tempC, pwm 0-255)
         channel_paths: optional list of pwm_file paths to apply to; if None -> all channels
         """
         if not curve_points:
             return None
-        pts = sorted(curve_points, key=lambda x: x[0])
-        if temp_c <= pts[0][0]:
-            pwm = pts[0][1]
-        elif temp_c >= pts[-1][0]:
-            pwm = pts[-1][1]
+        if isinstance(curve_points, FanCurve):
+            pwm = curve_points.pwm_at(temp_c)
         else:
-            pwm = pts[-1][1]
-            for i in range(len(pts)-1):
-                t0, p0 = pts[i]
-                t1, p1 = pts[i+1]
-                if t0 <= temp_c <= t1:
-                    if t1 == t0:
-                        pwm = p1
-                    else:
-                        frac = (temp_c - t0) / (t1 - t0)
-                        pwm = p0 + (p1 - p0) * frac
-                    break
-        pwm = max(0, min(255, int(pwm)))
+            pwm = interpolate(curve_points, temp_c)
         if channel_paths:
             errs = self.set_pwm_on_list(channel_paths, pwm)
         else:
             errs = self.set_pwm_on_all(pwm)
-        return {"pwm": pwm, "errors": errs}
\ No newline at end of file
+        return {"pwm": pwm, "errors": errs}
+
+    def apply_engine(self, temp_c, engine, channel_paths=None, now=None):
+        """
+        engine: control.ControlEngine (curve, PID, ...); its output goes to all
+        channels (or channel_paths), clamped by the engine's per-channel limits.
+        """
+        if engine is None:
+            return None
+        pwm = engine.output(temp_c, now)
+        self._sync()
+        targets = self._find_channels_by_paths(channel_paths) if channel_paths else self.channels
+        errs = []
+        if channel_paths and not targets:
+            errs.append("No matching PWM channels found for given paths")
+        items = []
+        for c in targets:
+            try:
+                loop = self.loops.get(c.pwm_file)
+                if loop:
+                    # duty is a share of the RPM range; the limits bound the PWM the loop writes
+                    value = loop.update(pwm, limits=engine.limits.get(c.pwm_file))
+                    if loop.new_stall:
+                        errs.append(f"Fan on {c.pwm_file} stalled (0 RPM at PWM >= {loop.cal.start_pwm})")
+                else:
+                    value = engine.clamp(c.pwm_file, pwm)
+                items.append((c, value))
+            except Exception as e:
+                errs.append(str(e))
+        errs += self._write(items)
+        return {"pwm": pwm, "errors": errs}
@@ -2,6 +2,7 @@
 import os
 import time
 import json
+import threading
 from PyQt6.QtCore import QTimer, Qt, QThread, pyqtSignal
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QLabel,
                              QPushButton, QListWidget, QMessageBox, QHBoxLayout,
@@ -11,81 +12,200 @@ import pyqtgraph as pg
 
 from sensors import SensorReader
 from fancontrol import FanController
+from curve import FanCurve
+from hwmon import HwmonIndex
+from hub import SampleHub, AdaptiveRate, Snapshot
+from control import EventControl, CurveEngine, make_engine
+from lod import LODHistory
 import utils
 
+# the UI tick (labels + plots together) runs at most this often; it only
+# reads the latest snapshot, so samples never queue up in the Qt event loop
+MAX_FPS = 20
+
+# plot history kept in the ring buffer (24 h at the default 1 s poll); the plots
+# draw it through LODHistory, so the redraw cost does not grow with this
+HISTORY_SAMPLES = 86400
+
 class PollThread(QThread):
-    sample_signal = pyqtSignal(dict)
-    def __init__(self, interval=1.0):
+    """Drives the shared SampleHub at `interval`; the GUI reads hub.snapshot."""
+    def __init__(self, hub, interval=1.0):
         super().__init__()
         self.interval = interval
-        self._running = True
-        self.reader = SensorReader()
+        self.hub = hub
+        self.reader = hub.reader
+        self.snapshot = hub.snapshot
+        # only paces the sampling: every sample lands in hub.snapshot anyway
+        self.hub.subscribe(lambda data: None, interval=interval, name="gui")
     def run(self):
-        while self._running:
-            data = self.reader.sample()
-            self.sample_signal.emit(data)
-            time.sleep(self.interval)
+        self.hub.run()
     def stop(self):
-        self._running = False
+        self.hub.stop()
+
+class RemotePollThread(QThread):
+    """Receives the control service's sample stream (client mode)."""
+    def __init__(self, client, reader):
+        super().__init__()
+        self.reader = reader
+        self.snapshot = Snapshot()
+        self.stream = client.subscribe(interval=None)
+    def run(self):
+        self.stream.run(self._on_sample)
+    def _on_sample(self, data):
+        self.reader.add(data)
+        self.snapshot.publish(data)
+    def stop(self):
+        self.stream.close()
 
 class ControlThread(QThread):
     applied_pwm = pyqtSignal(int)
     def __init__(self, controller, curve_points, channel_paths=None, mode='auto', interval=2.0):
         super().__init__()
         self.controller = controller
-        self.curve = curve_points[:]
-        self.channel_paths = channel_paths[:] if channel_paths else None
+        # event-driven path: engine applied in the poll thread on every sample
+        self.event = EventControl(controller, on_applied=lambda res: self.applied_pwm.emit(int(res['pwm'])))
+        self.event_driven = False
+        self.engine = None
+        self.set_curve(curve_points)
+        self.set_channels(channel_paths)
         self.interval = interval
         self.mode = mode
         self._running = True
+        self._wake = threading.Event()
         self.current_temp = 0.0
+    def set_event_driven(self, on):
+        self.event_driven = on
+        self._wake.set()
     def set_temp(self, t):
         self.current_temp = t
+    def on_sample(self, data):
+        # hub subscriber: called from the poll thread, not through the GUI
+        if data.get("temp") is not None:
+            self.current_temp = data["temp"]
+        if self.mode == 'auto' and self.event_driven:
+            self.event.on_sample(data)
     def set_curve(self, pts):
-        self.curve = pts[:]
+        # compile once here; run() only does O(1) lookups
+        self.set_engine(CurveEngine(pts) if pts else None)
+    def set_engine(self, engine):
+        self.engine = engine
+        self.event.set_engine(engine)
     def set_channels(self, paths):
         self.channel_paths = paths[:] if paths else None
+        self.event.set_channels(paths)
     def run(self):
         while self._running:
-            if self.mode == 'auto' and self.curve:
-                res = self.controller.apply_curve(self.current_temp, self.curve, self.channel_paths)
+            if self.event_driven:
+                # samples drive the writes; sleep until switched back or stopped
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            if self.mode == 'auto' and self.engine:
+                res = self.controller.apply_engine(self.current_temp, self.engine, self.channel_paths)
                 if res and 'pwm' in res:
                     self.applied_pwm.emit(int(res['pwm']))
-            time.sleep(self.interval)
+            self._wake.wait(self.interval)
+            self._wake.clear()
     def stop(self):
         self._running = False
+        self._wake.set()
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, client=None, worker=None):
+        """
+        client: client.ServiceClient -> thin client of the control service (no root needed);
+        worker: the worker.Worker process behind `client`, stopped with the window.
+        """
         super().__init__()
         self.setWindowTitle("CPU Monitor & Fan Controller")
         self.resize(1100, 750)
-        self.reader = SensorReader()
-        self.controller = FanController()
-        self.poll_thread = PollThread(interval=1.0)
-        self.poll_thread.sample_signal.connect(self.on_sample)
-        self.poll_thread.start()
+        self.client = client
+        self.worker = worker
+        self.hub = None
+        self.control_thread = None
+        self.poll_thread = None
+        state = {}
+        if client:
+            # sampling and PWM writes happen in the service (or our worker) process
+            from client import RemoteController, RemoteReader
+            self.controller = RemoteController(client)
+            try:
+                state = client.request("get_state")
+            except Exception:
+                pass
+            self.reader = None
+            if state.get("shm"):
+                try:
+                    # the service's own history: no stream, no copies, read when a tick wants it
+                    from shmring import SharedReader
+                    self.reader = SharedReader(state["shm"])
+                    self.snapshot = self.reader
+                except (OSError, ValueError):
+                    self.reader = None
+            if self.reader is None:
+                self.reader = RemoteReader(HISTORY_SAMPLES)
+                self.poll_thread = RemotePollThread(client, self.reader)
+        else:
+            # single reader shared by labels, plots and the control loop
+            hwmon = HwmonIndex(rescan_interval=300.0)
+            self.hub = SampleHub(SensorReader(sample_history=HISTORY_SAMPLES, hwmon_index=hwmon))
+            self.reader = self.hub.reader
+            self.controller = FanController(hwmon_index=hwmon)
+            self.poll_thread = PollThread(self.hub, interval=1.0)
+        self._shown_seq = 0
+        if self.poll_thread:
+            self.snapshot = self.poll_thread.snapshot
+            self.poll_thread.start()
+        # min/max levels between the history buffer and the plots
+        self.lod = LODHistory(self.reader.history, ("temp", "freq", "util", "power"))
+        self._plotting = False
+        # a zoom/pan waits for the next UI tick instead of redrawing at once
+        self._plots_dirty = False
 
         self._build_ui()
 
-        # start control thread but in manual mode initially
-        self.control_thread = ControlThread(self.controller, [], channel_paths=None, mode='manual', interval=2.0)
-        self.control_thread.applied_pwm.connect(self.on_applied_pwm)
-        self.control_thread.start()
+        if client:
+            for chk, key in ((self.chk_event, "event_driven"), (self.chk_adaptive, "adaptive")):
+                chk.blockSignals(True)
+                chk.setChecked(bool(state.get(key)))
+                chk.blockSignals(False)
+            self.chk_event.setEnabled(not self.chk_adaptive.isChecked())
+            if worker:
+                self.lbl_status.setText(f"Sampling and control run in worker process {worker.proc.pid}")
+            else:
+                self.lbl_status.setText(f"Connected to control service at {client.path}")
+        else:
+            # start control thread but in manual mode initially
+            self.control_thread = ControlThread(self.controller, [], channel_paths=None, mode='manual', interval=2.0)
+            self.control_thread.applied_pwm.connect(self.on_applied_pwm)
+            self.hub.subscribe(self.control_thread.on_sample, interval=None, name="control")
+            self.control_thread.start()
 
         self.latest_temp = 0.0
+        self._curve_cache = None
+        # engine settings of the loaded profile ("engine", "pid", "limits", "source"); the
+        # table edits only the points, these are carried over on save/start
+        self._engine_settings = {}
 
     def closeEvent(self, event):
         try:
-            self.poll_thread.stop()
-            self.poll_thread.wait(500)
+            if self.poll_thread:
+                self.poll_thread.stop()
+                self.poll_thread.wait(500)
         except:
             pass
         try:
-            self.control_thread.stop()
-            self.control_thread.wait(500)
+            if self.control_thread:
+                self.control_thread.stop()
+                self.control_thread.wait(500)
         except:
             pass
+        if self.client:
+            self.client.close()
+        if hasattr(self.reader, "close"):
+            self.reader.close()
+        if self.worker:
+            self.worker.stop()
         event.accept()
 
     def _build_ui(self):
@@ -112,17 +232,22 @@ class MainWindow(QMainWindow):
         # Plots
         self.plot_widget = pg.GraphicsLayoutWidget()
         left.addWidget(self.plot_widget, 1)
-        self.p1 = self.plot_widget.addPlot(title="Temperature (°C)")
+        self.p1 = self.plot_widget.addPlot(title="Temperature (°C)", axisItems={"bottom": pg.DateAxisItem()})
         self.curve_temp = self.p1.plot(pen='r')
         self.plot_widget.nextRow()
-        self.p2 = self.plot_widget.addPlot(title="Frequency (MHz)")
+        self.p2 = self.plot_widget.addPlot(title="Frequency (MHz)", axisItems={"bottom": pg.DateAxisItem()})
         self.curve_freq = self.p2.plot(pen='g')
         self.plot_widget.nextRow()
-        self.p3 = self.plot_widget.addPlot(title="Utilization (%)")
+        self.p3 = self.plot_widget.addPlot(title="Utilization (%)", axisItems={"bottom": pg.DateAxisItem()})
         self.curve_util = self.p3.plot(pen='b')
         self.plot_widget.nextRow()
-        self.p4 = self.plot_widget.addPlot(title="Power (W)")
+        self.p4 = self.plot_widget.addPlot(title="Power (W)", axisItems={"bottom": pg.DateAxisItem()})
         self.curve_power = self.p4.plot(pen='y')
+        self._plots = ((self.p1, self.curve_temp, "temp"), (self.p2, self.curve_freq, "freq"),
+                       (self.p3, self.curve_util, "util"), (self.p4, self.curve_power, "power"))
+        for plot, item, column in self._plots:
+            # zoom/pan picks the level of detail for the new range
+            plot.sigXRangeChanged.connect(self._range_changed)
 
         # Right: control panel
         right = QVBoxLayout()
@@ -135,7 +260,7 @@ class MainWindow(QMainWindow):
         self._refresh_channels()
 
         btn_refresh = QPushButton("Refresh Channels")
-        btn_refresh.clicked.connect(self._refresh_channels)
+        btn_refresh.clicked.connect(self._rescan_channels)
         right.addWidget(btn_refresh)
 
         # Curve editor (table)
@@ -183,6 +308,12 @@ class MainWindow(QMainWindow):
         self.btn_start_auto.setCheckable(True)
         self.btn_start_auto.clicked.connect(self.toggle_auto)
         right.addWidget(self.btn_start_auto)
+        self.chk_event = QCheckBox("Apply on every sample (event-driven)")
+        self.chk_event.toggled.connect(self.toggle_event_driven)
+        right.addWidget(self.chk_event)
+        self.chk_adaptive = QCheckBox("Adaptive polling (slow when idle, fast on spikes)")
+        self.chk_adaptive.toggled.connect(self.toggle_adaptive)
+        right.addWidget(self.chk_adaptive)
 
         # Manual apply
         self.spin_manual = QTableWidgetItem
@@ -201,10 +332,18 @@ class MainWindow(QMainWindow):
         self.lbl_status = QLabel("")
         right.addWidget(self.lbl_status)
 
-        # timer to update plots
-        self.plot_timer = QTimer()
-        self.plot_timer.timeout.connect(self.update_plots)
-        self.plot_timer.start(1000)
+        # single UI tick: labels and plots from the same snapshot
+        self.ui_timer = QTimer()
+        self.ui_timer.timeout.connect(self.ui_tick)
+        self.ui_timer.start(int(1000 / MAX_FPS))
+
+    def _rescan_channels(self):
+        # pick up hotplugged / reloaded hwmon drivers
+        try:
+            self.controller.rescan()
+        except Exception as e:
+            self.lbl_status.setText(f"Rescan failed: {e}")
+        self._refresh_channels()
 
     def _refresh_channels(self):
         self.ch_list.clear()
@@ -255,6 +394,17 @@ class MainWindow(QMainWindow):
         pts.sort(key=lambda x:x[0])
         return pts
 
+    def _refresh_profiles(self):
+        # the store re-reads only profile files changed since the last scan
+        self.profile_list.clear()
+        self.profile_list.addItems(utils.list_profiles(refresh=True))
+
+    def _compiled_curve(self, pts):
+        # recompile only when the table contents changed since the last call
+        if not self._curve_cache or self._curve_cache.points != [(float(t), p) for t, p in pts]:
+            self._curve_cache = FanCurve(pts)
+        return self._curve_cache
+
     def save_profile(self, system=False):
         # prompt for name
         name, _ = QFileDialog.getSaveFileName(self, "Save profile", utils.profiles_dir(), "JSON files (*.json)")
@@ -268,6 +418,7 @@ class MainWindow(QMainWindow):
             "points": pts,
             "channels": self._selected_channel_paths()
         }
+        prof.update(self._engine_settings)
         try:
             if system:
                 # try save to system path via utils
@@ -291,6 +442,7 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Cannot load profile: {e}")
             return
+        self._engine_settings = {k: prof[k] for k in ("engine", "pid", "limits", "source") if k in prof}
         # populate table
         self.curve_table.setRowCount(0)
         for t,p in prof.get("points", []):
@@ -308,7 +460,7 @@ class MainWindow(QMainWindow):
                 item.setCheckState(Qt.CheckState.Checked)
             else:
                 item.setCheckState(Qt.CheckState.Unchecked)
-        self.lbl_status.setText(f"Loaded profile {name}")
+        self.lbl_status.setText(f"Loaded profile {name} ({prof.get('engine', 'curve')})")
 
     def apply_profile_now(self):
         pts = self._read_curve_from_table()
@@ -316,7 +468,11 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "Info", "No points in curve")
             return
         paths = self._selected_channel_paths()
-        res = self.controller.apply_curve(self.latest_temp, pts, channel_paths=paths)
+        try:
+            res = self.controller.apply_curve(self.latest_temp, self._compiled_curve(pts), channel_paths=paths)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to apply profile: {e}")
+            return
         if isinstance(res, dict):
             self.lbl_status.setText(f"Applied profile -> PWM {res.get('pwm')} (errors: {res.get('errors')})")
         else:
@@ -348,12 +504,35 @@ class MainWindow(QMainWindow):
                 self.btn_start_auto.setChecked(False)
                 return
             paths = self._selected_channel_paths()
-            self.control_thread.set_curve(pts)
-            self.control_thread.set_channels(paths)
-            self.control_thread.mode = 'auto'
+            prof = dict(self._engine_settings, points=pts, channels=paths)
+            if self.client:
+                try:
+                    self.client.request("set_profile", profile=prof, auto=True)
+                except Exception as e:
+                    QMessageBox.critical(self, "Error", f"Control service refused: {e}")
+                    self.btn_start_auto.setChecked(False)
+                    return
+            else:
+                if prof.get("engine", "curve") == "curve" and not prof.get("limits"):
+                    self.control_thread.set_curve(self._compiled_curve(pts))
+                else:
+                    try:
+                        self.control_thread.set_engine(make_engine(prof))
+                    except Exception as e:
+                        QMessageBox.critical(self, "Error", f"Invalid control engine settings: {e}")
+                        self.btn_start_auto.setChecked(False)
+                        return
+                self.control_thread.set_channels(paths)
+                self.control_thread.mode = 'auto'
             self.lbl_status.setText("Auto control started")
         else:
-            self.control_thread.mode = 'manual'
+            if self.client:
+                try:
+                    self.client.request("set_auto", auto=False)
+                except Exception as e:
+                    QMessageBox.critical(self, "Error", f"Control service refused: {e}")
+            else:
+                self.control_thread.mode = 'manual'
             self.lbl_status.setText("Auto control stopped")
 
     def apply_manual_pwm(self):
@@ -361,9 +540,9 @@ class MainWindow(QMainWindow):
         paths = self._selected_channel_paths()
         try:
             if paths:
-                errs = self.controller.set_pwm_on_list(paths, v)
+                errs = self.controller.set_pwm_on_list(paths, v, force=True)
             else:
-                errs = self.controller.set_pwm_on_all(v)
+                errs = self.controller.set_pwm_on_all(v, force=True)
             if errs:
                 self.lbl_status.setText("Some errors: " + "; ".join(errs))
             else:
@@ -371,7 +550,26 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to set PWM: {e}")
 
-    def on_sample(self, data):
+    def ui_tick(self):
+        # nothing is drawn while nobody can see it; the next visible tick catches up
+        if not self.isVisible() or self.isMinimized():
+            return
+        seq, data = self.snapshot.get()
+        if seq != self._shown_seq and data is not None:
+            self._shown_seq = seq
+            self._update_labels(data)
+            self.update_plots()
+        elif self._plots_dirty:
+            for plot, item, column in self._plots:
+                self._draw_plot(plot, item, column)
+        self._plots_dirty = False
+
+    def _range_changed(self, vb, rng):
+        # auto-ranged plots show everything: only a zoom/pan changes what is drawn
+        if not self._plotting and not vb.autoRangeEnabled()[0]:
+            self._plots_dirty = True
+
+    def _update_labels(self, data):
         t = data.get("temp")
         f = data.get("freq")
         u = data.get("util")
@@ -380,7 +578,6 @@ class MainWindow(QMainWindow):
         if t is not None:
             self.lbl_temp.setText(f"Temp: {t:.1f} °C")
             self.latest_temp = t
-            self.control_thread.set_temp(t)
         if f is not None:
             self.lbl_freq.setText(f"Freq: {f:.0f} MHz")
         if u is not None:
@@ -394,23 +591,59 @@ class MainWindow(QMainWindow):
             self.lbl_volt.setText(f"Volt: {v:.3f} V")
 
     def update_plots(self):
-        reader = self.poll_thread.reader
+        history = self.reader.history
+        if history is None or not len(history):
+            return
         try:
-            temp_hist = list(reader.temp_history)
-            freq_hist = list(reader.freq_history)
-            util_hist = list(reader.util_history)
-            power_hist = list(reader.power_history)
-            x = list(range(-len(temp_hist)+1,1))
-            if temp_hist:
-                self.curve_temp.setData(x, temp_hist)
-            if freq_hist:
-                self.curve_freq.setData(x, freq_hist)
-            if util_hist:
-                self.curve_util.setData(x, util_hist)
-            if power_hist:
-                self.curve_power.setData(x, power_hist)
+            # only the samples since the last tick are folded into the levels
+            self.lod.update()
+            for plot, item, column in self._plots:
+                self._draw_plot(plot, item, column)
         except Exception:
             pass
 
+    def _draw_plot(self, plot, item, column):
+        # setData can move an auto-ranged view: not a zoom for _range_changed
+        self._plotting = True
+        try:
+            vb = plot.getViewBox()
+            x0 = x1 = None
+            if not vb.autoRangeEnabled()[0]:
+                x0, x1 = vb.viewRange()[0]
+            # at most ~2 points per horizontal pixel (raw samples when fewer)
+            x, y = self.lod.render(column, x0, x1, width=max(100, vb.width()))
+            item.setData(x, y)
+        finally:
+            self._plotting = False
+
+    def toggle_event_driven(self, checked):
+        if self.client:
+            self._set_remote_mode()
+            return
+        self.control_thread.set_event_driven(checked)
+
+    def toggle_adaptive(self, checked):
+        if self.client:
+            self._set_remote_mode()
+        else:
+            self.hub.set_adaptive(AdaptiveRate() if checked else None)
+        if checked:
+            # the control loop has to follow the adaptive samples
+            self.chk_event.setChecked(True)
+        self.chk_event.setEnabled(not checked)
+
+    def _set_remote_mode(self):
+        try:
+            self.client.request("set_mode", event_driven=self.chk_event.isChecked(),
+                                adaptive=self.chk_adaptive.isChecked())
+        except Exception as e:
+            self.lbl_status.setText(f"Control service refused: {e}")
+
     def on_applied_pwm(self, pwm):
+        if self.control_thread.event_driven:
+            lat = self.control_thread.event.latency.report()
+            if lat["count"]:
+                self.lbl_status.setText(f"Auto applied PWM={pwm} (sample->write p50 {lat['p50_ms']:.1f} ms, "
+                                        f"p99 {lat['p99_ms']:.1f} ms)")
+                return
         self.lbl_status.setText(f"Auto applied PWM={pwm}")
\ No newline at end of file
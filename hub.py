@@ -0,0 +1,202 @@
+# hub.py - wspólny punkt próbkowania: jeden SensorReader, wielu odbiorców
+import sys
+import time
+import threading
+from collections import deque
+
+from sensors import SensorReader
+
+# subscribers due within this window [s] share one sample instead of forcing a
+# second read a few ms later
+DUE_SLACK = 0.005
+
+
+class Subscriber:
+    # interval=None: called on every sample taken for anybody else (event-driven)
+    def __init__(self, callback, interval, name=None):
+        self.callback = callback
+        self.interval = interval
+        self.name = name or getattr(callback, "__name__", "subscriber")
+        self.due = 0.0
+        self.delivered = 0
+        self.errors = 0
+
+
+class AdaptiveRate:
+    """
+    Interwał próbkowania zależny od dynamiki: przy stabilnej temperaturze
+    i obciążeniu wydłuża się do `max_interval`, przy skoku temperatury lub
+    wykorzystania CPU spada od razu do `min_interval`. Nachylenie temperatury
+    liczone jest w stałym oknie `slope_window` s (albo między dwiema próbkami,
+    gdy odstęp jest dłuższy), więc nie zależy od bieżącego interwału.
+    """
+    def __init__(self, min_interval=0.25, max_interval=8.0, base_interval=1.0,
+                 slope_fast=1.0, slope_stable=0.1, temp_noise=1.0,
+                 util_jump=25.0, util_stable=5.0, backoff=1.5, slope_window=2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.base_interval = base_interval
+        self.slope_fast = slope_fast        # °C/s that counts as a spike
+        self.slope_stable = slope_stable    # °C/s below which we are idle
+        self.temp_noise = temp_noise        # °C change over the window ignored as sensor jitter
+        self.util_jump = util_jump          # %-points between samples
+        self.util_stable = util_stable
+        self.backoff = backoff
+        self.slope_window = slope_window
+        self.interval = base_interval
+        self._prev = None
+        # (time, temp) from the newest sample at least slope_window old onwards
+        self._window = deque()
+
+    def _slope(self, t, ts):
+        w = self._window
+        w.append((ts, t))
+        # keep one reference sample at or before ts - slope_window
+        while len(w) > 2 and w[1][0] <= ts - self.slope_window:
+            w.popleft()
+        ref_ts, ref_t = w[0]
+        d_temp = abs(t - ref_t)
+        # 4 fast samples 0.5 °C apart are a ramp, not four sub-noise steps
+        return d_temp / (ts - ref_ts) if d_temp > self.temp_noise else 0.0
+
+    def update(self, data):
+        """Feed one sample; return the interval until the next one."""
+        t, u, ts = data.get("temp"), data.get("util"), data.get("time")
+        prev = self._prev
+        self._prev = (t, u, ts)
+        if prev is None or None in (t, ts, prev[0], prev[2]) or ts <= prev[2]:
+            self._window.clear()
+            if t is not None and ts is not None:
+                self._window.append((ts, t))
+            return self.interval
+        slope = self._slope(t, ts)
+        d_util = abs(u - prev[1]) if u is not None and prev[1] is not None else 0.0
+        if slope >= self.slope_fast or d_util >= self.util_jump:
+            self.interval = self.min_interval
+        elif slope < self.slope_stable and d_util < self.util_stable:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        else:
+            self.interval = min(self.base_interval, self.interval * self.backoff)
+        return self.interval
+
+
+class Snapshot:
+    """
+    Ostatnia próbka z numerem kolejnym, podmieniana jedną krotką: wątek
+    próbkujący tylko ją nadpisuje, a czytelnik (takt GUI) bierze najnowszą,
+    kiedy chce - bez kolejki zdarzeń i bez blokad.
+    """
+    def __init__(self):
+        self._state = (0, None)
+
+    def publish(self, data):
+        self._state = (self._state[0] + 1, data)
+
+    def get(self):
+        """(seq, data); seq grows by one per published sample."""
+        return self._state
+
+
+class SampleHub:
+    """
+    Jedyny właściciel SensorReader. Odbiorcy (etykiety GUI, wykresy, pętla
+    sterowania, logery) deklarują własny interwał; w każdym takcie czujniki są
+    czytane co najwyżej raz, a próbka trafia do wszystkich odbiorców, którym
+    właśnie minął termin.
+
+    Z `adaptive` (AdaptiveRate) tempo próbkowania wyznacza polityka; odbiorcy
+    z interwałem dostają wtedy najbliższą próbkę po swoim terminie.
+    """
+    def __init__(self, reader=None, adaptive=None, **reader_kwargs):
+        self.reader = reader or SensorReader(**reader_kwargs)
+        self.adaptive = adaptive
+        self.subscribers = []
+        self.latest = None
+        # latest sample for pollers that must not be called per sample (GUI tick)
+        self.snapshot = Snapshot()
+        self.samples = 0
+        self._next_sample = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def set_adaptive(self, adaptive):
+        self.adaptive = adaptive
+        self._next_sample = 0.0
+        # wake a sleeping run() so the new pace applies immediately
+        self._wake.set()
+
+    def subscribe(self, callback, interval=1.0, name=None):
+        """interval=None subscribes to every sample without driving the sampling rate."""
+        sub = Subscriber(callback, interval, name)
+        sub.due = time.monotonic()
+        with self._lock:
+            self.subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self.subscribers:
+                self.subscribers.remove(sub)
+
+    def _deliver(self, subs, now):
+        data = self.reader.sample()
+        self.latest = data
+        self.snapshot.publish(data)
+        self.samples += 1
+        for s in subs:
+            try:
+                s.callback(data)
+                s.delivered += 1
+            except Exception as e:
+                s.errors += 1
+                print(f"Subscriber {s.name} failed: {e}", file=sys.stderr)
+            if s.interval is None:
+                continue
+            try:
+                s.due += s.interval
+                # missed deadlines are skipped, not replayed
+                if s.due <= now:
+                    s.due = now + s.interval
+            except Exception as e:
+                # a subscriber that cannot be rescheduled would stop the loop
+                print(f"Subscriber {s.name} dropped: {e}", file=sys.stderr)
+                self.unsubscribe(s)
+        return data
+
+    def run_pending(self):
+        """Sample once if any subscriber is due and deliver; return seconds to the next deadline."""
+        with self._lock:
+            subs = list(self.subscribers)
+        # event-driven subscribers (control) go first: lowest sample-to-action latency
+        events = [s for s in subs if s.interval is None]
+        timed = [s for s in subs if s.interval is not None]
+        adaptive = self.adaptive
+        now = time.monotonic()
+        if adaptive is not None:
+            if not subs:
+                return 1.0
+            if now >= self._next_sample - DUE_SLACK:
+                due = [s for s in timed if now >= s.due - DUE_SLACK]
+                data = self._deliver(events + due, now)
+                self._next_sample = now + adaptive.update(data)
+            return max(0.0, self._next_sample - time.monotonic())
+        if not timed:
+            return 1.0
+        due = [s for s in timed if now >= s.due - DUE_SLACK]
+        if due:
+            self._deliver(events + due, now)
+        nxt = min(s.due for s in timed)
+        return max(0.0, nxt - time.monotonic())
+
+    def run(self):
+        self._stop.clear()
+        while not self._stop.is_set():
+            delay = self.run_pending()
+            if delay > 0:
+                self._wake.wait(delay)
+                self._wake.clear()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
@@ -0,0 +1,136 @@
+# hwmon.py - indeks atrybutów /sys/class/hwmon budowany raz (zamiast skanowania przy każdym odczycie)
+import os
+import re
+import time
+
+import sysfs
+
+HWMON_ROOT = os.path.join(sysfs.SYSFS_ROOT, "class", "hwmon")
+
+_ATTR_RE = re.compile(r"(temp|fan|in|pwm)(\d+)_input$")
+
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except Exception:
+        return None
+
+
+class HwmonSensor:
+    """Jeden atrybut *_input z opcjonalną etykietą (*_label)."""
+    def __init__(self, chip, kind, index, input_path, label):
+        self.chip = chip
+        self.kind = kind
+        self.index = index
+        self.input_path = input_path
+        self.label = label
+
+    def __repr__(self):
+        return f"HwmonSensor({self.chip.name}/{self.kind}{self.index}, label={self.label!r})"
+
+
+class HwmonChip:
+    def __init__(self, path):
+        self.path = path
+        self.hwmon = os.path.basename(path)
+        self.name = _read_text(os.path.join(path, "name")) or self.hwmon
+        self.temps = []
+        self.fans = []
+        self.voltages = []
+        self.pwms = []
+        try:
+            files = sorted(os.listdir(path))
+        except OSError:
+            files = []
+        fileset = set(files)
+        for fname in files:
+            if re.match(r"pwm\d+$", fname):
+                self.pwms.append(os.path.join(path, fname))
+                continue
+            m = _ATTR_RE.match(fname)
+            if not m:
+                continue
+            kind, idx = m.group(1), int(m.group(2))
+            label = None
+            label_name = f"{kind}{idx}_label"
+            if label_name in fileset:
+                label = _read_text(os.path.join(path, label_name))
+            sensor = HwmonSensor(self, kind, idx, os.path.join(path, fname), label)
+            if kind == "temp":
+                self.temps.append(sensor)
+            elif kind == "fan":
+                self.fans.append(sensor)
+            elif kind == "in":
+                self.voltages.append(sensor)
+        for lst in (self.temps, self.fans, self.voltages):
+            lst.sort(key=lambda s: s.index)
+
+
+class HwmonIndex:
+    """
+    Mapa chipów hwmon i ich plików temp*/fan*/in*/pwm* zbudowana jednorazowo.
+    Ponowne skanowanie: jawnie przez rescan() albo co `rescan_interval` sekund
+    przez maybe_rescan() (urządzenia podłączane w trakcie pracy).
+    """
+    def __init__(self, root=HWMON_ROOT, rescan_interval=None):
+        self.root = root
+        self.rescan_interval = rescan_interval
+        self.chips = []
+        self.generation = 0
+        self.scan_time = 0.0
+        self.rescan()
+
+    def rescan(self):
+        chips = []
+        if os.path.isdir(self.root):
+            for h in sorted(os.listdir(self.root)):
+                p = os.path.join(self.root, h)
+                if os.path.isdir(p):
+                    chips.append(HwmonChip(p))
+        self.chips = chips
+        self.generation += 1
+        self.scan_time = time.monotonic()
+        return self.chips
+
+    def maybe_rescan(self):
+        """Rescan if the rescan interval elapsed; return True when the index changed."""
+        if self.rescan_interval is None:
+            return False
+        if time.monotonic() - self.scan_time < self.rescan_interval:
+            return False
+        old = [(c.path, c.name) for c in self.chips]
+        self.rescan()
+        return old != [(c.path, c.name) for c in self.chips]
+
+    def chip(self, name):
+        for c in self.chips:
+            if c.name == name:
+                return c
+        return None
+
+    def sensors(self, kind):
+        out = []
+        for c in self.chips:
+            out.extend(getattr(c, kind))
+        return out
+
+    def find_voltage(self):
+        """First readable in*_input whose label looks like a CPU/core voltage (same rule as before)."""
+        for s in self.sensors("voltages"):
+            lab = (s.label or "").lower()
+            if lab and ("v" in lab or "voltage" in lab or "vcore" in lab):
+                try:
+                    float(_read_text(s.input_path))
+                except (TypeError, ValueError):
+                    # unreadable (or not a number) now: try the next candidate
+                    continue
+                return s
+        return None
+
+    def pwm_paths(self):
+        out = []
+        for c in self.chips:
+            out.extend(c.pwms)
+        return out
@@ -80,6 +80,10 @@ if [ -d "${TARGET_DIR}/profiles" ]; then
   rsync -a "${TARGET_DIR}/profiles/" "${SYSTEM_PROFILES_DIR}/" || true
 fi
 
+# 4b) grupa uprawniona do zmiany ustawień wentylatorów przez usługę (GUI bez roota)
+info "Tworzę grupę cpufan (dodaj użytkowników: usermod -aG cpufan NAZWA)"
+groupadd -f cpufan || warn "Nie udało się utworzyć grupy cpufan."
+
 # 5) stwórz launcher w /usr/local/bin
 info "Tworzę launcher: ${LAUNCHER}"
 cat > "${LAUNCHER}" <<EOF
@@ -119,7 +123,8 @@ After=multi-user.target
 Type=simple
 User=root
 WorkingDirectory=${TARGET_DIR}
-ExecStart=${VENV_DIR}/bin/python ${TARGET_DIR}/main.py
+RuntimeDirectory=cpu-fan-controller
+ExecStart=${VENV_DIR}/bin/python ${TARGET_DIR}/daemon.py --profile default --socket
 Restart=on-failure
 
 [Install]
@@ -0,0 +1,135 @@
+# lod.py - poziomy szczegółowości (min/max) historii pomiarów do rysowania długich przebiegów
+import math
+
+# raw samples per bucket grow by this factor from one level to the next
+FACTOR = 4
+# coarsest level keeps at least this many buckets
+MIN_BUCKETS = 64
+
+
+class _Level:
+    def __init__(self, size, capacity, columns):
+        from ringbuffer import RingBuffer
+        self.size = size              # raw samples per bucket
+        # per bucket: start time, then min and max of every column
+        self.ring = RingBuffer(capacity, ("time",) + tuple(f"{c}{s}" for c in columns for s in ("_min", "_max")))
+        # items of the level below not yet forming a full bucket: (t, lo, hi)
+        self.pending = None
+
+
+class LODHistory:
+    """
+    Piramida min/max nad RingBuffer historii: poziom k trzyma kubełki po
+    FACTOR**k próbek (czas początku, min i max każdej kolumny). Nowe próbki
+    dopisywane są przyrostowo (update() czyta tylko to, co doszło od
+    poprzedniego wywołania), a render() wybiera poziom według widocznego
+    zakresu i szerokości w pikselach, więc koszt odrysowania nie zależy od
+    długości historii. Szczyty nie giną: kubełek rysowany jest jako pionowy
+    odcinek min-max.
+    """
+    def __init__(self, history, columns=None, factor=FACTOR):
+        self.history = history
+        self.columns = tuple(columns or [c for c in history.columns if c != "time"])
+        self._src = [history.columns.index(c) for c in self.columns]
+        self._time = history.columns.index("time")
+        self.factor = factor
+        self.levels = []
+        size = factor
+        while history.capacity // size >= MIN_BUCKETS or not self.levels:
+            self.levels.append(_Level(size, history.capacity // size + 2, self.columns))
+            size *= factor
+        self.seen = 0
+
+    def update(self):
+        """Fold the samples appended since the last call into every level."""
+        block, total = self.history.since(self.seen)
+        self.seen = total
+        if not block.shape[1]:
+            return 0
+        vals = block[self._src]
+        self._feed(0, block[self._time].copy(), vals, vals)
+        return block.shape[1]
+
+    def _feed(self, k, t, lo, hi):
+        import numpy as np
+        if k >= len(self.levels):
+            return
+        lvl = self.levels[k]
+        if lvl.pending is not None:
+            pt, plo, phi = lvl.pending
+            t = np.concatenate([pt, t])
+            lo = np.concatenate([plo, lo], axis=1)
+            hi = np.concatenate([phi, hi], axis=1)
+        full = len(t) // self.factor * self.factor
+        if full:
+            idx = np.arange(0, full, self.factor)
+            bt = t[idx]
+            blo = np.minimum.reduceat(lo[:, :full], idx, axis=1)
+            bhi = np.maximum.reduceat(hi[:, :full], idx, axis=1)
+            rows = np.empty((1 + 2 * len(self.columns), len(idx)))
+            rows[0] = bt
+            rows[1::2] = blo
+            rows[2::2] = bhi
+            lvl.ring.extend(rows)
+            self._feed(k + 1, bt, blo, bhi)
+        lvl.pending = (t[full:], lo[:, full:], hi[:, full:]) if full < len(t) else None
+
+    def _tail(self, k, ci):
+        """(t, min, max) of the newest samples not yet in a full level-k bucket, or None."""
+        t0 = None
+        lo = math.inf
+        hi = -math.inf
+        for lvl in self.levels[:k + 1]:
+            if lvl.pending is None:
+                continue
+            pt, plo, phi = lvl.pending
+            t0 = pt[0] if t0 is None else min(t0, pt[0])
+            lo = min(lo, float(plo[ci].min()))
+            hi = max(hi, float(phi[ci].max()))
+        return None if t0 is None else (t0, lo, hi)
+
+    def render(self, column, x0=None, x1=None, width=1000):
+        """
+        (x, y) arrays for `column` over the visible range [x0, x1] with about
+        two points per pixel: raw samples when they fit, else min/max pairs of
+        the finest level that does.
+        """
+        import numpy as np
+        ci = self.columns.index(column)
+        # one head position for both columns (a shared ring may advance in between)
+        raw = self.history.views()
+        raw_t = raw["time"]
+        if not len(raw_t):
+            return np.zeros(0), np.zeros(0)
+        if x0 is None:
+            # the levels keep a few buckets older than the raw history
+            x0 = raw_t[0]
+        lo_i = max(0, int(np.searchsorted(raw_t, x0)) - 1)
+        hi_i = len(raw_t) if x1 is None else min(len(raw_t), int(np.searchsorted(raw_t, x1)) + 1)
+        visible = hi_i - lo_i
+        budget = max(1, int(width))
+        if visible <= 2 * budget:
+            # copies: the plot keeps these arrays, and the sampler (or worker
+            # process) overwrites the oldest ring slots in place
+            return raw_t[lo_i:hi_i].copy(), raw[column][lo_i:hi_i].copy()
+        k = 0
+        while k < len(self.levels) - 1 and visible / self.levels[k].size > budget:
+            k += 1
+        ring = self.levels[k].ring
+        bt = ring.view("time")
+        a = max(0, int(np.searchsorted(bt, x0, side="right")) - 1)
+        b = len(bt) if x1 is None else min(len(bt), int(np.searchsorted(bt, x1)) + 1)
+        lo = ring.view(f"{column}_min")[a:b]
+        hi = ring.view(f"{column}_max")[a:b]
+        tail = self._tail(k, ci) if b == len(bt) else None
+        n = b - a + (1 if tail else 0)
+        x = np.empty(2 * n)
+        y = np.empty(2 * n)
+        x[0:2 * (b - a):2] = bt[a:b]
+        x[1:2 * (b - a):2] = bt[a:b]
+        y[0:2 * (b - a):2] = lo
+        y[1:2 * (b - a):2] = hi
+        if tail:
+            x[-2:] = tail[0]
+            y[-2], y[-1] = tail[1], tail[2]
+        return x, y
@@ -1,13 +1,31 @@
 #!/usr/bin/env python3
 import sys
-from PyQt6.QtWidgets import QApplication
-from gui import MainWindow
+import cli
 
 def main():
+    # command-line mode never loads Qt/pyqtgraph/NumPy
+    if len(sys.argv) > 1 and sys.argv[1] in cli.COMMANDS + ("-h", "--help"):
+        sys.exit(cli.main(sys.argv[1:]))
+    from PyQt6.QtWidgets import QApplication
+    from gui import MainWindow
+    import client
     app = QApplication(sys.argv)
-    win = MainWindow()
+    # thin client of the control service when it runs; otherwise of our own worker
+    # process (needs root for PWM), so rendering never delays the control loop
+    svc = client.ServiceClient() if client.available() else None
+    proc = None
+    if svc is None:
+        from worker import Worker
+        try:
+            proc = Worker()
+            svc = proc.connect()
+        except Exception as e:
+            # last resort: sample and control inside the GUI process
+            print(f"Cannot start the worker process ({e}); running in-process", file=sys.stderr)
+            proc = None
+    win = MainWindow(client=svc, worker=proc)
     win.show()
     sys.exit(app.exec())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,171 @@
+# metrics.py - wbudowane pomiary czasu etapów i endpoint w formacie Prometheus
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# permissions of a --metrics Unix socket (read-only data, like the service's read commands)
+SOCKET_MODE = 0o666
+
+# bucket upper bounds [s]: 10 us .. 1 s
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                     for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        for i, ub in enumerate(self.buckets):
+            if seconds <= ub:
+                self.counts[i] += 1
+                break
+
+
+class Registry:
+    """
+    Histogramy czasów i liczniki błędów z etykietami, renderowane do formatu
+    tekstowego Prometheusa. Zapis z wątku próbkującego/sterującego, odczyt
+    z wątku serwera - pod wspólną blokadą.
+    """
+    def __init__(self, prefix="cpufan"):
+        self.prefix = prefix
+        self._hist = {}
+        self._counters = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._hist.get(key)
+            if h is None:
+                h = self._hist[key] = Histogram()
+            h.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    @contextmanager
+    def timed(self, name, **labels):
+        """Time the block into histogram `name`; exceptions count into `<name>_errors_total`."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(name + "_errors_total", **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def render(self):
+        out = []
+        with self._lock:
+            hists = sorted(self._hist.items())
+            counters = sorted(self._counters.items())
+        seen = set()
+        for (name, labels), h in hists:
+            full = f"{self.prefix}_{name}_seconds"
+            if full not in seen:
+                seen.add(full)
+                if name in self._help:
+                    out.append(f"# HELP {full} {self._help[name]}")
+                out.append(f"# TYPE {full} histogram")
+            lab = dict(labels)
+            cum = 0
+            for ub, c in zip(h.buckets, h.counts):
+                cum += c
+                out.append(f"{full}_bucket{_labels(dict(lab, le=repr(ub)))} {cum}")
+            out.append(f"{full}_bucket{_labels(dict(lab, le='+Inf'))} {h.count}")
+            out.append(f"{full}_sum{_labels(lab)} {h.sum:.9f}")
+            out.append(f"{full}_count{_labels(lab)} {h.count}")
+        for (name, labels), v in counters:
+            full = f"{self.prefix}_{name}"
+            if full not in seen:
+                seen.add(full)
+                out.append(f"# TYPE {full} counter")
+            out.append(f"{full}{_labels(dict(labels))} {v}")
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+registry.describe("sample_stage", "Time spent in each SensorReader.sample() stage")
+registry.describe("pwm_write", "Time of a single PWM sysfs write per channel")
+
+
+def _http_classes():
+    # http.server costs ~30 ms to import; only the endpoint needs it, not every
+    # process that merely records timings (CLI, GUI)
+    import socket
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = self.server.registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class _UnixHTTPServer(HTTPServer):
+        address_family = socket.AF_UNIX
+
+        def server_bind(self):
+            self.socket.bind(self.server_address)
+            self.server_name = "localhost"
+            self.server_port = 0
+
+        def get_request(self):
+            conn, _ = self.socket.accept()
+            # BaseHTTPRequestHandler expects a (host, port) client address
+            return conn, ("local", 0)
+
+    return _Handler, HTTPServer, _UnixHTTPServer
+
+
+def serve(address, reg=None):
+    """
+    Serve `reg` (default: the global registry) at /metrics in a daemon thread.
+    `address` is a port number (bound to 127.0.0.1) or a Unix socket path.
+    Returns the server; call shutdown() to stop it.
+    """
+    handler, tcp_server, unix_server = _http_classes()
+    if isinstance(address, int) or str(address).isdigit():
+        server = tcp_server(("127.0.0.1", int(address)), handler)
+    else:
+        from utils import remove_stale_socket
+        # only a dead endpoint's socket is replaced, never a live one or another file
+        remove_stale_socket(address)
+        server = unix_server(address, handler)
+        # explicit, not umask-dependent: a read-only endpoint any local scraper may use
+        os.chmod(address, SOCKET_MODE)
+    server.registry = reg or registry
+    t = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    t.start()
+    return server
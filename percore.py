@@ -0,0 +1,450 @@
+# percore.py - próbkowanie temperatury, taktowania i wykorzystania każdego rdzenia w jednym przebiegu
+import os
+import re
+import time
+
+import sysfs
+from metrics import registry
+
+PROC_STAT = "/proc/stat"
+
+# per-core metrics kept in CoreHistory (the time column is separate)
+CORE_METRICS = ("temp", "freq", "util")
+
+# scalar aggregates added to SensorReader.sample() and kept in the aggregate history
+AGGREGATE_COLUMNS = ("time", "temp_max", "temp_p95", "temp_mean", "freq_max", "freq_min",
+                     "util_max", "util_mean")
+
+_CPU_DIR_RE = re.compile(r"cpu(\d+)$")
+_CORE_LABEL_RE = re.compile(r"Core (\d+)$")
+_PACKAGE_LABEL_RE = re.compile(r"Package id (\d+)$")
+_CCD_LABEL_RE = re.compile(r"Tccd(\d+)$")
+
+
+def _read_int(path, default=None):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return default
+
+
+class CoreTopology:
+    """
+    Układ logicznych CPU z /sys/devices/system/cpu: pakiet (gniazdo), rdzeń
+    i grupa L3 (CCD na AMD, cały pakiet na większości Intel). Czytany raz.
+    """
+    def __init__(self, sysfs_root=None):
+        import numpy as np
+        base = os.path.join(sysfs_root or sysfs.SYSFS_ROOT, "devices", "system", "cpu")
+        cpus = []
+        try:
+            for ent in os.listdir(base):
+                m = _CPU_DIR_RE.match(ent)
+                if m:
+                    cpus.append(int(m.group(1)))
+        except OSError:
+            pass
+        self.base = base
+        self.cpus = np.array(sorted(cpus), dtype=np.int64)
+        self.package = np.zeros(len(cpus), dtype=np.int64)
+        self.core = np.zeros(len(cpus), dtype=np.int64)
+        l3 = np.zeros(len(cpus), dtype=np.int64)
+        for i, n in enumerate(self.cpus):
+            d = os.path.join(base, f"cpu{n}")
+            self.package[i] = _read_int(os.path.join(d, "topology", "physical_package_id"), 0)
+            self.core[i] = _read_int(os.path.join(d, "topology", "core_id"), n)
+            l3[i] = _read_int(os.path.join(d, "cache", "index3", "id"), self.package[i])
+        # CCD = distinct (package, L3 id) pairs numbered 0..n-1; ccd_rank = index within the package
+        pairs = sorted(set(zip(self.package.tolist(), l3.tolist())))
+        number = {p: i for i, p in enumerate(pairs)}
+        self.ccd = np.array([number[p] for p in zip(self.package.tolist(), l3.tolist())], dtype=np.int64)
+        self.ccd_rank = np.zeros(len(cpus), dtype=np.int64)
+        for pkg in set(self.package.tolist()):
+            own = sorted(p for p in pairs if p[0] == pkg)
+            for i, p in enumerate(own):
+                self.ccd_rank[self.ccd == number[p]] = i
+        self.packages = sorted(set(self.package.tolist()))
+        self.ccds = len(pairs)
+
+    def __len__(self):
+        return len(self.cpus)
+
+
+class _Batch:
+    """
+    Stały zestaw plików sysfs z liczbą w środku (raw fd, pread od offsetu 0).
+    Jeden przebieg: lista pread + jedno parsowanie NumPy dla wszystkich plików;
+    wolna ścieżka (po pliku, z ponownym otwarciem) tylko gdy coś zawiedzie.
+    Pliki, których nie da się otworzyć (np. brak cpufreq w maszynie wirtualnej),
+    dają NaN i są ponawiane dopiero w reopen(), a nie w każdym przebiegu.
+    """
+    def __init__(self, paths, scale=1.0):
+        self.paths = list(paths)
+        self.scale = scale
+        self.fds = [-1] * len(self.paths)
+        self.reopen()
+
+    @staticmethod
+    def _open(path):
+        try:
+            return os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            return -1
+
+    def reopen(self):
+        """Retry the files that could not be opened (called on rescan)."""
+        for i, fd in enumerate(self.fds):
+            if fd < 0:
+                self.fds[i] = self._open(self.paths[i])
+        # positions of the open files; only these are read
+        self.live = [i for i, fd in enumerate(self.fds) if fd >= 0]
+
+    def read(self):
+        import numpy as np
+        n = len(self.live)
+        if not n:
+            return np.full(len(self.fds), np.nan)
+        try:
+            fds = self.fds
+            raw = [os.pread(fds[i], 32, 0) for i in self.live]
+            got = np.array(b" ".join(raw).split(), dtype=np.float64)
+            if len(got) != n:
+                raise ValueError("short read")
+            if n == len(fds):
+                vals = got
+            else:
+                vals = np.full(len(fds), np.nan)
+                vals[self.live] = got
+        except (OSError, ValueError):
+            vals = self._read_slow()
+        sysfs.stats.reads += n
+        sysfs.stats.syscalls += n
+        sysfs.stats.saved += n * (sysfs.LEGACY_READ_SYSCALLS - 1)
+        return vals / self.scale if self.scale != 1.0 else vals
+
+    def _read_slow(self):
+        import numpy as np
+        vals = np.full(len(self.fds), np.nan)
+        lost = False
+        for i in self.live:
+            fd = self.fds[i]
+            for attempt in (0, 1):
+                try:
+                    if fd < 0:
+                        raise OSError("not open")
+                    vals[i] = float(os.pread(fd, 32, 0).split()[0])
+                    break
+                except (OSError, ValueError, IndexError):
+                    if attempt:
+                        break
+                    # stale handle (driver reload / hotplug): reopen once
+                    if fd >= 0:
+                        try:
+                            os.close(fd)
+                        except OSError:
+                            pass
+                    fd = self.fds[i] = self._open(self.paths[i])
+                    sysfs.stats.reopens += 1
+            lost = lost or fd < 0
+        if lost:
+            # gone for good: left to reopen() instead of failing every tick
+            self.live = [i for i in self.live if self.fds[i] >= 0]
+        return vals
+
+    def close(self):
+        for fd in self.fds:
+            if fd >= 0:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.fds = []
+        self.live = []
+
+
+class _ProcStat:
+    """Wykorzystanie każdego CPU z /proc/stat: jeden odczyt, liczby parsowane przez NumPy."""
+    def __init__(self, cpus, path=PROC_STAT):
+        import numpy as np
+        self.path = path
+        self.cpus = cpus
+        self.size = 160 * (int(cpus.max()) + 2) if len(cpus) else 4096
+        self.fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        self.last = None
+        # position of each logical CPU in our arrays, by kernel CPU number
+        self.slot = np.full(int(cpus.max()) + 1 if len(cpus) else 0, -1, dtype=np.int64)
+        self.slot[cpus] = np.arange(len(cpus))
+
+    def read(self):
+        import numpy as np
+        data = os.pread(self.fd, self.size, 0)
+        while b"\nintr" not in data and len(data) >= self.size:
+            # buffer too small for all CPU lines
+            self.size *= 2
+            data = os.pread(self.fd, self.size, 0)
+        # lines[0] is the "cpu " total; per-CPU lines follow (offline CPUs are absent)
+        rows = []
+        for line in data.split(b"\n")[1:]:
+            if not line.startswith(b"cpu"):
+                break
+            rows.append(line[3:])
+        if not rows:
+            # no per-CPU lines (unusual /proc/stat): nothing known this tick
+            self.last = None
+            return np.full(len(self.cpus), np.nan)
+        table = np.array(b" ".join(rows).split(), dtype=np.int64).reshape(len(rows), -1)
+        ids = table[:, 0]
+        # user nice system idle iowait irq softirq steal (guest is already in user)
+        ticks = table[:, 1:9]
+        idle = ticks[:, 3] + ticks[:, 4]
+        total = ticks.sum(axis=1)
+        util = np.full(len(self.cpus), np.nan)
+        if self.last is not None:
+            prev_ids, prev_idle, prev_total = self.last
+            if np.array_equal(prev_ids, ids):
+                dt = total - prev_total
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    u = 100.0 * (1.0 - (idle - prev_idle) / dt)
+                known = ids < len(self.slot)
+                slots = self.slot[ids[known]]
+                ok = slots >= 0
+                util[slots[ok]] = u[known][ok]
+        self.last = (ids, idle, total)
+        return util
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class CoreHistory:
+    """
+    Historia per rdzeń: dla każdej metryki blok (2*capacity, ncpu) zapisywany
+    dwukrotnie jak w RingBuffer, więc view() to ciągły widok (próbki x rdzenie)
+    w kolejności chronologicznej, bez kopiowania.
+    """
+    def __init__(self, capacity, ncpu, metrics=CORE_METRICS):
+        import numpy as np
+        if capacity <= 0:
+            raise ValueError("History capacity must be positive")
+        self.capacity = capacity
+        self.metrics = tuple(metrics)
+        self._idx = {m: i for i, m in enumerate(self.metrics)}
+        self._time = np.zeros(2 * capacity)
+        self._data = np.full((len(self.metrics), 2 * capacity, ncpu), np.nan)
+        self._state = (0, 0)
+
+    def __len__(self):
+        return self._state[1]
+
+    def append(self, ts, values):
+        """values: sequence of per-core arrays in `metrics` order."""
+        head, count = self._state
+        for i, v in enumerate(values):
+            self._data[i, head] = v
+            self._data[i, head + self.capacity] = v
+        self._time[head] = self._time[head + self.capacity] = ts
+        self._state = ((head + 1) % self.capacity, min(count + 1, self.capacity))
+
+    def times(self):
+        head, count = self._state
+        end = head + self.capacity
+        return self._time[end - count:end]
+
+    def view(self, metric):
+        """Zero-copy (samples, cores) view, oldest first."""
+        head, count = self._state
+        end = head + self.capacity
+        return self._data[self._idx[metric], end - count:end]
+
+
+def group_max(values, groups, ngroups):
+    """Max of `values` per group id 0..ngroups-1 (NaN-aware, one vectorized pass)."""
+    import numpy as np
+    out = np.full(ngroups, -np.inf)
+    ok = ~np.isnan(values)
+    np.maximum.at(out, groups[ok], values[ok])
+    out[np.isneginf(out)] = np.nan
+    return out
+
+
+def aggregate(values, how="max"):
+    """Reduce a per-core array: max, min, mean or pNN (percentile); NaNs ignored."""
+    import numpy as np
+    v = values[~np.isnan(values)]
+    if not len(v):
+        return None
+    if how == "max":
+        return float(v.max())
+    if how == "min":
+        return float(v.min())
+    if how == "mean":
+        return float(v.mean())
+    if how.startswith("p"):
+        return float(np.percentile(v, float(how[1:])))
+    raise ValueError(f"Unknown aggregate {how!r}")
+
+
+class PerCoreReader:
+    """
+    Temperatura, taktowanie i wykorzystanie każdego logicznego CPU w jednym
+    przebiegu: wszystkie pliki temp*/scaling_cur_freq czytane listą pread
+    i parsowane jednym wywołaniem NumPy, wykorzystanie z jednego odczytu
+    /proc/stat. Wyniki to tablice (ncpu,); agregaty (max, p95, per pakiet,
+    per CCD) trafiają do słownika próbki, więc krzywe mogą ich używać.
+    Temperatura rdzenia: coretemp "Core N" (Intel), Tccd dla CCD (AMD),
+    inaczej czujnik pakietu.
+    """
+    def __init__(self, sysfs_root=None, hwmon_index=None, history=0, proc_stat=PROC_STAT):
+        import numpy as np
+        root = sysfs_root or sysfs.SYSFS_ROOT
+        if hwmon_index is None:
+            from hwmon import HwmonIndex
+            hwmon_index = HwmonIndex(os.path.join(root, "class", "hwmon"))
+        self.hwmon = hwmon_index
+        self.topology = topo = CoreTopology(root)
+        n = len(topo)
+        self.freq_batch = _Batch([os.path.join(topo.base, f"cpu{c}", "cpufreq", "scaling_cur_freq")
+                                  for c in topo.cpus], scale=1000.0)
+        self.temp_batch = None
+        self.temp_index = np.zeros(n, dtype=np.int64)
+        self._map_temps()
+        try:
+            self.stat = _ProcStat(topo.cpus, proc_stat)
+        except OSError:
+            self.stat = None
+        self.history = CoreHistory(history, n) if history else None
+        if history:
+            from ringbuffer import RingBuffer
+            self.aggregates = RingBuffer(history, AGGREGATE_COLUMNS)
+        else:
+            self.aggregates = None
+        self.generation = self.hwmon.generation
+        self.temp = np.full(n, np.nan)
+        self.freq = np.full(n, np.nan)
+        self.util = np.full(n, np.nan)
+
+    def _map_temps(self):
+        """Pick one temperature file per CPU (shared by SMT siblings / CCD members)."""
+        import numpy as np
+        topo = self.topology
+        paths = []
+        slot = {}
+
+        def add(path):
+            if path not in slot:
+                slot[path] = len(paths)
+                paths.append(path)
+            return slot[path]
+
+        core_sensor = {}     # (package, core_id) -> path
+        ccd_sensor = {}      # (package, ccd rank) -> path
+        pkg_sensor = {}      # package -> path
+        pkg_order = 0
+        fallback = None
+        for chip in self.hwmon.chips:
+            if chip.name == "coretemp":
+                pkg = None
+                for s in chip.temps:
+                    m = _PACKAGE_LABEL_RE.match(s.label or "")
+                    if m:
+                        pkg = int(m.group(1))
+                        pkg_sensor[pkg] = s.input_path
+                pkg = pkg_order if pkg is None else pkg
+                pkg_order += 1
+                for s in chip.temps:
+                    m = _CORE_LABEL_RE.match(s.label or "")
+                    if m:
+                        core_sensor[(pkg, int(m.group(1)))] = s.input_path
+            elif chip.name == "k10temp" and chip.temps:
+                pkg = pkg_order
+                pkg_order += 1
+                for s in chip.temps:
+                    m = _CCD_LABEL_RE.match(s.label or "")
+                    if m:
+                        ccd_sensor[(pkg, int(m.group(1)) - 1)] = s.input_path
+                pkg_sensor[pkg] = chip.temps[0].input_path
+            elif chip.name in ("package-0", "cpu_thermal") and chip.temps and fallback is None:
+                fallback = chip.temps[0].input_path
+        if fallback is None and pkg_sensor:
+            fallback = pkg_sensor[min(pkg_sensor)]
+        index = np.full(len(topo), -1, dtype=np.int64)
+        for i in range(len(topo)):
+            pkg = int(topo.package[i])
+            path = (core_sensor.get((pkg, int(topo.core[i])))
+                    or ccd_sensor.get((pkg, int(topo.ccd_rank[i])))
+                    or pkg_sensor.get(pkg) or fallback)
+            if path:
+                index[i] = add(path)
+        if self.temp_batch:
+            self.temp_batch.close()
+        self.temp_batch = _Batch(paths, scale=1000.0)
+        self.temp_index = index
+
+    def rescan(self):
+        self.hwmon.rescan()
+        self.freq_batch.reopen()
+        self._map_temps()
+        self.generation = self.hwmon.generation
+
+    def sample(self, now=None):
+        """Read all cores; returns the scalar aggregates (per-core arrays stay on self)."""
+        import numpy as np
+        now = time.time() if now is None else now
+        if self.hwmon.generation != self.generation:
+            self._map_temps()
+            self.generation = self.hwmon.generation
+        with registry.timed("percore_read", part="temp"):
+            raw = self.temp_batch.read()
+            temp = np.where(self.temp_index >= 0, raw[self.temp_index] if len(raw) else np.nan, np.nan)
+        with registry.timed("percore_read", part="freq"):
+            freq = self.freq_batch.read()
+        with registry.timed("percore_read", part="util"):
+            util = self.stat.read() if self.stat else self._util_psutil()
+        self.temp, self.freq, self.util = temp, freq, util
+        agg = {
+            "temp_max": aggregate(temp, "max"),
+            "temp_p95": aggregate(temp, "p95"),
+            "temp_mean": aggregate(temp, "mean"),
+            "freq_max": aggregate(freq, "max"),
+            "freq_min": aggregate(freq, "min"),
+            "util_max": aggregate(util, "max"),
+            "util_mean": aggregate(util, "mean"),
+        }
+        topo = self.topology
+        if topo.packages:
+            pkg_max = group_max(temp, topo.package, topo.packages[-1] + 1)
+            for g in topo.packages:
+                agg[f"package{g}_temp"] = None if np.isnan(pkg_max[g]) else float(pkg_max[g])
+        if topo.ccds > 1:
+            for g, v in enumerate(group_max(temp, topo.ccd, topo.ccds)):
+                agg[f"ccd{g}_temp"] = None if np.isnan(v) else float(v)
+        if self.history is not None:
+            self.history.append(now, (temp, freq, util))
+            self.aggregates.append([now] + [np.nan if agg[c] is None else agg[c] for c in AGGREGATE_COLUMNS[1:]])
+        return agg
+
+    def _util_psutil(self):
+        import numpy as np
+        import psutil
+        vals = psutil.cpu_percent(percpu=True)
+        out = np.full(len(self.topology), np.nan)
+        out[:min(len(vals), len(out))] = vals[:len(out)]
+        return out
+
+    def hottest(self, k=5):
+        """[(cpu number, temp), ...] of the k hottest cores in the last sample."""
+        import numpy as np
+        t = np.where(np.isnan(self.temp), -np.inf, self.temp)
+        order = np.argsort(t)[::-1][:k]
+        return [(int(self.topology.cpus[i]), float(self.temp[i])) for i in order if np.isfinite(t[i])]
+
+    def close(self):
+        self.freq_batch.close()
+        if self.temp_batch:
+            self.temp_batch.close()
+        if self.stat:
+            self.stat.close()
@@ -0,0 +1,165 @@
+# rapl.py - moc CPU ze wszystkich domen powercap (pakiety, rdzenie, uncore, DRAM, psys) w jednym przebiegu
+import os
+import re
+import time
+
+import sysfs
+
+# counters wrapped before max_energy_range_uj was read (or without that file)
+DEFAULT_ENERGY_RANGE = 2**32
+
+# intel-rapl:P and its sub-domains intel-rapl:P:N (also used by the AMD driver);
+# intel-rapl-mmio:* mirror the package counters and would count them twice
+_DOMAIN_RE = re.compile(r"intel-rapl:(\d+)((?::\d+)*)$")
+_NUMBERED_RE = re.compile(r"(.*?)-(\d+)$")
+
+
+class RaplDomain:
+    """Jedna domena powercap: licznik energy_uj, jego zakres i ostatni odczyt."""
+    def __init__(self, key, name, path, package, parent, max_range):
+        self.key = key
+        self.name = name
+        self.path = path
+        self.package = package
+        self.parent = parent          # key of the enclosing package domain, None for top level
+        self.max_range = max_range
+        self.last = None
+        self.power = None             # W over the last interval
+
+    def metric(self):
+        return f"{self.key}_power"
+
+
+def _read(path, default=None):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def discover(sysfs_root=None):
+    """All RAPL domains under class/powercap, top-level domains first."""
+    base = os.path.join(sysfs_root or sysfs.SYSFS_ROOT, "class", "powercap")
+    try:
+        entries = os.listdir(base)
+    except OSError:
+        return []
+    found = []
+    for ent in entries:
+        m = _DOMAIN_RE.match(ent)
+        if not m:
+            continue
+        d = os.path.join(base, ent)
+        if not os.path.exists(os.path.join(d, "energy_uj")):
+            continue
+        index = int(m.group(1))
+        sub = [int(x) for x in m.group(2).split(":")[1:]]
+        found.append((index, sub, d))
+    found.sort(key=lambda x: (x[0], x[1]))
+    domains = []
+    keys = {}
+    parents = {}
+    for index, sub, d in found:
+        name = _read(os.path.join(d, "name"), "domain")
+        m = _NUMBERED_RE.match(name)
+        if not sub:
+            # "package-1" -> package1 (its own socket number); "psys" stays psys
+            key = f"{m.group(1)}{m.group(2)}" if m else name
+            package = int(m.group(2)) if m else index
+        else:
+            package = parents.get(index, (None, index))[1]
+            key = f"{name}{package}"
+        if key in keys:
+            keys[key] += 1
+            key = f"{key}_{keys[key]}"
+        else:
+            keys[key] = 0
+        try:
+            max_range = int(_read(os.path.join(d, "max_energy_range_uj"), ""))
+        except ValueError:
+            max_range = DEFAULT_ENERGY_RANGE
+        parent = parents.get(index, (None,))[0] if sub else None
+        if not sub:
+            parents[index] = (key, package)
+        domains.append(RaplDomain(key, name, os.path.join(d, "energy_uj"), package, parent, max_range))
+    return domains
+
+
+class RaplReader:
+    """
+    Wszystkie domeny RAPL wykryte raz i czytane w jednym przebiegu na takt
+    (trwałe uchwyty sysfs, jeden znacznik czasu), z przepełnieniem licznika
+    liczonym według max_energy_range_uj każdej domeny. Moc całkowita to suma
+    pakietów (psys, gdy nie ma pakietów). Historia per domena, gdy history > 0.
+    """
+    def __init__(self, sysfs_root=None, history=0):
+        self.sysfs_root = sysfs_root
+        self.history_len = history
+        self.last_time = None
+        self.rescan()
+
+    def rescan(self):
+        self.domains = discover(self.sysfs_root)
+        self.last_time = None
+        self.packages = [d for d in self.domains if d.parent is None and d.name.startswith("package")]
+        if not self.packages:
+            self.packages = [d for d in self.domains if d.parent is None][:1]
+        self.history = None
+        if self.history_len and self.domains:
+            from ringbuffer import RingBuffer
+            self.history = RingBuffer(self.history_len, ("time",) + tuple(d.key for d in self.domains))
+
+    def __bool__(self):
+        return bool(self.domains)
+
+    def metrics(self):
+        """Sample keys this reader adds (package0_power, dram0_power, ...)."""
+        return [d.metric() for d in self.domains]
+
+    def read(self):
+        """Raw energy_uj of every domain (None when unreadable), one pass."""
+        out = []
+        for d in self.domains:
+            try:
+                out.append(sysfs.handles.get(d.path).read_int())
+            except Exception:
+                out.append(None)
+        return out
+
+    def sample(self, now=None):
+        """
+        Power [W] of every domain since the previous call: {metric: W or None};
+        the first call only primes the counters.
+        """
+        energy = self.read()
+        now = time.monotonic() if now is None else now
+        dt = None if self.last_time is None else now - self.last_time
+        self.last_time = now
+        out = {}
+        for d, e in zip(self.domains, energy):
+            watts = None
+            if e is not None and d.last is not None and dt and dt > 0:
+                de = e - d.last
+                if de < 0:
+                    de += d.max_range
+                watts = de / 1e6 / dt
+            d.last = e
+            d.power = watts
+            out[d.metric()] = watts
+        if self.history is not None and dt:
+            self.history.append([time.time()] + [0.0 if d.power is None else d.power for d in self.domains])
+        return out
+
+    def total(self):
+        """
+        Package power of the last sample (sum over sockets); None unless every
+        package was read - half the sockets would pass for half the power.
+        """
+        vals = [d.power for d in self.packages]
+        if not vals or None in vals:
+            return None
+        return sum(vals)
+
+    def power_history(self, key):
+        return self.history.view(key) if self.history else []
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# replay.py - zapis przebiegów (próbki + PWM + RPM) do pliku binarnego i symulacja profili na nagraniach
+#
+# Użycie:
+#   sudo python3 daemon.py --profile default --record /var/lib/cpu-fan-controller/day.trace
+#   python3 replay.py day.trace --profile default quiet ./candidate.json --threshold 80
+#   python3 replay.py day.trace night.trace --profile quiet --model recorded --json
+import os
+import sys
+import json
+import math
+import time
+import struct
+import argparse
+
+from fancontrol import PWMChannel, FanController
+from control import ControlEngine, make_engine
+from curve import FanCurve
+import utils
+
+MAGIC = b"CFTRACE1"
+# length of the JSON header that follows MAGIC
+HEADER_LEN = struct.Struct("<I")
+# fsync-free flush of the recorder every N records
+FLUSH_EVERY = 60
+
+
+def is_trace(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{f.name} is not a trace file")
+    (n,) = HEADER_LEN.unpack(f.read(HEADER_LEN.size))
+    header = json.loads(f.read(n))
+    return header, len(MAGIC) + HEADER_LEN.size + n
+
+
+def trace_header(path):
+    with open(path, "rb") as f:
+        return _read_header(f)[0]
+
+
+def _record_struct(columns):
+    return struct.Struct("<d" + "f" * len(columns))
+
+
+class TraceRecorder:
+    """
+    Zapis strumienia SensorReader.sample() razem z zastosowanym PWM i obrotami
+    wentylatorów do zwartego pliku binarnego: nagłówek JSON z nazwami kolumn,
+    potem rekordy stałej długości (czas float64, wartości float32, brak = NaN).
+    Kolumny ustala pierwsza próbka; istniejący plik z tymi samymi kolumnami
+    jest uzupełniany, inny zostaje przeniesiony do `path.1`.
+    """
+    def __init__(self, path, channels=(), flush_every=FLUSH_EVERY):
+        self.path = path
+        self.channels = list(channels)
+        self.flush_every = flush_every
+        self.keys = None
+        self.columns = None
+        self.record = None
+        self.f = None
+        self.pending = 0
+        self.count = 0
+
+    def _open(self, sample):
+        self.keys = [k for k, v in sample.items()
+                     if k != "time" and (v is None or isinstance(v, (int, float)))]
+        self.columns = self.keys + ["pwm"] + [f"rpm:{c.pwm_file}" for c in self.channels]
+        self.record = _record_struct(self.columns)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            try:
+                with open(self.path, "rb") as f:
+                    header, _ = _read_header(f)
+            except ValueError:
+                header = {}
+            if header.get("columns") == self.columns:
+                self.f = open(self.path, "ab")
+                return
+            # keep the old recording aside instead of mixing record layouts
+            os.replace(self.path, self.path + ".1")
+            print(f"Warning: trace {self.path} was recorded with different columns, "
+                  f"moved to {self.path}.1", file=sys.stderr)
+        header = json.dumps({"version": 1, "columns": self.columns,
+                             "channels": [c.pwm_file for c in self.channels],
+                             "created": time.time()}).encode()
+        self.f = open(self.path, "wb")
+        self.f.write(MAGIC + HEADER_LEN.pack(len(header)) + header)
+
+    def add(self, sample, pwm=None):
+        if self.f is None:
+            self._open(sample)
+        values = [sample.get(k) for k in self.keys]
+        values.append(pwm)
+        values.extend(c.read_rpm() for c in self.channels)
+        self.f.write(self.record.pack(sample.get("time") or time.time(),
+                                      *(math.nan if v is None else v for v in values)))
+        self.count += 1
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self.f:
+            self.f.flush()
+            self.pending = 0
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+
+
+def read_trace(path):
+    """(header, {column: float64 array}) of a trace; a torn last record is dropped."""
+    import numpy as np
+    with open(path, "rb") as f:
+        header, offset = _read_header(f)
+    columns = header["columns"]
+    dtype = np.dtype([("time", "<f8")] + [(c, "<f4") for c in columns])
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    raw = np.fromfile(path, dtype=dtype, count=count, offset=offset)
+    return header, {c: raw[c].astype("float64") for c in ("time",) + tuple(columns)}
+
+
+class _Clock:
+    now = 0.0
+
+
+class SimChannel(PWMChannel):
+    """
+    Kanał PWM bez sprzętu: zapisy trafiają do pamięci, czas płynie według
+    nagrania, a logika pomijania zapisów (deadband, odświeżanie stanu) jest ta
+    sama co dla prawdziwego kanału.
+    """
+    def __init__(self, pwm_path, deadband=0, clock=None):
+        self.clock = clock or _Clock()
+        self.value = 0
+        self.pwm_writes = 0
+        self.pwm_travel = 0
+        super().__init__(pwm_path, deadband)
+
+    def _resolve_name(self):
+        return "sim"
+
+    def _find_files(self):
+        return self.pwm_file + "_enable", None
+
+    def _now(self):
+        return self.clock.now
+
+    def _write_attr(self, path, value):
+        if path == self.pwm_file:
+            if self.pwm_writes:
+                self.pwm_travel += abs(int(value) - self.value)
+            self.value = int(value)
+            self.pwm_writes += 1
+
+
+class _SimHwmon:
+    def __init__(self, paths):
+        self.paths = list(paths)
+
+    def pwm_paths(self):
+        return self.paths
+
+    def rescan(self):
+        pass
+
+
+class SimController(FanController):
+    """FanController na kanałach SimChannel (ścieżki z nagrania albo sztuczne)."""
+    def __init__(self, paths=None, channels=1, deadband=0):
+        self.clock = _Clock()
+        paths = paths or [f"/sim/hwmon0/pwm{i + 1}" for i in range(channels)]
+        super().__init__(deadband=deadband, hwmon_index=_SimHwmon(paths))
+
+    def _discover_pwm_channels(self):
+        return [SimChannel(p, self.deadband, self.clock) for p in self.hwmon.pwm_paths()]
+
+
+def simulate(trace, engine, model=None, threshold=80.0, paths=None, channel_paths=None,
+             deadband=0, source="temp", seed=0, target=None):
+    """
+    Replay `trace` (read_trace/tune.load_trace columns) through a SimController.
+    `engine`: FanCurve or curve points (FanController.apply_curve) or any
+    ControlEngine (apply_engine). With a tune.ThermalModel the loop is closed:
+    the recorded heat drives the model and the fans it sees are the simulated
+    ones; without one the engine follows the recorded `source` temperature.
+    With `target` the result also has the mean error and overshoot against it.
+    """
+    import numpy as np
+    t = trace["time"].tolist()
+    n = len(t)
+    if n < 2:
+        raise ValueError("Trace too short to replay")
+    ctl = SimController(paths, deadband=deadband)
+    if channel_paths:
+        channel_paths = [p for p in channel_paths if p in set(ctl.hwmon.paths)] or None
+    driven = ctl._find_channels_by_paths(channel_paths) if channel_paths else ctl.channels
+    use_curve = not isinstance(engine, ControlEngine)
+    if use_curve and not isinstance(engine, FanCurve):
+        engine = FanCurve(engine)
+    if not use_curve:
+        engine.reset()
+    from tune import _fill
+    if model is not None:
+        recorded = trace["temp"]
+        q = _fill(trace[model.heat]).tolist()
+        rng = np.random.default_rng(seed)
+        noise = (rng.normal(0.0, model.noise, n) if model.noise > 0 else np.zeros(n)).tolist()
+    else:
+        recorded = trace.get(source)
+        if recorded is None or not np.isfinite(recorded).any():
+            recorded = trace["temp"]
+    rec = _fill(recorded).tolist()
+
+    wall = time.perf_counter()
+    temp = rec[0]
+    above = duty_int = abs_err = over = 0.0
+    peak = temp
+    errors = 0
+    for i in range(n - 1):
+        now = ctl.clock.now = t[i]
+        seen = temp + noise[i] if model is not None else temp
+        if use_curve:
+            res = ctl.apply_curve(seen, engine, channel_paths)
+        else:
+            res = ctl.apply_engine(seen, engine, channel_paths, now=now)
+        errors += len(res["errors"])
+        duty = sum(c.value for c in driven) / (255.0 * len(driven))
+        dt = t[i + 1] - t[i]
+        if model is not None:
+            temp = min(150.0, max(0.0, temp + dt * model.rate(temp, q[i], duty * 255.0)))
+        else:
+            temp = rec[i + 1]
+        if temp > threshold:
+            above += dt
+        duty_int += duty * dt
+        if target is not None:
+            abs_err += abs(temp - target) * dt
+            over += max(0.0, temp - target) * dt
+        peak = max(peak, temp)
+    wall = time.perf_counter() - wall
+    span = max(t[-1] - t[0], 1e-9)
+    writes = sum(c.pwm_writes for c in ctl.channels)
+    travel = sum(c.pwm_travel for c in ctl.channels)
+    res = {
+        "samples": n,
+        "duration_s": span,
+        "writes": writes,
+        "writes_min": writes / span * 60.0,
+        "travel_min": travel / span * 60.0,
+        "above_s": above,
+        "above_pct": above / span * 100.0,
+        "duty_integral": duty_int,
+        "duty_mean": duty_int / span * 100.0,
+        "peak": peak,
+        "errors": errors,
+        "speedup": span / wall if wall > 0 else math.inf,
+    }
+    if target is not None:
+        res["mae"] = abs_err / span
+        res["over"] = over / span
+    return res
+
+
+def load_candidate(name):
+    """Profile by name (user/system) or from a JSON file path."""
+    if os.path.isfile(name):
+        with open(name) as f:
+            prof = json.load(f)
+        utils.validate_profile(prof)
+        return prof
+    return utils.profile_store().get(name)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay recorded traces through fan profiles faster than real time")
+    ap.add_argument("traces", nargs="+", help="trace files (daemon --record), telemetry directories or CSV")
+    ap.add_argument("--profile", nargs="+", required=True, help="profile names or JSON files to compare")
+    ap.add_argument("--threshold", type=float, default=80.0, help="report time above this temperature [°C]")
+    ap.add_argument("--model", choices=("fit", "simple", "recorded"), default="fit",
+                    help="fit: thermal model fitted to each trace (simple if that fails); "
+                         "simple: generic model; recorded: open loop on the recorded temperature")
+    ap.add_argument("--channels", type=int, default=1, help="simulated channels when the trace names none")
+    ap.add_argument("--deadband", type=int, default=0)
+    ap.add_argument("--since", type=float, default=None, help="use the last N seconds of each trace")
+    ap.add_argument("--json", action="store_true", help="one JSON object per trace and profile")
+    args = ap.parse_args(argv)
+
+    from tune import ThermalModel, load_trace
+    candidates = []
+    for name in args.profile:
+        try:
+            prof = load_candidate(name)
+            engine = make_engine(prof)
+        except Exception as e:
+            print(f"Cannot load profile {name}: {e}", file=sys.stderr)
+            return 1
+        if engine is None:
+            print(f"Profile {name} has no curve points", file=sys.stderr)
+            return 1
+        # plain curves take the same path as the GUI (apply_curve), the rest apply_engine
+        if engine.name == "curve" and not engine.limits:
+            engine = engine.curve
+        candidates.append((name, prof, engine))
+
+    if not args.json:
+        print(f"{'trace':<24} {'profile':<20} {'writes':>7} {'w/min':>6} {'above[s]':>9} {'above%':>7} "
+              f"{'duty·s':>9} {'duty%':>6} {'peak':>6} {'speedup':>9}")
+    for path in args.traces:
+        trace = load_trace(path, args.since)
+        paths = None
+        if is_trace(path):
+            paths = trace_header(path).get("channels") or None
+        if not paths:
+            paths = [f"/sim/hwmon0/pwm{i + 1}" for i in range(args.channels)]
+        # heat input of the simple model: RAPL power when recorded, else CPU load
+        heat = "power" if (trace["power"] == trace["power"]).mean() > 0.5 else "util"
+        model = None
+        if args.model == "fit":
+            try:
+                model = ThermalModel.fit(trace)
+                if not model.stable():
+                    raise ValueError("fitted model is not stable")
+            except ValueError as e:
+                print(f"{path}: {e}; using the simple model", file=sys.stderr)
+                model = ThermalModel.simple(heat)
+        elif args.model == "simple":
+            model = ThermalModel.simple(heat)
+        for name, prof, engine in candidates:
+            m = simulate(trace, engine, model, args.threshold, paths, prof.get("channels"),
+                         args.deadband, prof.get("source") or "temp")
+            if args.json:
+                print(json.dumps(dict(m, trace=path, profile=name)))
+            else:
+                print(f"{os.path.basename(path)[:24]:<24} {name[:20]:<20} {m['writes']:>7} "
+                      f"{m['writes_min']:>6.1f} {m['above_s']:>9.0f} {m['above_pct']:>7.2f} "
+                      f"{m['duty_integral']:>9.0f} {m['duty_mean']:>6.1f} {m['peak']:>6.1f} "
+                      f"{m['speedup']:>8.0f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
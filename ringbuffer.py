@@ -0,0 +1,87 @@
+# ringbuffer.py - historia pomiarów w jednym bloku NumPy (bez kopiowania przy rysowaniu)
+
+
+class RingBuffer:
+    """
+    Bufor cykliczny o stałej pojemności dla kilku kolumn (pierwsza to czas).
+    Każda próbka zapisywana jest dwukrotnie (pozycja i oraz i+capacity), dzięki
+    czemu ostatnie `count` próbek to zawsze ciągły wycinek - view() zwraca widok
+    bez kopiowania, w kolejności chronologicznej.
+
+    Widoki pokazują dane z chwili wywołania; kolejne append() może nadpisać
+    najstarsze wartości, więc nie należy ich przechowywać dłużej niż jedno
+    odświeżenie.
+    """
+    def __init__(self, capacity, columns=("time",), dtype="float64"):
+        import numpy as np
+        if capacity <= 0:
+            raise ValueError("Ring buffer capacity must be positive")
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        self._col = {name: i for i, name in enumerate(self.columns)}
+        # one row per column, each row contiguous -> 1-D views are contiguous too
+        self._data = np.zeros((len(self.columns), 2 * capacity), dtype=dtype)
+        # (head, count, total appended) swapped as one tuple so readers never see a torn state
+        self._state = (0, 0, 0)
+
+    def __len__(self):
+        return self._state[1]
+
+    @property
+    def total(self):
+        """Rows appended since creation (keeps growing after the buffer is full)."""
+        return self._state[2]
+
+    def append(self, values):
+        head, count, total = self._state
+        self._data[:, head] = values
+        self._data[:, head + self.capacity] = values
+        self._state = ((head + 1) % self.capacity, min(count + 1, self.capacity), total + 1)
+
+    def extend(self, block):
+        """Append many rows at once; `block` has one row per column (shape (columns, n))."""
+        import numpy as np
+        block = np.asarray(block, dtype=self._data.dtype)
+        n = block.shape[1]
+        if not n:
+            return
+        head, count, total = self._state
+        keep = block[:, -self.capacity:]
+        k = keep.shape[1]
+        start = (head + n - k) % self.capacity
+        first = min(k, self.capacity - start)
+        for off in (0, self.capacity):
+            self._data[:, start + off:start + off + first] = keep[:, :first]
+            self._data[:, off:off + k - first] = keep[:, first:]
+        self._state = ((head + n) % self.capacity, min(count + n, self.capacity), total + n)
+
+    def view(self, name):
+        """Zero-copy, oldest-first view of column `name`."""
+        head, count, _ = self._state
+        end = head + self.capacity
+        return self._data[self._col[name], end - count:end]
+
+    def views(self):
+        """Consistent views of all columns taken at the same head position."""
+        head, count, _ = self._state
+        end = head + self.capacity
+        return {name: self._data[i, end - count:end] for name, i in self._col.items()}
+
+    def since(self, seen):
+        """
+        (block, total): views of the rows appended after the first `seen` ones
+        (at most the rows still held; shape (columns, n)) and the new total.
+        """
+        head, count, total = self._state
+        n = min(max(0, total - seen), count)
+        end = head + self.capacity
+        return self._data[:, end - n:end], total
+
+    def last(self, name):
+        head, count, _ = self._state
+        if not count:
+            return None
+        return float(self._data[self._col[name], head + self.capacity - 1])
+
+    def clear(self):
+        self._state = (0, 0, self._state[2])
@@ -1,82 +1,111 @@
 import os
 import time
 import psutil
-from collections import deque
+
+import sysfs
+from hwmon import HwmonIndex
+from metrics import registry
+from rapl import RaplReader
+
+# columns of SensorReader.history (column 0 is the wall-clock timestamp)
+HISTORY_COLUMNS = ("time", "temp", "freq", "util", "power")
+
+# CPU temperature chips in order of preference (hwmon "name" == psutil key)
+CPU_TEMP_CHIPS = ("coretemp", "package-0", "k10temp", "cpu_thermal")
 
 class SensorReader:
     """
     Odczytuje temperatury, taktowanie, wykorzystanie CPU, napięcia (jeżeli dostępne)
-    oraz moc CPU (jeżeli dostępne przez intel_rapl energy_uj).
+    oraz moc CPU (jeżeli dostępne przez powercap/RAPL: każdy pakiet i domena osobno).
     Używamy psutil tam gdzie możliwe i czytamy /sys gdzie potrzeba.
     """
-    def __init__(self, sample_history=300):
+    def __init__(self, sample_history=300, hwmon_index=None, hwmon_rescan=300.0, sysfs_root=None,
+                 percore=False):
         self.history_len = sample_history
-        self.temp_history = deque(maxlen=sample_history)
-        self.freq_history = deque(maxlen=sample_history)
-        self.util_history = deque(maxlen=sample_history)
-        self.power_history = deque(maxlen=sample_history)
+        self.sysfs_root = sysfs_root or sysfs.SYSFS_ROOT
+        # sample_history=0 keeps no history (and does not import NumPy)
+        self.history = None
+        if sample_history:
+            from ringbuffer import RingBuffer
+            self.history = RingBuffer(sample_history, HISTORY_COLUMNS)
         self.voltage = None
-        self.last_energy = None
-        self.last_energy_time = None
-        self.rapl_path = self._find_rapl_energy()
+        self.syscalls_saved = 0
+        # every powercap domain (package0, core0, dram0, package1, ...) read in one pass
+        self.rapl = RaplReader(self.sysfs_root, history=sample_history)
+        # per-domain power of the last sample: {"package0_power": W, ...}
+        self.power_domains = {}
+        # hwmon files are resolved once; rescan() or the timed rescan picks up hotplug
+        self.hwmon = hwmon_index or HwmonIndex(os.path.join(self.sysfs_root, "class", "hwmon"),
+                                               rescan_interval=hwmon_rescan)
+        self.voltage_sensor = None
+        self.temp_sensors = []
+        self._resolve_hwmon()
+        # per-core arrays and their aggregates (temp_max, temp_p95, ccdN_temp, ...)
+        self.percore = None
+        if percore:
+            self.enable_percore()
         # initial sample
         self.sample()
 
-    def _find_rapl_energy(self):
-        base = "/sys/class/powercap"
-        if not os.path.isdir(base):
-            return None
-        for ent in os.listdir(base):
-            path = os.path.join(base, ent)
-            for root, dirs, files in os.walk(path):
-                if "energy_uj" in files:
-                    return os.path.join(root, "energy_uj")
-        return None
+    def enable_percore(self):
+        """Start per-core sampling (no-op when already on); the next sample has the aggregates."""
+        if self.percore is None:
+            from percore import PerCoreReader
+            self.percore = PerCoreReader(self.sysfs_root, self.hwmon, history=self.history_len)
+        return self.percore
 
-    def _read_energy_uj(self):
-        try:
-            if self.rapl_path:
-                with open(self.rapl_path, "r") as f:
-                    return int(f.read().strip())
-        except Exception:
-            return None
-        return None
+    @property
+    def temp_history(self):
+        return self.history.view("temp") if self.history else []
 
-    def _read_voltage_from_hwmon(self):
-        hwmon = "/sys/class/hwmon"
-        if not os.path.isdir(hwmon):
-            return None
-        for h in os.listdir(hwmon):
-            p = os.path.join(hwmon, h)
-            for fname in os.listdir(p):
-                if fname.startswith("in") and fname.endswith("_input"):
-                    label = fname.replace("_input", "_label")
-                    try:
-                        val = None
-                        with open(os.path.join(p, fname)) as f:
-                            val = f.read().strip()
-                        if val is None:
-                            continue
-                        lab = None
-                        if os.path.exists(os.path.join(p, label)):
-                            with open(os.path.join(p, label)) as f:
-                                lab = f.read().strip().lower()
-                        if lab and ("v" in lab or "voltage" in lab or "vcore" in lab):
-                            try:
-                                v = float(val) / 1000.0
-                                return v
-                            except:
-                                continue
-                    except Exception:
-                        # ignore errors reading this hwmon entry and continue to next
-                        continue
-        return None
+    @property
+    def freq_history(self):
+        return self.history.view("freq") if self.history else []
+
+    @property
+    def util_history(self):
+        return self.history.view("util") if self.history else []
+
+    @property
+    def power_history(self):
+        return self.history.view("power") if self.history else []
+
+    def domain_power_history(self, key):
+        """History of one RAPL domain ("package1", "dram0", ...)."""
+        return self.rapl.power_history(key)
+
+    def _resolve_hwmon(self):
+        self.voltage_sensor = self.hwmon.find_voltage()
+        self.temp_sensors = []
+        for key in CPU_TEMP_CHIPS:
+            chip = self.hwmon.chip(key)
+            if chip and chip.temps:
+                self.temp_sensors = list(chip.temps)
+                break
+
+    def rescan(self):
+        self.hwmon.rescan()
+        self._resolve_hwmon()
+        self.rapl.rescan()
 
     def get_temperatures(self):
+        # direct read of the resolved CPU chip; psutil only when nothing resolved
+        if self.temp_sensors:
+            vals = []
+            for s in self.temp_sensors:
+                try:
+                    vals.append(sysfs.handles.get(s.input_path).read_int() / 1000.0)
+                except Exception:
+                    continue
+            if vals:
+                return max(vals)
+        return self._temperatures_psutil()
+
+    def _temperatures_psutil(self):
         temps = psutil.sensors_temperatures()
         temp_val = None
         if temps:
-            for key in ("coretemp", "package-0", "k10temp", "cpu_thermal"):
+            for key in CPU_TEMP_CHIPS:
                 if key in temps:
                     readings = temps[key]
                     vals = [r.current for r in readings if getattr(r, 'current', None) is not None]
@@ -101,10 +130,8 @@ class SensorReader:
         except Exception:
             pass
         try:
-            p = "/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq"
-            if os.path.exists(p):
-                with open(p) as f:
-                    return float(f.read().strip()) / 1000.0
+            p = os.path.join(self.sysfs_root, "devices/system/cpu/cpu0/cpufreq/scaling_cur_freq")
+            return float(sysfs.handles.get(p).read()) / 1000.0
         except Exception:
             pass
         return None
@@ -116,44 +143,64 @@ class SensorReader:
             return None
 
     def get_power(self):
-        e = self._read_energy_uj()
-        now = time.time()
-        if e is None:
+        """Package power summed over sockets; per-domain values go to power_domains."""
+        if not self.rapl:
             return None
-        if self.last_energy is None:
-            self.last_energy = e
-            self.last_energy_time = now
+        self.power_domains = self.rapl.sample()
+        return self.rapl.total()
+
+    def get_voltage(self):
+        s = self.voltage_sensor
+        if s is None:
             return None
-        dt = now - self.last_energy_time
-        if dt <= 0:
+        try:
+            return sysfs.handles.get(s.input_path).read_int() / 1000.0
+        except Exception:
             return None
-        de = e - self.last_energy
-        if de < 0:
-            de += 2**32
-        watts = (de / 1e6) / dt
-        self.last_energy = e
-        self.last_energy_time = now
-        return watts
 
-    def get_voltage(self):
-        v = self._read_voltage_from_hwmon()
-        return v
+    def _stage(self, name, func):
+        # per-stage timing for the metrics endpoint; a failing stage yields None
+        t0 = time.perf_counter()
+        try:
+            val = func()
+        except Exception:
+            registry.inc("sample_stage_errors_total", stage=name)
+            val = None
+        registry.observe("sample_stage", time.perf_counter() - t0, stage=name)
+        if val is None:
+            registry.inc("sample_stage_missing_total", stage=name)
+        return val
 
     def sample(self):
-        t = self.get_temperatures()
-        f = self.get_frequency()
-        u = self.get_utilization()
-        p = self.get_power()
-        v = self.get_voltage()
-        self.temp_history.append(t if t is not None else 0.0)
-        self.freq_history.append(f if f is not None else 0.0)
-        self.util_history.append(u if u is not None else 0.0)
-        self.power_history.append(p if p is not None else 0.0)
+        now = time.time()
+        t0 = time.perf_counter()
+        if self.hwmon.maybe_rescan():
+            self._resolve_hwmon()
+        t = self._stage("temp", self.get_temperatures)
+        f = self._stage("freq", self.get_frequency)
+        u = self._stage("util", self.get_utilization)
+        p = self._stage("power", self.get_power)
+        v = self._stage("voltage", self.get_voltage)
+        agg = self._stage("percore", lambda: self.percore.sample(now)) if self.percore else None
+        registry.observe("sample_total", time.perf_counter() - t0)
+        if self.history is not None:
+            self.history.append((now,
+                                 t if t is not None else 0.0,
+                                 f if f is not None else 0.0,
+                                 u if u is not None else 0.0,
+                                 p if p is not None else 0.0))
         self.voltage = v
-        return {
+        # syscalls avoided by cached sysfs handles since the previous sample
+        self.syscalls_saved = sysfs.stats.tick()
+        data = {
+            "time": now,
             "temp": t,
             "freq": f,
             "util": u,
             "power": p,
             "voltage": v
-        }
\ No newline at end of file
+        }
+        data.update(self.power_domains)
+        if agg:
+            data.update(agg)
+        return data
\ No newline at end of file
@@ -0,0 +1,190 @@
+# service.py - lokalne API (gniazdo Unix) uprzywilejowanego procesu sterującego
+import os
+import sys
+import math
+import grp
+import json
+import queue
+import socket
+import struct
+import threading
+import socketserver
+
+import utils
+
+DEFAULT_SOCKET = os.environ.get("CPU_FAN_SOCKET", "/run/cpu-fan-controller/control.sock")
+# members of this group may change PWM/profiles through the socket
+DEFAULT_GROUP = "cpufan"
+
+# commands that only read state; everything else needs root or DEFAULT_GROUP
+READ_ONLY = {"ping", "list_channels", "list_profiles", "get_state", "write_stats", "subscribe"}
+
+# samples queued per subscriber before the oldest are dropped (slow client)
+STREAM_QUEUE = 64
+# shortest "interval" a client may subscribe with [s]; None follows every sample
+MIN_STREAM_INTERVAL = 0.1
+
+
+def _peer_cred(conn):
+    try:
+        data = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        return struct.unpack("3i", data)
+    except (OSError, AttributeError):
+        return None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        svc = self.server.service
+        cred = _peer_cred(self.request)
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+                cmd = req.get("cmd")
+            except Exception:
+                self._send({"ok": False, "error": "invalid JSON request"})
+                continue
+            resp = {"id": req.get("id")}
+            if cmd not in READ_ONLY and not svc.authorized(cred):
+                resp.update(ok=False, error=f"'{cmd}' requires root or membership in group {svc.group}")
+                self._send(resp)
+                continue
+            if cmd == "subscribe":
+                interval = req.get("interval")
+                if interval is not None and (isinstance(interval, bool) or not isinstance(interval, (int, float))
+                                             or not MIN_STREAM_INTERVAL <= interval < math.inf):
+                    resp.update(ok=False, error=f"interval must be null or a number >= {MIN_STREAM_INTERVAL}")
+                    self._send(resp)
+                    continue
+                resp.update(ok=True, result=None)
+                self._send(resp)
+                # the connection becomes a push-only sample stream from here on
+                self._stream(svc, interval)
+                return
+            try:
+                resp.update(ok=True, result=svc.dispatch(cmd, req))
+            except Exception as e:
+                resp.update(ok=False, error=str(e))
+            self._send(resp)
+
+    def _send(self, obj):
+        self.wfile.write((json.dumps(obj) + "\n").encode())
+        self.wfile.flush()
+
+    def _stream(self, svc, interval):
+        q = queue.Queue(maxsize=STREAM_QUEUE)
+
+        def push(data):
+            try:
+                q.put_nowait(data)
+            except queue.Full:
+                # slow client: drop the oldest sample rather than stall sampling
+                try:
+                    q.get_nowait()
+                    q.put_nowait(data)
+                except (queue.Empty, queue.Full):
+                    pass
+        sub = svc.hub.subscribe(push, interval=interval, name="ipc-stream")
+        try:
+            while True:
+                data = q.get()
+                self._send({"event": "sample", "data": data})
+        except (OSError, ValueError):
+            pass
+        finally:
+            svc.hub.unsubscribe(sub)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ControlService:
+    """
+    Serwer JSON-lines na gnieździe Unix przed FanDaemon: wiele klientów (GUI,
+    narzędzia CLI) współdzieli jedną pętlę próbkowania i sterowania.
+    Jedno żądanie = jedna linia {"id", "cmd", ...}; odpowiedź {"id", "ok", "result"|"error"}.
+    Po "subscribe" połączenie dostaje strumień {"event": "sample", "data": {...}}.
+    """
+    def __init__(self, daemon, path=DEFAULT_SOCKET, group=DEFAULT_GROUP):
+        self.daemon = daemon
+        self.hub = daemon.hub
+        self.path = path
+        self.group = group
+        try:
+            self.gid = grp.getgrnam(group).gr_gid if group else None
+        except KeyError:
+            print(f"Group {group} does not exist; only root may change fan settings", file=sys.stderr)
+            self.gid = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # a running daemon keeps its socket; only a dead one's leftover is replaced
+        utils.remove_stale_socket(path)
+        self.server = _Server(path, _Handler)
+        self.server.service = self
+        # everybody may connect (read-only commands); writes are checked per peer
+        os.chmod(path, 0o666)
+        self.thread = None
+
+    def authorized(self, cred):
+        if cred is None:
+            return False
+        pid, uid, gid = cred
+        if uid == 0 or uid == os.geteuid():
+            return True
+        if self.gid is None:
+            return False
+        if gid == self.gid:
+            return True
+        try:
+            import pwd
+            name = pwd.getpwuid(uid).pw_name
+            return self.gid in os.getgrouplist(name, gid)
+        except KeyError:
+            return False
+
+    def dispatch(self, cmd, req):
+        d = self.daemon
+        if cmd == "ping":
+            return "pong"
+        if cmd == "list_channels":
+            return d.controller.list_channels()
+        if cmd == "get_state":
+            return d.state()
+        if cmd == "write_stats":
+            return d.controller.write_stats()
+        if cmd == "set_profile":
+            if req.get("name"):
+                # stored profile by name: parsed and compiled already, no disk I/O
+                store = utils.profile_store()
+                d.set_profile(store.get(req["name"]), auto=req.get("auto"), curve=store.curve(req["name"]))
+            else:
+                d.set_profile(req.get("profile") or {}, auto=req.get("auto"))
+            return d.state()
+        if cmd == "list_profiles":
+            return utils.list_profiles()
+        if cmd == "set_auto":
+            d.set_auto(bool(req.get("auto")))
+            return d.state()
+        if cmd == "set_mode":
+            d.set_mode(bool(req.get("event_driven")), bool(req.get("adaptive")))
+            return d.state()
+        if cmd == "set_pwm":
+            return d.set_pwm(int(req["value"]), req.get("channels"), force=req.get("force", True))
+        if cmd == "apply_curve":
+            return d.apply_once(req.get("points"), req.get("channels"), req.get("temp"))
+        if cmd == "rescan":
+            d.rescan()
+            return d.controller.list_channels()
+        raise ValueError(f"unknown command {cmd!r}")
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="ipc", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,186 @@
+# shmring.py - historia pomiarów w pamięci współdzielonej (proces sterujący pisze, GUI czyta bez kopiowania)
+import os
+import math
+import mmap
+import struct
+
+from ringbuffer import RingBuffer
+
+# name of the segment of a daemon started with a bare --shm
+DEFAULT_SHM = "cpu-fan-controller"
+# POSIX shared memory objects appear here on Linux
+SHM_DIR = "/dev/shm"
+
+MAGIC = 0x3252484E41464343    # "CCFANHR2"
+# header: uint64 magic, capacity, columns, total, writer pid; then the column names
+_HEADER_WORDS = 5
+_TOTAL = 3
+_PID = 4
+_NAMES_LEN = 448
+_DATA_OFFSET = _HEADER_WORDS * 8 + _NAMES_LEN
+
+
+def _size(capacity, ncols):
+    return _DATA_OFFSET + ncols * 2 * capacity * 8
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # another user's process
+        pass
+    return True
+
+
+def _check_stale(name):
+    """
+    Raise ValueError unless the existing segment `name` is a sample history
+    whose writer process is gone.
+    """
+    with open(os.path.join(SHM_DIR, name.lstrip("/")), "rb") as f:
+        raw = f.read(_HEADER_WORDS * 8)
+    if len(raw) < _HEADER_WORDS * 8:
+        raise ValueError(f"shared memory {name} exists and is not a shared sample history")
+    words = struct.unpack(f"<{_HEADER_WORDS}Q", raw)
+    if words[0] != MAGIC:
+        raise ValueError(f"shared memory {name} exists and is not a shared sample history")
+    if _alive(words[_PID]):
+        raise ValueError(f"shared sample history {name} is in use by pid {words[_PID]}")
+
+
+class SharedRingBuffer(RingBuffer):
+    """
+    RingBuffer (te same widoki view()/views()/since()) w segmencie
+    multiprocessing.shared_memory. Jeden proces pisze, dowolnie wiele czyta;
+    licznik `total` w nagłówku jest numerem kolejnym: pisarz najpierw zapisuje
+    wiersz, potem zwiększa licznik, więc czytelnik bez blokad widzi tylko
+    kompletne wiersze. Czytelnicy mapują segment tylko do odczytu.
+    """
+    def __init__(self, name, capacity=None, columns=None, create=False):
+        import numpy as np
+        self.name = name
+        self.shm = None
+        self._mmap = None
+        if create:
+            if capacity is None or capacity <= 0:
+                raise ValueError("Ring buffer capacity must be positive")
+            columns = tuple(columns or ("time",))
+            names = ",".join(columns).encode()
+            if len(names) > _NAMES_LEN:
+                raise ValueError("Too many columns for a shared ring buffer")
+            from multiprocessing import shared_memory
+            try:
+                self.shm = shared_memory.SharedMemory(name, create=True, size=_size(capacity, len(columns)))
+            except FileExistsError:
+                # left behind by a worker that was killed, or still in use
+                _check_stale(name)
+                stale = shared_memory.SharedMemory(name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name, create=True, size=_size(capacity, len(columns)))
+            try:
+                # unprivileged GUIs attach read-only to a root daemon's history
+                os.chmod(os.path.join(SHM_DIR, name), 0o644)
+            except OSError:
+                pass
+            buf = self.shm.buf
+            self._hdr = np.ndarray((_HEADER_WORDS,), dtype="uint64", buffer=buf)
+            np.ndarray((_NAMES_LEN,), dtype="uint8", buffer=buf, offset=_HEADER_WORDS * 8)[:len(names)] = \
+                np.frombuffer(names, dtype="uint8")
+            self._hdr[1] = capacity
+            self._hdr[2] = len(columns)
+            self._hdr[_TOTAL] = 0
+            self._hdr[_PID] = os.getpid()
+            # magic last: a reader never attaches to a half-initialized header
+            self._hdr[0] = MAGIC
+        else:
+            # plain read-only mapping: the reader can neither corrupt nor unlink the segment
+            with open(os.path.join(SHM_DIR, name.lstrip("/")), "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ)
+            buf = self._mmap
+            self._hdr = np.ndarray((_HEADER_WORDS,), dtype="uint64", buffer=buf)
+            if len(buf) < _DATA_OFFSET or int(self._hdr[0]) != MAGIC:
+                self.close()
+                raise ValueError(f"{name} is not a shared sample history")
+            capacity = int(self._hdr[1])
+            raw = bytes(np.ndarray((_NAMES_LEN,), dtype="uint8", buffer=buf, offset=_HEADER_WORDS * 8))
+            columns = tuple(raw.rstrip(b"\0").decode().split(","))
+            if len(columns) != int(self._hdr[2]) or len(buf) < _size(capacity, len(columns)):
+                self.close()
+                raise ValueError(f"{name} has an inconsistent header")
+        self.capacity = capacity
+        self.columns = columns
+        self._col = {c: i for i, c in enumerate(self.columns)}
+        self._data = np.ndarray((len(self.columns), 2 * capacity), dtype="float64", buffer=buf,
+                                offset=_DATA_OFFSET)
+
+    @classmethod
+    def create(cls, name, capacity, columns):
+        return cls(name, capacity, columns, create=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(name)
+
+    @property
+    def _state(self):
+        # head and count follow from the published total alone
+        total = int(self._hdr[_TOTAL])
+        return total % self.capacity, min(total, self.capacity), total
+
+    @_state.setter
+    def _state(self, state):
+        # one aligned 8-byte store publishes the rows written before it
+        self._hdr[_TOTAL] = state[2]
+
+    def clear(self):
+        # readers share the rows; only the writer's process could forget them
+        raise ValueError("A shared ring buffer cannot be cleared")
+
+    def get(self):
+        """Snapshot.get() counterpart: (total, newest row as {column: value or None})."""
+        head, count, total = self._state
+        if not count:
+            return 0, None
+        row = self._data[:, head + self.capacity - 1].tolist()
+        return total, {c: (None if math.isnan(v) else v) for c, v in zip(self.columns, row)}
+
+    def close(self):
+        # numpy views keep the buffer exported; drop them before closing the mapping
+        self._data = self._hdr = None
+        try:
+            if self.shm is not None:
+                self.shm.close()
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+        except BufferError:
+            # a plot still holds a view; the mapping goes away with the process
+            pass
+
+    def unlink(self):
+        if self.shm is not None:
+            self.shm.unlink()
+
+
+class SharedReader:
+    """
+    Odpowiednik SensorReader/RemoteReader dla GUI: historia to segment
+    SharedRingBuffer procesu sterującego, a get() zastępuje Snapshot - takt
+    GUI sam sprawdza licznik, bez wątku odbierającego próbki.
+    """
+    def __init__(self, name):
+        self.history = SharedRingBuffer.attach(name)
+        self.voltage = None
+
+    def get(self):
+        seq, data = self.history.get()
+        if data is not None:
+            self.voltage = data.get("voltage")
+        return seq, data
+
+    def close(self):
+        self.history.close()
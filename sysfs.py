@@ -0,0 +1,137 @@
+# sysfs.py - trwałe uchwyty do atrybutów sysfs (pread/pwrite zamiast open/close)
+import os
+import errno
+
+# root of the sysfs tree; CPU_FAN_SYSFS_ROOT points everything at a fake tree
+# (benchmarks/synthetic.py) for testing without real hardware
+SYSFS_ROOT = os.environ.get("CPU_FAN_SYSFS_ROOT", "/sys")
+
+# errno values meaning the attribute behind an open fd went away (driver
+# reload, device unbind); the handle is reopened once and the call retried
+REOPEN_ERRNOS = (errno.ENODEV, errno.ESTALE, errno.EBADF, errno.ENXIO)
+
+# syscalls of the old pattern: os.path.exists() + open() + read()/write() + close()
+# as issued by CPython (stat, openat, fstat, ioctl, lseek, read x2 / write, close)
+LEGACY_READ_SYSCALLS = 8
+LEGACY_WRITE_SYSCALLS = 7
+
+
+class SysfsStats:
+    """
+    Liczniki operacji na uchwytach sysfs i oszczędzonych wywołań systemowych.
+    """
+    def __init__(self):
+        self.opens = 0
+        self.reopens = 0
+        self.reads = 0
+        self.writes = 0
+        self.syscalls = 0
+        self.saved = 0
+        self.last_tick_saved = 0
+        self._tick_mark = 0
+
+    def tick(self):
+        """Close the current tick; return syscalls saved since the previous one."""
+        self.last_tick_saved = self.saved - self._tick_mark
+        self._tick_mark = self.saved
+        return self.last_tick_saved
+
+    def as_dict(self):
+        return {
+            "opens": self.opens,
+            "reopens": self.reopens,
+            "reads": self.reads,
+            "writes": self.writes,
+            "syscalls": self.syscalls,
+            "saved": self.saved,
+            "last_tick_saved": self.last_tick_saved,
+        }
+
+
+stats = SysfsStats()
+
+
+class SysfsFile:
+    """
+    Atrybut sysfs otwarty raz i czytany/zapisywany przez pread/pwrite od offsetu 0.
+    Uchwyt otwierany jest leniwie przy pierwszym użyciu.
+    """
+    def __init__(self, path, writable=False):
+        self.path = path
+        self.writable = writable
+        self.fd = None
+        # a regular file (synthetic tree) keeps bytes past a shorter pwrite ("60" over
+        # "128" reads back "608"); sysfs replaces the whole value, so only fakes are truncated
+        self.truncate = writable and not os.path.realpath(path).startswith("/sys/")
+
+    def _open(self):
+        flags = os.O_RDWR if self.writable else os.O_RDONLY
+        self.fd = os.open(self.path, flags | os.O_CLOEXEC)
+        stats.opens += 1
+        stats.syscalls += 1
+
+    def close(self):
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+
+    def _call(self, op):
+        if self.fd is None:
+            self._open()
+        try:
+            return op(self.fd)
+        except OSError as e:
+            if e.errno not in REOPEN_ERRNOS:
+                raise
+        # driver reloaded: drop the stale fd and retry once on a fresh one
+        self.close()
+        self._open()
+        stats.reopens += 1
+        return op(self.fd)
+
+    def read(self, size=4096):
+        data = self._call(lambda fd: os.pread(fd, size, 0))
+        stats.reads += 1
+        stats.syscalls += 1
+        stats.saved += LEGACY_READ_SYSCALLS - 1
+        return data.decode(errors="replace").strip()
+
+    def read_int(self):
+        return int(self.read())
+
+    def write(self, value):
+        data = str(value).encode()
+        if self.truncate:
+            self._call(lambda fd: (os.pwrite(fd, data, 0), os.ftruncate(fd, len(data))))
+        else:
+            self._call(lambda fd: os.pwrite(fd, data, 0))
+        stats.writes += 1
+        stats.syscalls += 1
+        stats.saved += LEGACY_WRITE_SYSCALLS - 1
+
+
+class HandleCache:
+    """
+    Współdzielona pamięć podręczna uchwytów: jeden SysfsFile na ścieżkę.
+    """
+    def __init__(self):
+        self._files = {}
+
+    def get(self, path, writable=False):
+        key = (path, writable)
+        f = self._files.get(key)
+        if f is None:
+            f = SysfsFile(path, writable)
+            self._files[key] = f
+        return f
+
+    def close_all(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+
+handles = HandleCache()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# telemetry.py - trwały magazyn pomiarów w stylu RRD (pliki mmap, agregacja min/max/avg)
+import os
+import sys
+import math
+import mmap
+import time
+import struct
+import json
+import argparse
+
+MAGIC = b"CFRRD1\0\0"
+# magic, step [s], capacity, metric count, head, count
+HEADER = struct.Struct("<8sdQQQQ")
+HEADER_SIZE = 64
+
+DEFAULT_METRICS = ("temp", "freq", "util", "power", "voltage", "pwm")
+
+# subdirectory with the per-RAPL-domain power store (its metrics depend on the host)
+POWER_SUBDIR = "power"
+
+# (file name, bucket step [s], number of buckets): 1 day of 1 s, 30 days of
+# 1 min, 1 year of 1 h -> about 20 MB for the default metrics
+DEFAULT_LEVELS = (
+    ("1s", 1.0, 86400),
+    ("1m", 60.0, 43200),
+    ("1h", 3600.0, 8760),
+)
+
+
+class Archive:
+    """
+    Jeden plik archiwum: nagłówek + stała liczba rekordów (bufor cykliczny).
+    Rekord: początek kubełka, liczba próbek, potem (min, max, avg) dla każdej metryki.
+    """
+    def __init__(self, path, step, capacity, nmetrics):
+        self.path = path
+        self.step = step
+        self.capacity = capacity
+        self.nmetrics = nmetrics
+        self.record = struct.Struct("<dd" + "ddd" * nmetrics)
+        size = HEADER_SIZE + self.record.size * capacity
+        exists = os.path.exists(path)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        try:
+            if not exists or os.fstat(fd).st_size == 0:
+                os.ftruncate(fd, size)
+                fresh = True
+            else:
+                fresh = False
+                if os.fstat(fd).st_size != size:
+                    raise ValueError(f"Telemetry archive {path} has unexpected size (layout changed?)")
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        if fresh:
+            self.head = 0
+            self.count = 0
+            self._write_header()
+        else:
+            magic, fstep, fcap, fmetrics, self.head, self.count = HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC or fstep != step or fcap != capacity or fmetrics != nmetrics:
+                self.mm.close()
+                raise ValueError(f"Telemetry archive {path} does not match the configured layout")
+
+    def _write_header(self):
+        HEADER.pack_into(self.mm, 0, MAGIC, self.step, self.capacity, self.nmetrics,
+                         self.head, self.count)
+
+    def append(self, bucket_ts, n, values):
+        """values: flat sequence min0, max0, avg0, min1, ..."""
+        self.record.pack_into(self.mm, HEADER_SIZE + self.head * self.record.size,
+                              bucket_ts, n, *values)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self._write_header()
+
+    def records(self, start=None, end=None):
+        """Records oldest-first, optionally limited to bucket_ts in [start, end]."""
+        out = []
+        first = (self.head - self.count) % self.capacity
+        for i in range(self.count):
+            slot = (first + i) % self.capacity
+            rec = self.record.unpack_from(self.mm, HEADER_SIZE + slot * self.record.size)
+            if start is not None and rec[0] < start:
+                continue
+            if end is not None and rec[0] > end:
+                break
+            out.append(rec)
+        return out
+
+    def oldest(self):
+        if not self.count:
+            return None
+        first = (self.head - self.count) % self.capacity
+        return struct.unpack_from("<d", self.mm, HEADER_SIZE + first * self.record.size)[0]
+
+    def as_array(self):
+        """
+        Structured NumPy view of the raw slots (storage order, not time order);
+        zero-copy over the mmap, so opening months of data costs nothing.
+        """
+        import numpy as np
+        fields = [("ts", "<f8"), ("n", "<f8"), ("stats", "<f8", (self.nmetrics, 3))]
+        return np.frombuffer(self.mm, dtype=np.dtype(fields), count=self.capacity, offset=HEADER_SIZE)
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.mm.close()
+
+
+class _Bucket:
+    def __init__(self, nmetrics):
+        self.ts = None
+        self.n = 0
+        self.mins = [math.inf] * nmetrics
+        self.maxs = [-math.inf] * nmetrics
+        self.sums = [0.0] * nmetrics
+        self.cnts = [0] * nmetrics
+
+    def add(self, values):
+        self.n += 1
+        for i, v in enumerate(values):
+            if v is None or v != v:
+                continue
+            if v < self.mins[i]:
+                self.mins[i] = v
+            if v > self.maxs[i]:
+                self.maxs[i] = v
+            self.sums[i] += v
+            self.cnts[i] += 1
+
+    def flat(self):
+        out = []
+        for i in range(len(self.sums)):
+            if self.cnts[i]:
+                out += [self.mins[i], self.maxs[i], self.sums[i] / self.cnts[i]]
+            else:
+                out += [math.nan, math.nan, math.nan]
+        return out
+
+
+class TelemetryStore:
+    """
+    Magazyn wielorozdzielczy: każda próbka trafia do kubełków wszystkich poziomów
+    (np. 1 s -> 1 min -> 1 h); zamknięty kubełek zapisywany jest jako jeden rekord
+    min/max/avg. Rozmiar na dysku jest stały (liczony przy tworzeniu plików).
+    Nazwy metryk zapisywane są w metrics.json; metrics=None otwiera magazyn
+    z zapisanymi nazwami.
+    """
+    def __init__(self, directory, metrics=DEFAULT_METRICS, levels=DEFAULT_LEVELS):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        names_path = os.path.join(directory, "metrics.json")
+        try:
+            with open(names_path) as f:
+                saved = tuple(json.load(f))
+        except (OSError, ValueError):
+            saved = None
+        if metrics is None:
+            metrics = saved or DEFAULT_METRICS
+        elif saved is not None and saved != tuple(metrics):
+            raise ValueError(f"Telemetry store {directory} holds {', '.join(saved)}, "
+                             f"not {', '.join(metrics)}")
+        self.metrics = tuple(metrics)
+        if saved is None:
+            with open(names_path, "w") as f:
+                json.dump(list(self.metrics), f)
+        self.levels = []
+        for name, step, capacity in levels:
+            path = os.path.join(directory, f"{name}.rrd")
+            self.levels.append((Archive(path, step, capacity, len(self.metrics)), _Bucket(len(self.metrics))))
+
+    def add(self, sample, ts=None):
+        """Add one SensorReader.sample() dict (extra keys ignored, missing -> NaN)."""
+        if ts is None:
+            ts = sample.get("time") or time.time()
+        values = [sample.get(m) for m in self.metrics]
+        for i, (archive, bucket) in enumerate(self.levels):
+            bts = math.floor(ts / archive.step) * archive.step
+            if bucket.ts is not None and bts != bucket.ts:
+                archive.append(bucket.ts, bucket.n, bucket.flat())
+                bucket = _Bucket(len(self.metrics))
+                self.levels[i] = (archive, bucket)
+            bucket.ts = bts
+            bucket.add(values)
+
+    def query(self, metric, start=None, end=None, step=None):
+        """
+        Return [(bucket_ts, min, max, avg), ...] for `metric`. Without `step` the
+        finest archive that still reaches back to `start` is used.
+        """
+        mi = self.metrics.index(metric)
+        archive = self._pick(start, step)
+        out = []
+        for rec in archive.records(start, end):
+            base = 2 + mi * 3
+            out.append((rec[0], rec[base], rec[base + 1], rec[base + 2]))
+        return out
+
+    def _pick(self, start, step):
+        if step is not None:
+            for archive, _ in self.levels:
+                if archive.step == step:
+                    return archive
+            raise ValueError(f"No telemetry archive with step {step}s")
+        for archive, _ in self.levels:
+            oldest = archive.oldest()
+            if start is None or (oldest is not None and oldest <= start):
+                return archive
+        # no archive reaches back that far yet: the finest one holds everything
+        return self.levels[0][0]
+
+    def flush(self):
+        for archive, _ in self.levels:
+            archive.flush()
+
+    def close(self):
+        # partial buckets are written too; a restart within the same bucket
+        # then yields two records with the same timestamp, which is harmless
+        for archive, bucket in self.levels:
+            if bucket.ts is not None:
+                archive.append(bucket.ts, bucket.n, bucket.flat())
+            archive.flush()
+            archive.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Dump telemetry history as CSV")
+    ap.add_argument("directory")
+    ap.add_argument("-m", "--metric", default="temp",
+                    help=f"{', '.join(DEFAULT_METRICS)} or a RAPL domain (package0_power, dram1_power, ...)")
+    ap.add_argument("--since", type=float, default=3600.0, help="seconds back from now")
+    ap.add_argument("--step", type=float, default=None, help="archive step [s] (default: auto)")
+    args = ap.parse_args(argv)
+
+    store = TelemetryStore(args.directory, metrics=None)
+    # per-domain power lives in its own store (daemon.py, POWER_SUBDIR)
+    sub = os.path.join(args.directory, POWER_SUBDIR)
+    if args.metric not in store.metrics and os.path.isdir(sub):
+        store.close()
+        store = TelemetryStore(sub, metrics=None)
+    if args.metric not in store.metrics:
+        store.close()
+        print(f"No metric {args.metric} in {args.directory}", file=sys.stderr)
+        return 1
+    print("time,min,max,avg")
+    for ts, lo, hi, avg in store.query(args.metric, start=time.time() - args.since, step=args.step):
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))},{lo:.3f},{hi:.3f},{avg:.3f}")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+# test_adaptive.py - AdaptiveRate: nachylenie w stałym oknie czasu
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hub import AdaptiveRate  # noqa: E402
+
+
+def _run(rate, slope, seconds, interval=None, temp=40.0):
+    """Feed a ramp of `slope` °C/s; sample every `interval` s (or as the rate asks)."""
+    ts = 0.0
+    out = []
+    while ts < seconds:
+        i = rate.update({"temp": temp + slope * ts, "util": 10.0, "time": ts})
+        out.append(i)
+        ts += interval or i
+    return out
+
+
+class AdaptiveRateTest(unittest.TestCase):
+    def test_fast_ramp_keeps_min_interval(self):
+        # 2 °C/s at 0.25 s is 0.5 °C per sample, below the 1 °C noise floor per step
+        rate = AdaptiveRate()
+        out = _run(rate, 2.0, 20.0, interval=0.25)
+        # after the first window the rate must stay at min_interval, not oscillate
+        self.assertEqual(set(out[8:]), {rate.min_interval})
+
+    def test_ramp_paced_by_the_rate_stays_fast(self):
+        rate = AdaptiveRate()
+        out = _run(rate, 2.0, 20.0)
+        self.assertEqual(set(out[1:]), {rate.min_interval})
+
+    def test_flat_backs_off_to_max(self):
+        rate = AdaptiveRate()
+        out = _run(rate, 0.0, 60.0)
+        self.assertEqual(out[-1], rate.max_interval)
+
+
+if __name__ == "__main__":
+    unittest.main()
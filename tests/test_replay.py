@@ -0,0 +1,46 @@
+# test_replay.py - TraceRecorder: dopisywanie i plik z innymi kolumnami
+import io
+import os
+import sys
+import tempfile
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replay import TraceRecorder, trace_header  # noqa: E402
+
+
+class TraceRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "day.trace")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _record(self, sample, n=3):
+        rec = TraceRecorder(self.path, flush_every=1)
+        for i in range(n):
+            rec.add(dict(sample, time=float(i)), pwm=100)
+        rec.close()
+
+    def test_same_columns_append(self):
+        self._record({"temp": 40.0, "util": 5.0})
+        size = os.path.getsize(self.path)
+        self._record({"temp": 41.0, "util": 6.0})
+        self.assertGreater(os.path.getsize(self.path), size)
+        self.assertFalse(os.path.exists(self.path + ".1"))
+
+    def test_different_columns_rotate_once(self):
+        self._record({"temp": 40.0})
+        err = io.StringIO()
+        with contextlib.redirect_stderr(err):
+            self._record({"temp": 40.0, "power": 12.0}, n=5)
+        self.assertEqual(err.getvalue().count("different columns"), 1)
+        self.assertEqual(trace_header(self.path + ".1")["columns"], ["temp", "pwm"])
+        self.assertEqual(trace_header(self.path)["columns"], ["temp", "power", "pwm"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+# test_shmring.py - SharedRingBuffer: przejmowanie segmentu po martwym procesie
+import os
+import sys
+import unittest
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shmring import SharedRingBuffer, _PID  # noqa: E402
+
+
+class SharedRingBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.name = f"cpu-fan-test-{os.getpid()}"
+
+    def tearDown(self):
+        try:
+            os.unlink(os.path.join("/dev/shm", self.name))
+        except FileNotFoundError:
+            pass
+
+    def test_live_writer_keeps_its_segment(self):
+        ring = SharedRingBuffer.create(self.name, 8, ("time", "temp"))
+        ring.append([1.0, 40.0])
+        with self.assertRaises(ValueError):
+            SharedRingBuffer.create(self.name, 8, ("time", "temp"))
+        reader = SharedRingBuffer.attach(self.name)
+        self.assertEqual(reader.get(), (1, {"time": 1.0, "temp": 40.0}))
+        reader.close()
+        ring.close()
+
+    def test_segment_of_a_dead_writer_is_replaced(self):
+        ring = SharedRingBuffer.create(self.name, 8, ("time", "temp"))
+        ring.append([1.0, 40.0])
+        # pretend the segment was written by a process that has exited
+        dead = subprocess.Popen([sys.executable, "-c", "pass"])
+        dead.wait()
+        ring._hdr[_PID] = dead.pid
+        ring.close()
+        ring = SharedRingBuffer.create(self.name, 8, ("time", "temp"))
+        self.assertEqual(ring.get(), (0, None))
+        ring.close()
+
+    def test_foreign_segment_is_not_removed(self):
+        with open(os.path.join("/dev/shm", self.name), "wb") as f:
+            f.write(b"x" * 4096)
+        with self.assertRaises(ValueError):
+            SharedRingBuffer.create(self.name, 8, ("time", "temp"))
+        self.assertTrue(os.path.exists(os.path.join("/dev/shm", self.name)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# tune.py - offline dobór nastaw PID na zapisanych przebiegach (telemetria / CSV)
+#
+# Użycie:
+#   python3 tune.py /var/lib/cpu-fan-controller --target 70 --since 7200
+#   python3 tune.py trace.csv --profile quiet --kp 2 4 8 --ki 0.1 0.3 --kd 0 10
+import os
+import sys
+import csv
+import json
+import math
+import time
+import argparse
+import itertools
+
+from control import PIDEngine, make_engine
+import utils
+
+TRACE_COLUMNS = ("time", "temp", "power", "util", "pwm")
+
+# PID parameters taken from a profile as the base for every candidate
+PID_BASE_KEYS = ("bias", "min_pwm", "max_pwm", "slew", "d_filter")
+
+
+def load_trace(source, since=None):
+    """
+    Recorded samples as NumPy arrays keyed by TRACE_COLUMNS. `source` is a
+    binary trace (daemon --record), a telemetry directory (daemon --telemetry,
+    1 s archive, averages) or a CSV file with a header naming some of the
+    columns; missing values are NaN.
+    """
+    import numpy as np
+    import replay
+    cols = {}
+    if replay.is_trace(source):
+        _header, rec = replay.read_trace(source)
+        n = len(rec["time"])
+        # every recorded column (per-core sources, RPMs) plus NaN for missing ones
+        cols = dict(rec)
+        for c in TRACE_COLUMNS:
+            cols.setdefault(c, np.full(n, math.nan))
+        if since is not None and n:
+            keep = cols["time"] >= cols["time"][-1] - since
+            cols = {c: v[keep] for c, v in cols.items()}
+    elif os.path.isdir(source):
+        from telemetry import TelemetryStore
+        store = TelemetryStore(source)
+        try:
+            start = None if since is None else time.time() - since
+            series = {m: {ts: avg for ts, _lo, _hi, avg in store.query(m, start=start, step=1.0)}
+                      for m in TRACE_COLUMNS[1:]}
+        finally:
+            store.close()
+        stamps = sorted(series["temp"])
+        cols["time"] = np.array(stamps, dtype="float64")
+        for m in TRACE_COLUMNS[1:]:
+            cols[m] = np.array([series[m].get(ts, math.nan) for ts in stamps], dtype="float64")
+    else:
+        rows = {c: [] for c in TRACE_COLUMNS}
+        with open(source, newline="") as f:
+            for row in csv.DictReader(f):
+                for c in TRACE_COLUMNS:
+                    try:
+                        rows[c].append(float(row.get(c) or "nan"))
+                    except ValueError:
+                        rows[c].append(math.nan)
+        cols = {c: np.array(v, dtype="float64") for c, v in rows.items()}
+        if since is not None and len(cols["time"]):
+            keep = cols["time"] >= cols["time"][-1] - since
+            cols = {c: v[keep] for c, v in cols.items()}
+    keep = np.isfinite(cols["time"]) & np.isfinite(cols["temp"])
+    return {c: v[keep] for c, v in cols.items()}
+
+
+class ThermalModel:
+    """
+    Model cieplny pierwszego rzędu dopasowany metodą najmniejszych kwadratów:
+    dT/dt = c0*Q + c1*T + c2 + c3*T*u + c4*u, gdzie Q to moc [W] (lub obciążenie
+    CPU [%], gdy brak RAPL), a u = PWM/255. Szum czujnika szacowany z przebiegu.
+    """
+    def __init__(self, coef, heat="power", noise=0.0):
+        self.coef = [float(c) for c in coef]
+        self.heat = heat
+        self.noise = noise
+
+    @classmethod
+    def fit(cls, trace, smooth=9):
+        import numpy as np
+        n = len(trace["time"])
+        if n < 10:
+            raise ValueError("Trace too short to fit a thermal model")
+        heat = "power" if np.isfinite(trace["power"]).mean() > 0.5 else "util"
+        if not np.isfinite(trace[heat]).any() or not np.isfinite(trace["pwm"]).any():
+            raise ValueError("Trace needs temp, pwm and power or util columns")
+        t = trace["time"]
+        # differentiating raw readings would fit the sensor noise, not the heat flow
+        temp = _smooth(trace["temp"], smooth)
+        q = _fill(trace[heat])
+        u = _fill(trace["pwm"]) / 255.0
+        dt = np.diff(t)
+        rate = np.diff(temp) / np.where(dt > 0, dt, np.nan)
+        X = np.column_stack([q[:-1], temp[:-1], np.ones(n - 1), temp[:-1] * u[:-1], u[:-1]])
+        ok = np.isfinite(rate) & np.isfinite(X).all(axis=1)
+        if ok.sum() < 10:
+            raise ValueError("Not enough valid samples to fit a thermal model")
+        coef = np.linalg.lstsq(X[ok], rate[ok], rcond=None)[0]
+        noise = float(np.nanstd(trace["temp"] - temp))
+        return cls(coef, heat, noise)
+
+    @classmethod
+    def simple(cls, heat="power", ambient=30.0, tau_idle=60.0, tau_full=15.0, rise=40.0, q_ref=100.0):
+        """
+        Generic model when a trace cannot be fitted: Newton cooling toward
+        `ambient` with time constant tau_idle (fans stopped) .. tau_full (255),
+        and `rise` °C above ambient at heat `q_ref` (W or %) and half duty.
+        """
+        g0 = 1.0 / tau_idle
+        g1 = 1.0 / tau_full - g0
+        c0 = rise * (g0 + 0.5 * g1) / q_ref
+        return cls([c0, -g0, g0 * ambient, -g1, g1 * ambient], heat)
+
+    def rate(self, temp, q, pwm):
+        c0, c1, c2, c3, c4 = self.coef
+        u = pwm / 255.0
+        return c0 * q + c1 * temp + c2 + c3 * temp * u + c4 * u
+
+    def replay_error(self, trace):
+        """RMS error [°C] of an open-loop run driven by the recorded heat and PWM."""
+        q = _fill(trace[self.heat])
+        pwm = _fill(trace["pwm"])
+        t, rec = trace["time"], trace["temp"]
+        temp = float(rec[0])
+        err = 0.0
+        for i in range(len(t) - 1):
+            temp = min(150.0, max(0.0, temp + (t[i + 1] - t[i]) * self.rate(temp, q[i], pwm[i])))
+            err += (temp - rec[i + 1]) ** 2
+        return math.sqrt(err / max(1, len(t) - 1))
+
+    def stable(self):
+        """Cooling term must pull the temperature back at both PWM ends."""
+        return self.coef[1] < 0 and self.coef[1] + self.coef[3] < 0
+
+
+def _fill(values):
+    """Forward-fill NaNs (leading NaNs -> first finite value, or 0)."""
+    import numpy as np
+    out = values.copy()
+    ok = np.isfinite(out)
+    if not ok.any():
+        return np.zeros_like(out)
+    idx = np.where(ok, np.arange(len(out)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    out = out[idx]
+    out[:np.argmax(ok)] = values[np.argmax(ok)]
+    return out
+
+
+def _smooth(values, window):
+    """Centred moving average (edges use the shorter window that fits)."""
+    import numpy as np
+    if window <= 1:
+        return values
+    kernel = np.ones(window)
+    ok = np.isfinite(values)
+    num = np.convolve(np.where(ok, values, 0.0), kernel, mode="same")
+    den = np.convolve(ok.astype("float64"), kernel, mode="same")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return num / den
+
+
+def simulate(engine, model, trace, target, deadband=0, seed=0):
+    """
+    Closed-loop replay through replay.simulate: the recorded heat (power/util)
+    drives the model, the engine sees the modelled temperature plus sensor
+    noise and its output goes through the same PWMChannel write logic
+    (deadband, refresh) as in the daemon. Returns metrics.
+    """
+    import replay
+    m = replay.simulate(trace, engine, model, threshold=target, deadband=deadband, seed=seed, target=target)
+    return {
+        "mae": m["mae"],
+        "over": m["over"],
+        "peak": m["peak"],
+        "writes_min": m["writes_min"],
+        "duty": m["duty_mean"],
+        "travel_min": m["travel_min"],
+    }
+
+
+def score(m, w_over=2.0, w_writes=0.1, w_duty=0.0):
+    return m["mae"] + w_over * m["over"] + w_writes * m["writes_min"] + w_duty * m["duty"]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Tune PID gains against a recorded trace")
+    ap.add_argument("trace", help="telemetry directory (daemon --telemetry) or CSV with time,temp,power,util,pwm")
+    ap.add_argument("--profile", help="profile whose pid settings/points are the base (and the curve baseline)")
+    ap.add_argument("--target", type=float, help="target temperature [°C] (default: profile pid.target)")
+    ap.add_argument("--since", type=float, default=3600.0, help="use the last N seconds of the trace")
+    ap.add_argument("--kp", type=float, nargs="+", default=[2.0, 4.0, 8.0, 16.0])
+    ap.add_argument("--ki", type=float, nargs="+", default=[0.05, 0.1, 0.25, 0.5, 1.0])
+    ap.add_argument("--kd", type=float, nargs="+", default=[0.0, 5.0, 20.0])
+    ap.add_argument("--slew", type=float, default=None, help="PWM units per second (overrides the profile)")
+    ap.add_argument("--deadband", type=int, default=0, help="write deadband used when counting writes")
+    ap.add_argument("--w-over", type=float, default=2.0, help="score weight of mean °C above target")
+    ap.add_argument("--w-writes", type=float, default=0.1, help="score weight of PWM writes per minute")
+    ap.add_argument("--w-duty", type=float, default=0.0, help="score weight of mean fan duty [%%]")
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--json", action="store_true", help="print the best candidate as a profile pid section")
+    args = ap.parse_args(argv)
+
+    profile = utils.load_profile(args.profile) if args.profile else {}
+    pid = dict(profile.get("pid") or {})
+    target = args.target if args.target is not None else pid.get("target")
+    if target is None:
+        ap.error("--target is required unless the profile defines pid.target")
+    base = {k: pid[k] for k in PID_BASE_KEYS if k in pid}
+    if args.slew is not None:
+        base["slew"] = args.slew
+    feedforward = profile.get("points") if profile.get("engine") == "pid" else None
+
+    trace = load_trace(args.trace, args.since)
+    model = ThermalModel.fit(trace)
+    print(f"trace: {len(trace['time'])} samples, model heat={model.heat} noise={model.noise:.2f}°C "
+          f"open-loop error={model.replay_error(trace):.2f}°C", file=sys.stderr)
+    if not model.stable():
+        print("Warning: fitted model is not stable (trace without enough PWM variation?)", file=sys.stderr)
+
+    w = dict(w_over=args.w_over, w_writes=args.w_writes, w_duty=args.w_duty)
+    hdr = f"{'kp':>6} {'ki':>6} {'kd':>6} {'score':>7} {'mae':>6} {'over':>6} {'peak':>6} {'writes/min':>10} {'duty%':>6}"
+
+    def row(label, m):
+        return (f"{label} {score(m, **w):>7.2f} {m['mae']:>6.2f} {m['over']:>6.2f} {m['peak']:>6.1f} "
+                f"{m['writes_min']:>10.1f} {m['duty']:>6.1f}")
+
+    results = []
+    for kp, ki, kd in itertools.product(args.kp, args.ki, args.kd):
+        engine = PIDEngine(target, kp=kp, ki=ki, kd=kd, feedforward=feedforward, **base)
+        results.append(((kp, ki, kd), simulate(engine, model, trace, target, args.deadband)))
+    results.sort(key=lambda r: score(r[1], **w))
+
+    print(hdr)
+    for (kp, ki, kd), m in results[:args.top]:
+        print(row(f"{kp:>6g} {ki:>6g} {kd:>6g}", m))
+    if profile.get("points"):
+        curve = make_engine(dict(profile, engine="curve"))
+        print(row(f"{'curve ' + args.profile:>20}", simulate(curve, model, trace, target, args.deadband)))
+    if args.json and results:
+        (kp, ki, kd), _ = results[0]
+        print(json.dumps({"engine": "pid", "pid": dict(base, target=target, kp=kp, ki=ki, kd=kd)}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,24 @@
 # utils.py (zaktualizowane: wspiera profile użytkownika i profile systemowe)
 import os
+import copy
+import stat
+import errno
+import socket
 import json
+import time
+import struct
 import getpass
+import threading
+
+SYSTEM_PROFILES_DIR = "/etc/cpu-fan-controller/profiles"
+
+# directories already created by this process (makedirs once, not on every call)
+_made_dirs = set()
+
+def _ensure_dir(d):
+    if d not in _made_dirs:
+        os.makedirs(d, exist_ok=True)
+        _made_dirs.add(d)
 
 def config_dir(user_home=None):
     if user_home is None:
@@ -9,54 +26,315 @@ def config_dir(user_home=None):
     else:
         home = user_home
     d = os.path.join(home, ".config", "cpu-fan-controller")
-    os.makedirs(os.path.join(d, "profiles"), exist_ok=True)
+    _ensure_dir(os.path.join(d, "profiles"))
     return d
 
 def profiles_dir(user_home=None):
     return os.path.join(config_dir(user_home), "profiles")
 
-def system_profiles_dir():
-    d = "/etc/cpu-fan-controller/profiles"
-    os.makedirs(d, exist_ok=True)
-    return d
+def system_profiles_dir(create=False):
+    # only saving needs the directory; reading must not try to create it under /etc
+    if create:
+        _ensure_dir(SYSTEM_PROFILES_DIR)
+    return SYSTEM_PROFILES_DIR
 
 def save_profile(name, profile_dict, system=False):
     if system:
         if os.geteuid() != 0:
             raise PermissionError("Saving system profile requires root")
-        pdir = system_profiles_dir()
+        pdir = system_profiles_dir(create=True)
     else:
         pdir = profiles_dir()
     path = os.path.join(pdir, f"{name}.json")
     with open(path, "w") as f:
         json.dump(profile_dict, f, indent=2)
+    if _store is not None:
+        _store.refresh(force=True)
 
 def load_profile(name):
-    # try user profile then system profile
-    user_path = os.path.join(profiles_dir(), f"{name}.json")
-    if os.path.exists(user_path):
-        with open(user_path) as f:
-            return json.load(f)
-    sys_path = os.path.join(system_profiles_dir(), f"{name}.json")
-    if os.path.exists(sys_path):
-        with open(sys_path) as f:
-            return json.load(f)
-    raise FileNotFoundError(f"Profile {name} not found in user or system profiles")
-
-def list_profiles():
-    out = []
-    # user profiles
-    pdir = profiles_dir()
-    if os.path.exists(pdir):
-        for fn in os.listdir(pdir):
-            if fn.endswith(".json"):
-                out.append(fn[:-5])
-    # system profiles (prefix with sys/ to indicate origin)
-    sdir = system_profiles_dir()
-    if os.path.exists(sdir):
-        for fn in os.listdir(sdir):
-            if fn.endswith(".json"):
-                name = fn[:-5]
-                if name not in out:
-                    out.append(name)
-    return out
\ No newline at end of file
+    # user profile first, then system profile (served from memory)
+    return profile_store().get(name)
+
+def list_profiles(refresh=False):
+    store = profile_store()
+    if refresh:
+        store.refresh(force=True)
+    return store.names()
+
+
+def validate_profile(prof):
+    """Raise ValueError if `prof` is not a usable profile dict."""
+    if not isinstance(prof, dict):
+        raise ValueError("profile must be a JSON object")
+    for p in prof.get("points") or []:
+        try:
+            t, pwm = p
+            float(t)
+            pwm = int(pwm)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid curve point {p!r}")
+        if not 0 <= pwm <= 255:
+            raise ValueError(f"curve point PWM {pwm} outside 0-255")
+    ch = prof.get("channels")
+    if ch is not None and not (isinstance(ch, list) and all(isinstance(c, str) for c in ch)):
+        raise ValueError("channels must be a list of pwm paths")
+    # engine section (curve/pid): make_engine raises on bad parameters
+    from control import make_engine
+    make_engine(prof)
+
+
+# inotify(7) flags
+_IN_MODIFY = 0x2
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_IGNORED = 0x8000
+_EVENT = struct.Struct("iIII")
+_WATCH_MASK = (_IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE
+               | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF)
+
+
+class _Inotify:
+    """Non-blocking inotify descriptor watching profile directories (Linux, via ctypes)."""
+    def __init__(self, libc, fd):
+        self.libc = libc
+        self.fd = fd
+        self.watched = set()
+        self.wds = {}                 # watch descriptor -> directory
+
+    @classmethod
+    def create(cls):
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except Exception:
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def watch(self, d):
+        if d in self.watched:
+            return True
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(d), _WATCH_MASK)
+        if wd < 0:
+            return False
+        self.watched.add(d)
+        self.wds[wd] = d
+        return True
+
+    def _forget(self, wd, mask):
+        d = self.wds.pop(wd, None)
+        if d is None:
+            return
+        self.watched.discard(d)
+        if not mask & _IN_IGNORED:
+            # a moved directory keeps its watch; drop it, the path is watched anew
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def pending(self):
+        """
+        True if any event arrived since the last call (drains the queue).
+        A deleted or moved directory stops being watched, so the next scan
+        (or the mtime check) watches whatever is at its path again.
+        """
+        got = False
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except (BlockingIOError, OSError):
+                break
+            if not buf:
+                break
+            got = True
+            off = 0
+            # struct inotify_event: int wd, uint32 mask, cookie, len, then name[len]
+            while off + _EVENT.size <= len(buf):
+                wd, mask, _, n = _EVENT.unpack_from(buf, off)
+                off += _EVENT.size + n
+                if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF | _IN_IGNORED):
+                    self._forget(wd, mask)
+        return got
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class _Entry:
+    def __init__(self, name, path, origin, stamp):
+        self.name = name
+        self.path = path
+        self.origin = origin
+        self.stamp = stamp
+        self.profile = None
+        self.curve = None
+        self.error = None
+
+
+class ProfileStore:
+    """
+    Repozytorium profili: profile użytkownika i systemowe wczytane i sprawdzone
+    raz, trzymane w pamięci razem ze skompilowaną krzywą. Ponownie wczytywane są
+    tylko pliki, które się zmieniły - po zdarzeniu inotify, a bez niego (lub dla
+    katalogu, który jeszcze nie istnieje) po porównaniu mtime co `check_interval` s.
+    Przełączenie profilu nie wykonuje więc żadnych operacji na dysku.
+    """
+    def __init__(self, user_dir=None, system_dir=SYSTEM_PROFILES_DIR, check_interval=2.0):
+        # order = priority: a user profile hides a system one with the same name
+        self.dirs = (("user", user_dir or profiles_dir()), ("system", system_dir))
+        self.check_interval = check_interval
+        self.errors = {}
+        self.reloads = 0
+        self._files = {}
+        self._by_name = {}
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._inotify = _Inotify.create()
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """Pick up changed files; returns True if the directories were rescanned."""
+        if not force:
+            changed = self._inotify is not None and self._inotify.pending()
+            unwatched = self._inotify is None or len(self._inotify.watched) < len(self.dirs)
+            if not changed and not (unwatched and time.monotonic() - self._checked >= self.check_interval):
+                return False
+        with self._lock:
+            self._scan()
+        return True
+
+    def _scan(self):
+        self._checked = time.monotonic()
+        files = {}
+        for origin, d in self.dirs:
+            if self._inotify is not None and os.path.isdir(d):
+                # watch before listing so nothing written in between is missed
+                self._inotify.watch(d)
+            try:
+                names = sorted(os.listdir(d))
+            except OSError:
+                continue
+            for fn in names:
+                if not fn.endswith(".json"):
+                    continue
+                path = os.path.join(d, fn)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                stamp = (st.st_mtime_ns, st.st_size)
+                e = self._files.get(path)
+                if e is None or e.stamp != stamp:
+                    e = self._load(fn[:-5], path, origin, stamp)
+                files[path] = e
+        by_name = {}
+        errors = {}
+        for e in files.values():
+            if e.name in by_name:
+                continue
+            if e.error:
+                errors.setdefault(e.name, e.error)
+                continue
+            by_name[e.name] = e
+        self._files = files
+        self._by_name = by_name
+        self.errors = errors
+
+    def _load(self, name, path, origin, stamp):
+        e = _Entry(name, path, origin, stamp)
+        self.reloads += 1
+        try:
+            with open(path) as f:
+                prof = json.load(f)
+            validate_profile(prof)
+            e.profile = prof
+            if prof.get("points"):
+                from curve import FanCurve
+                e.curve = FanCurve(prof["points"])
+        except Exception as ex:
+            e.error = f"{path}: {ex}"
+        return e
+
+    def _entry(self, name):
+        self.refresh()
+        e = self._by_name.get(name)
+        if e is None:
+            if name in self.errors:
+                raise ValueError(f"Profile {name} is invalid: {self.errors[name]}")
+            raise FileNotFoundError(f"Profile {name} not found in user or system profiles")
+        return e
+
+    def names(self):
+        self.refresh()
+        return list(self._by_name)
+
+    def get(self, name):
+        """Parsed profile dict (a copy; callers may modify it)."""
+        return copy.deepcopy(self._entry(name).profile)
+
+    def curve(self, name):
+        """Compiled FanCurve of the profile, or None if it has no points."""
+        return self._entry(name).curve
+
+    def engine(self, name):
+        """A fresh control engine for the profile (reuses the compiled curve)."""
+        from control import make_engine
+        e = self._entry(name)
+        return make_engine(e.profile, curve=e.curve)
+
+    def origin(self, name):
+        return self._entry(name).origin
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+
+_store = None
+
+def profile_store():
+    """Process-wide ProfileStore for the current user's and the system profiles."""
+    global _store
+    if _store is None:
+        _store = ProfileStore()
+    return _store
+
+
+def remove_stale_socket(path):
+    """
+    Unlink a Unix socket left behind by a server that is gone, so `path` can be
+    bound again. Raises ValueError if `path` is not a socket or a server still
+    accepts connections on it.
+    """
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode):
+        raise ValueError(f"{path} exists and is not a socket")
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(1.0)
+    try:
+        s.connect(path)
+    except OSError as e:
+        if e.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+            raise
+        # nobody listening: a leftover of a killed process
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        return
+    finally:
+        s.close()
+    raise ValueError(f"another server is already listening on {path}")
@@ -0,0 +1,54 @@
+# worker.py - osobny proces próbkowania i sterowania dla GUI bez działającej usługi
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+import client
+
+# how long the GUI waits for a new worker to answer on its socket
+START_TIMEOUT = 10.0
+
+
+class Worker:
+    """
+    daemon.py uruchomiony jako proces potomny GUI: własny interpreter (i GIL)
+    dla SensorReader i pętli FanController, prywatne gniazdo API w katalogu
+    tymczasowym i historia w pamięci współdzielonej. Rysowanie w GUI nie może
+    więc opóźnić zapisu PWM.
+    """
+    def __init__(self, history=86400, poll_interval=1.0):
+        self.dir = tempfile.mkdtemp(prefix="cpufan-worker-")
+        self.socket = os.path.join(self.dir, "control.sock")
+        self.shm = f"cpu-fan-gui-{os.getpid()}"
+        daemon = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daemon.py")
+        cmd = [sys.executable, daemon, "--socket", self.socket, "--shm", self.shm,
+               "--shm-history", str(history), "--poll-interval", str(poll_interval), "--exit-with-parent",
+               # only our own user (same uid) may drive the worker
+               "--group", ""]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL)
+
+    def connect(self, timeout=START_TIMEOUT):
+        """ServiceClient of the worker once it serves its socket."""
+        deadline = time.monotonic() + timeout
+        while not client.available(self.socket):
+            if self.proc.poll() is not None:
+                self.stop()
+                raise RuntimeError(f"worker process exited with code {self.proc.returncode}")
+            if time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError("worker process did not start in time")
+            time.sleep(0.05)
+        return client.ServiceClient(self.socket)
+
+    def stop(self, timeout=2.0):
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        shutil.rmtree(self.dir, ignore_errors=True)